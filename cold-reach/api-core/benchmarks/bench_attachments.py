@@ -0,0 +1,72 @@
+# coding: utf-8
+
+"""Per-recipient message build cost with and without the attachment cache.
+
+Run from api-core with ``PYTHONPATH=src python benchmarks/bench_attachments.py``.
+The cached path should stay flat as the attachment grows; the per-recipient
+re-read/re-encode path grows linearly with the file size.
+"""
+
+import mimetypes
+import os
+import tempfile
+import time
+from email.message import EmailMessage
+from types import SimpleNamespace
+
+from openapi_server.impl.attachment_cache import attach_prepared, prepare_attachments
+
+RECIPIENTS = int(os.getenv("BENCH_RECIPIENTS", "200"))
+SIZES = [100 * 1024, 2 * 1024 * 1024, 8 * 1024 * 1024]
+
+
+def _base_message(n: int) -> EmailMessage:
+    msg = EmailMessage()
+    msg.set_content(f"Hi client {n}")
+    msg["Subject"] = "Hello"
+    msg["To"] = f"client{n}@example.com"
+    return msg
+
+
+def per_recipient(att) -> None:
+    for n in range(RECIPIENTS):
+        msg = _base_message(n)
+        ctype, encoding = mimetypes.guess_type(att.file_path)
+        if ctype is None or encoding is not None:
+            ctype = 'application/octet-stream'
+        maintype, subtype = ctype.split('/', 1)
+        with open(att.file_path, 'rb') as f:
+            msg.add_attachment(f.read(), maintype=maintype, subtype=subtype,
+                               filename=att.filename)
+
+
+def cached(prepared) -> None:
+    for n in range(RECIPIENTS):
+        attach_prepared(_base_message(n), prepared)
+
+
+def _timed(fn, arg) -> float:
+    start = time.perf_counter()
+    fn(arg)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    print(f"{RECIPIENTS} recipients; microseconds per recipient, cache build in ms")
+    print(f"{'size':>10} {'per-recipient':>15} {'cached':>10} {'build':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in SIZES:
+            path = os.path.join(tmp, f"deck-{size}.pdf")
+            with open(path, "wb") as f:
+                f.write(os.urandom(size))
+            att = SimpleNamespace(file_path=path, filename="deck.pdf")
+            uncached = _timed(per_recipient, att) / RECIPIENTS * 1e6
+            start = time.perf_counter()
+            prepared = prepare_attachments([att])
+            build = (time.perf_counter() - start) * 1e3
+            spliced = _timed(cached, prepared) / RECIPIENTS * 1e6
+            print(f"{size // 1024:>8}KB {uncached:>15.0f} {spliced:>10.0f} {build:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# coding: utf-8
+
+"""Import validation: column-wide pandas checks against the old iterrows loop.
+
+Run from api-core with ``PYTHONPATH=src python benchmarks/bench_import_validation.py``.
+Only validation and dedupe are timed (no database); ``BENCH_ROWS`` sets the
+sheet size (default 100k) and roughly 5% of rows are blank, malformed or
+repeated.
+"""
+
+import os
+import random
+import time
+
+import pandas as pd
+
+from openapi_server.impl.client_import import IMPORT_CHUNK_ROWS, validate_chunk
+
+ROWS = int(os.getenv("BENCH_ROWS", "100000"))
+
+
+def _rows(n: int):
+    rng = random.Random(n)
+    rows = []
+    for i in range(n):
+        roll = rng.random()
+        if roll < 0.01:
+            email = None
+        elif roll < 0.02:
+            email = f"client {i} at example"
+        elif roll < 0.05 and i:
+            email = f"  C{rng.randrange(i)}@Example.com "
+        else:
+            email = f"c{i}@example.com"
+        rows.append({"name": f"Client {i}", "email": email, "company": f"Company {i % 100}"})
+    return rows
+
+
+def iterrows_loop(df: pd.DataFrame) -> int:
+    """The per-row checks the Excel import used to run."""
+    accepted = 0
+    for _, row in df.iterrows():
+        email = str(row.get("email")).lower()
+        if pd.isna(row.get("email")) or "@" not in email:
+            continue
+        str(row.get("name", "Unknown"))
+        str(row.get("company")) if pd.notna(row.get("company")) else None
+        accepted += 1
+    return accepted
+
+
+def vectorized(records) -> int:
+    seen = set()
+    accepted = 0
+    for start in range(0, len(records), IMPORT_CHUNK_ROWS):
+        chunk = list(enumerate(records[start:start + IMPORT_CHUNK_ROWS], start + 2))
+        rows, _ = validate_chunk(chunk, seen)
+        accepted += len(rows)
+    return accepted
+
+
+def main() -> None:
+    records = _rows(ROWS)
+    df = pd.DataFrame.from_records(records)
+
+    start = time.perf_counter()
+    old = iterrows_loop(df)
+    old_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new = vectorized(records)
+    new_s = time.perf_counter() - start
+
+    print(f"{'rows':>8} {'iterrows s':>11} {'accepted':>9} {'vectorized s':>13} {'accepted':>9}")
+    print(f"{ROWS:>8} {old_s:>11.2f} {old:>9} {new_s:>13.2f} {new:>9}")
+    print("(iterrows keeps in-file duplicates; the vectorized path drops them)")
+
+
+if __name__ == "__main__":
+    main()
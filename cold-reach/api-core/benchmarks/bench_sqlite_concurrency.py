@@ -0,0 +1,160 @@
+# coding: utf-8
+
+"""Mixed readers and writers on one SQLite file, as with several uvicorn workers.
+
+Run from api-core with ``PYTHONPATH=src python benchmarks/bench_sqlite_concurrency.py``.
+Each profile runs for ``BENCH_SECONDS`` (default 10) with separate processes for:
+
+* two readers streaming the clients table in batches (like NDJSON exports),
+* one importer inserting and committing 1000-client chunks,
+* two API workers doing small commits (status updates, new templates) from
+  eight threads each.
+
+``default`` is SQLite as configured before (rollback journal, pysqlite's 5s
+timeout, one commit per write); ``production`` is ``make_engine`` with the
+WAL profile plus the single-writer queue. The table counts operations and
+``database is locked`` errors per role.
+"""
+
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+
+from sqlalchemy import create_engine, insert, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, ClientModel, TemplateModel, make_engine
+from openapi_server.impl.write_queue import WriteQueue
+
+SECONDS = float(os.getenv("BENCH_SECONDS", "10"))
+SEED_CLIENTS = int(os.getenv("BENCH_CLIENTS", "20000"))
+API_THREADS = 8
+
+
+def _engine(profile: str, url: str):
+    if profile == "production":
+        return make_engine(url)
+    return create_engine(url, connect_args={"check_same_thread": False})
+
+
+def _client_rows(n: int):
+    return [
+        {"id": str(uuid.uuid4()), "name": f"Client {i}", "email": f"{uuid.uuid4().hex}@example.com",
+         "email_normalized": None, "status": "not_contacted"}
+        for i in range(n)
+    ]
+
+
+def _locked(e: Exception) -> bool:
+    return "locked" in str(e) or "busy" in str(e)
+
+
+def reader(profile, url, deadline, results):
+    engine = _engine(profile, url)
+    ops = errors = 0
+    while time.time() < deadline:
+        try:
+            with engine.connect() as conn:
+                rows = conn.execution_options(yield_per=500).execute(ClientModel.__table__.select())
+                for _ in rows.partitions():
+                    time.sleep(0.002)  # the client reading the stream
+            ops += 1
+        except OperationalError as e:
+            errors += _locked(e)
+    results.put(("reader", ops, errors))
+
+
+def importer(profile, url, deadline, results):
+    engine = _engine(profile, url)
+    ops = errors = 0
+    while time.time() < deadline:
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(ClientModel.__table__), _client_rows(1000))
+            ops += 1
+        except OperationalError as e:
+            errors += _locked(e)
+    results.put(("importer", ops, errors))
+
+
+def api_worker(profile, url, deadline, results):
+    engine = _engine(profile, url)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    with engine.connect() as conn:
+        ids = [r[0] for r in conn.execute(ClientModel.__table__.select().with_only_columns(ClientModel.id).limit(5000))]
+    writer = WriteQueue(Session) if profile == "production" else None
+    counts = {"ops": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def small_write(db):
+        db.execute(update(ClientModel).where(ClientModel.id == random.choice(ids)).values(status="emailed"))
+        db.add(TemplateModel(id=str(uuid.uuid4()), name="bench", subject="s", body="b"))
+
+    def run():
+        while time.time() < deadline:
+            try:
+                if writer is not None:
+                    writer.submit(small_write).result()
+                else:
+                    db = Session()
+                    try:
+                        small_write(db)
+                        db.commit()
+                    finally:
+                        db.close()
+                outcome = "ops"
+            except OperationalError as e:
+                outcome = "errors" if _locked(e) else "ops"
+            with lock:
+                counts[outcome] += 1
+
+    threads = [threading.Thread(target=run) for _ in range(API_THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if writer is not None:
+        writer.stop()
+    results.put(("api write", counts["ops"], counts["errors"]))
+
+
+def run_profile(profile: str):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/bench.db"
+        engine = _engine(profile, url)
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(insert(ClientModel.__table__), _client_rows(SEED_CLIENTS))
+        engine.dispose()
+
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        deadline = time.time() + SECONDS
+        roles = [reader, reader, importer, api_worker, api_worker]
+        procs = [ctx.Process(target=role, args=(profile, url, deadline, results)) for role in roles]
+        for p in procs:
+            p.start()
+        totals = {}
+        for _ in procs:
+            role, ops, errors = results.get()
+            done, failed = totals.get(role, (0, 0))
+            totals[role] = (done + ops, failed + errors)
+        for p in procs:
+            p.join()
+        return totals
+
+
+def main() -> None:
+    print(f"{'profile':>11} {'role':>10} {'ops':>8} {'locked':>8}")
+    for profile in ("default", "production"):
+        for role, (ops, errors) in sorted(run_profile(profile).items()):
+            print(f"{profile:>11} {role:>10} {ops:>8} {errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
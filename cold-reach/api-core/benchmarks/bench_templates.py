@@ -0,0 +1,57 @@
+# coding: utf-8
+
+"""Render throughput of compiled templates against the old replace chain.
+
+Run from api-core with ``PYTHONPATH=src python benchmarks/bench_templates.py``.
+"""
+
+import os
+import time
+
+from openapi_server.impl.template_engine import CompiledEmail, CompiledTemplate
+
+RENDERS = int(os.getenv("BENCH_RENDERS", "100000"))
+
+SUBJECT = "Quick question for {name} at {company}"
+BODY = (
+    "Hi {name},\n\n"
+    "I noticed {company} has been growing quickly. " * 8
+    + "\n\nWould you be open to a short call? I can send details to {email}.\n\n"
+    "Best,\nThe Cold Reach team\n"
+)
+
+
+def _clients():
+    return [
+        {"name": f"Client {n}", "company": f"Company {n % 97}", "email": f"c{n}@example.com"}
+        for n in range(1000)
+    ]
+
+
+def replace_chain(clients) -> None:
+    for n in range(RENDERS):
+        c = clients[n % len(clients)]
+        BODY.replace("{name}", c["name"]).replace("{company}", c["company"] or "")\
+            .replace("{email}", c["email"])
+        SUBJECT.replace("{name}", c["name"]).replace("{company}", c["company"] or "")\
+               .replace("{email}", c["email"])
+
+
+def compiled(clients) -> None:
+    template = CompiledEmail(CompiledTemplate(SUBJECT), CompiledTemplate(BODY))
+    for n in range(RENDERS):
+        template.render(clients[n % len(clients)])
+
+
+def main() -> None:
+    clients = _clients()
+    print(f"{RENDERS} renders (subject + {len(BODY)} char body)")
+    for fn in (replace_chain, compiled):
+        start = time.perf_counter()
+        fn(clients)
+        elapsed = time.perf_counter() - start
+        print(f"{fn.__name__:>14}: {RENDERS / elapsed:>10.0f} renders/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,94 @@
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Boolean, Date
+from sqlalchemy import create_engine, event, inspect, insert, make_url, Column, String, Integer, DateTime, Boolean, Date, Index
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, validates
+from contextvars import ContextVar
 import datetime
+import os
+import weakref
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./cold_reach.db"
-# check_same_thread=False is needed for SQLite with FastAPI
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cold_reach.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+def is_sqlite_file(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+def engine_options(url):
+    """``create_engine`` keyword arguments for ``url`` from the DB_POOL_* settings."""
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if make_url(url).get_backend_name() == "sqlite":
+        # check_same_thread=False is needed for SQLite with FastAPI
+        options["connect_args"] = {"check_same_thread": False}
+        if not is_sqlite_file(url):
+            # In-memory databases live in a single connection; there is no pool to size
+            return options
+    options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+# SQLite production profile, applied to every connection of a file-backed database.
+# WAL lets readers run alongside the writer; the busy timeout makes a second
+# writer wait for the lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative: KiB
+}
+
+def install_sqlite_pragmas(engine, pragmas=None):
+    """Run ``PRAGMA name=value`` for each of ``pragmas`` on every new connection."""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def make_engine(url):
+    engine = create_engine(url, **engine_options(url))
+    if is_sqlite_file(url):
+        install_sqlite_pragmas(engine)
+    return engine
+
+# Request handlers use the asyncio engine; the send workers, imports and the
+# write queue run in threads on the synchronous one.
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def async_url(url):
+    """The same database through its asyncio driver (aiosqlite, asyncpg)."""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    return url.set(drivername=driver) if driver else url
+
+def make_async_engine(url):
+    async_engine = create_async_engine(url, **engine_options(url))
+    if is_sqlite_file(url):
+        install_sqlite_pragmas(async_engine.sync_engine)
+    return async_engine
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_url(SQLALCHEMY_DATABASE_URL)
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = make_async_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
+def normalize_email(email):
+    """The key duplicate clients are detected by: trimmed and lower-cased."""
+    return email.strip().lower() if email else None
+
 class ClientModel(Base):
     __tablename__ = "clients"
     
@@ -19,6 +98,16 @@ class ClientModel(Base):
     company = Column(String, nullable=True)
     status = Column(String, default="not_contacted")
     last_contact = Column(String, nullable=True) # Storing as ISO strings
+    email_normalized = Column(String, nullable=True) # lower(trim(email)), unique
+
+    __table_args__ = (
+        Index("ux_clients_email_normalized", "email_normalized", unique=True),
+    )
+
+    @validates("email")
+    def _normalize_email(self, key, email):
+        self.email_normalized = normalize_email(email)
+        return email
 
 class TaskModel(Base):
     __tablename__ = "tasks"
@@ -33,16 +122,78 @@ class TaskModel(Base):
     priority = Column(String)
     completed = Column(Boolean, default=False)
 
+    __table_args__ = (
+        # The task views filter on the flags and range-scan the due date in id order
+        Index("ix_tasks_completed_due", "completed", "due_date", "id"),
+        Index("ix_tasks_priority_due", "priority", "completed", "due_date", "id"),
+        Index("ix_tasks_client_email", "client_email"),
+    )
+
 class EmailLogModel(Base):
     __tablename__ = "email_logs"
     
     id = Column(String, primary_key=True, index=True)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow, index=True)
     recipient_count = Column(Integer)
     subject = Column(String)
     body = Column(String)
     status = Column(String)
-    recipients = Column(String) # Storing list as comma-separated string for simple SQLite
+    recipients = Column(String, nullable=True) # Legacy comma-separated ids; see EmailDeliveryModel
+
+class EmailDeliveryModel(Base):
+    """One row per recipient of an email log: what happened to that message."""
+    __tablename__ = "email_deliveries"
+    __table_args__ = (
+        # "What was sent to client X" is an index-only lookup of log ids
+        Index("ix_email_deliveries_client_log", "client_id", "log_id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    log_id = Column(String, index=True)
+    client_id = Column(String)
+    email = Column(String, nullable=True)
+    status = Column(String) # sent, failed, sent_mock, skipped (job stopped before it)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    sent_at = Column(DateTime, nullable=True)
+
+class SendJobModel(Base):
+    __tablename__ = "send_jobs"
+    
+    id = Column(String, primary_key=True, index=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    status = Column(String, default="queued", index=True) # queued, running, completed, failed
+    subject = Column(String)
+    body = Column(String)
+    template_id = Column(String, nullable=True)
+    recipient_ids = Column(String) # Comma-separated, same as EmailLogModel.recipients
+    attachment_ids = Column(String, nullable=True)
+    total_count = Column(Integer, default=0)
+    sent_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    error = Column(String, nullable=True)
+
+class SenderQuotaModel(Base):
+    """Sends used per sender account in the current hour and day, shared by all workers."""
+    __tablename__ = "sender_quotas"
+
+    account = Column(String, primary_key=True) # SenderAccount.key
+    hour_start = Column(String, nullable=True) # "YYYY-MM-DDTHH" (UTC) the hour_sent count belongs to
+    hour_sent = Column(Integer, default=0)
+    day_start = Column(String, nullable=True) # "YYYY-MM-DD" (UTC)
+    day_sent = Column(Integer, default=0)
+    throttled_until = Column(DateTime, nullable=True)
+
+class TableVersionModel(Base):
+    """Change counter per listed table, bumped by every write to it (see impl/etags.py)."""
+    __tablename__ = "table_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+
+# Tables whose list endpoints answer conditional GETs
+VERSIONED_TABLES = ("clients", "tasks", "templates", "attachments")
 
 class TemplateModel(Base):
     __tablename__ = "templates"
@@ -58,15 +209,240 @@ class AttachmentModel(Base):
     id = Column(String, primary_key=True, index=True)
     filename = Column(String)
     file_path = Column(String)
-    size = Column(String)
+    size = Column(String, nullable=True) # Legacy "1.2 MB" string; see size_bytes
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    sha256 = Column(String, nullable=True, index=True) # AttachmentBlobModel; None for legacy per-upload files
+    size_bytes = Column(Integer, nullable=True)
+    mime_type = Column(String, nullable=True)
+
+class AttachmentBlobModel(Base):
+    """One stored attachment file, shared by every attachment with the same content."""
+    __tablename__ = "attachment_blobs"
+
+    sha256 = Column(String, primary_key=True)
+    size_bytes = Column(Integer)
+    refcount = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class CampaignModel(Base):
+    """A follow-up sequence: templates sent one after another to each enrolled client."""
+    __tablename__ = "campaigns"
+
+    id = Column(String, primary_key=True, index=True)
+    name = Column(String)
+    steps = Column(String) # JSON list of {"template_id", "delay_minutes"}; fixed once created
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class ScheduledSendModel(Base):
+    """The next step of a campaign due for one enrolled client."""
+    __tablename__ = "scheduled_sends"
+    __table_args__ = (
+        # The scheduler's queue: the first pending entry is the next step due
+        Index("ix_scheduled_sends_due", "status", "due_at"),
+        Index("ux_scheduled_sends_enrollment", "campaign_id", "client_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    campaign_id = Column(String)
+    client_id = Column(String)
+    step = Column(Integer, default=0) # Index into the campaign's steps
+    due_at = Column(DateTime) # Naive UTC
+    status = Column(String, default="pending") # pending, completed, stopped (client replied or closed)
+    claim = Column(String, nullable=True) # Set only inside the transaction that hands the step to a send job
+    job_id = Column(String, nullable=True) # Send job of the last step sent
+
+# Full-text search over clients (see openapi_server/impl/client_search.py).
+# SQLite: an external-content FTS5 table kept in sync by triggers. It is keyed
+# on clients.rowid, so run "INSERT INTO clients_fts(clients_fts) VALUES('rebuild')"
+# after a VACUUM. Postgres: a pg_trgm GIN index on the concatenated columns.
+SQLITE_CLIENT_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+        name, email, company,
+        content='clients', content_rowid='rowid', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS clients_fts_ai AFTER INSERT ON clients BEGIN
+        INSERT INTO clients_fts(rowid, name, email, company)
+        VALUES (new.rowid, new.name, new.email, new.company);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS clients_fts_ad AFTER DELETE ON clients BEGIN
+        INSERT INTO clients_fts(clients_fts, rowid, name, email, company)
+        VALUES ('delete', old.rowid, old.name, old.email, old.company);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS clients_fts_au AFTER UPDATE OF name, email, company ON clients BEGIN
+        INSERT INTO clients_fts(clients_fts, rowid, name, email, company)
+        VALUES ('delete', old.rowid, old.name, old.email, old.company);
+        INSERT INTO clients_fts(rowid, name, email, company)
+        VALUES (new.rowid, new.name, new.email, new.company);
+    END""",
+]
+
+POSTGRES_CLIENT_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """CREATE INDEX IF NOT EXISTS ix_clients_search_trgm ON clients USING gin (
+        (coalesce(name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(company, ''))
+        gin_trgm_ops
+    )""",
+]
+
+_search_backends = weakref.WeakKeyDictionary()
+
+@event.listens_for(Base.metadata, "after_create")
+def install_client_search(target, connection, **kw):
+    backend = "like"
+    if connection.dialect.name == "sqlite":
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'clients_fts'"
+        ).first()
+        try:
+            with connection.begin_nested():
+                for ddl in SQLITE_CLIENT_SEARCH_DDL:
+                    connection.exec_driver_sql(ddl)
+                if not exists:
+                    # Index the clients that were there before the FTS table
+                    connection.exec_driver_sql("INSERT INTO clients_fts(clients_fts) VALUES ('rebuild')")
+            backend = "fts5"
+        except DBAPIError as e:
+            print(f"FTS5 unavailable, client search falls back to LIKE: {e}")
+    elif connection.dialect.name == "postgresql":
+        try:
+            with connection.begin_nested():
+                for ddl in POSTGRES_CLIENT_SEARCH_DDL:
+                    connection.exec_driver_sql(ddl)
+            backend = "trigram"
+        except DBAPIError as e:
+            print(f"pg_trgm unavailable, client search falls back to ILIKE: {e}")
+    _search_backends[connection.engine] = backend
+
+def client_search_backend(bind) -> str:
+    """"fts5", "trigram" or "like", as decided when the tables were created."""
+    return _search_backends.get(getattr(bind, "engine", bind), "like")
+
+@event.listens_for(Base.metadata, "after_create")
+def migrate_client_email_index(target, connection, **kw):
+    """Add and backfill ``clients.email_normalized`` on databases that predate it."""
+    columns = {c["name"] for c in inspect(connection).get_columns("clients")}
+    if "email_normalized" not in columns:
+        connection.exec_driver_sql("ALTER TABLE clients ADD COLUMN email_normalized VARCHAR")
+        # Duplicates used to be allowed; only the first client per email gets the key
+        connection.exec_driver_sql(
+            "UPDATE clients SET email_normalized = lower(trim(email)) WHERE id IN "
+            "(SELECT min(id) FROM clients WHERE email IS NOT NULL GROUP BY lower(trim(email)))"
+        )
+    for index in ClientModel.__table__.indexes:
+        if index.name == "ux_clients_email_normalized":
+            index.create(connection, checkfirst=True)
+
+@event.listens_for(Base.metadata, "after_create")
+def migrate_email_deliveries(target, connection, tables=(), **kw):
+    """Split the recipients of logs written before ``email_deliveries`` existed into rows."""
+    if EmailDeliveryModel.__table__ not in tables:
+        return
+    logs = connection.execute(
+        EmailLogModel.__table__.select()
+        .with_only_columns(EmailLogModel.id, EmailLogModel.status, EmailLogModel.timestamp, EmailLogModel.recipients)
+        .where(EmailLogModel.recipients.is_not(None))
+    )
+    for log in logs.partitions(500):
+        rows = [
+            # Only the log's overall status was kept for these
+            {"log_id": log_id, "client_id": client_id, "email": None, "status": status,
+             "error": None, "attempts": 1, "sent_at": timestamp}
+            for log_id, status, timestamp, recipients in log
+            for client_id in recipients.split(",") if client_id
+        ]
+        if rows:
+            connection.execute(insert(EmailDeliveryModel.__table__), rows)
+
+@event.listens_for(Base.metadata, "after_create")
+def migrate_email_log_indexes(target, connection, **kw):
+    """Index ``email_logs.timestamp`` on databases created before it was."""
+    for index in EmailLogModel.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+@event.listens_for(Base.metadata, "after_create")
+def migrate_task_indexes(target, connection, **kw):
+    """Index the task filters on databases created before they were."""
+    for index in TaskModel.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+@event.listens_for(Base.metadata, "after_create")
+def seed_table_versions(target, connection, **kw):
+    """Give every versioned table a row, so bumping it is a plain UPDATE."""
+    existing = set(connection.execute(TableVersionModel.__table__.select()
+                                      .with_only_columns(TableVersionModel.name)).scalars())
+    missing = [{"name": name, "version": 0} for name in VERSIONED_TABLES if name not in existing]
+    if missing:
+        connection.execute(insert(TableVersionModel.__table__), missing)
+
+@event.listens_for(Base.metadata, "after_create")
+def migrate_attachment_metadata(target, connection, **kw):
+    """Add the content-store columns to ``attachments`` and fill in size and type for old uploads."""
+    import mimetypes
+
+    columns = {c["name"] for c in inspect(connection).get_columns("attachments")}
+    for name, ddl in (("sha256", "VARCHAR"), ("size_bytes", "INTEGER"), ("mime_type", "VARCHAR")):
+        if name not in columns:
+            connection.exec_driver_sql(f"ALTER TABLE attachments ADD COLUMN {name} {ddl}")
+    for index in AttachmentModel.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+    table = AttachmentModel.__table__
+    legacy = connection.execute(
+        table.select().with_only_columns(table.c.id, table.c.filename, table.c.file_path)
+        .where(table.c.size_bytes.is_(None))
+    ).all()
+    for attachment_id, filename, file_path in legacy:
+        # The one stat and guess these uploads will need
+        ctype, encoding = mimetypes.guess_type(filename or file_path or "")
+        size = os.path.getsize(file_path) if file_path and os.path.exists(file_path) else 0
+        connection.execute(table.update().where(table.c.id == attachment_id).values(
+            size_bytes=size, mime_type=ctype if ctype and encoding is None else "application/octet-stream"))
+
+def insert_client_ignoring_duplicates(bind):
+    """``INSERT INTO clients ... ON CONFLICT (email_normalized) DO NOTHING``.
+
+    Dialects without ``ON CONFLICT`` get a plain insert, so a duplicate raises
+    ``IntegrityError`` from the unique index instead.
+    """
+    return insert_ignoring_duplicates(bind, ClientModel.__table__, ["email_normalized"])
+
+def insert_ignoring_duplicates(bind, table, index_elements):
+    """``INSERT ... ON CONFLICT (index_elements) DO NOTHING`` where the dialect has it."""
+    if bind.dialect.name == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=index_elements)
+    if bind.dialect.name == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(index_elements=index_elements)
+    return insert(table)
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+_search_backends[async_engine.sync_engine] = client_search_backend(engine)
+
+def chunked(items, size):
+    """Split a sequence into lists of at most ``size`` items, e.g. for ``IN (...)`` queries."""
+    for start in range(0, len(items), size):
+        yield list(items[start:start + size])
 
-def get_db():
-    db = SessionLocal()
+_request_session = ContextVar("request_session", default=None)
+
+async def get_db():
+    """Request-scoped ``AsyncSession`` dependency: rolled back on error, always closed.
+
+    The session is also published through ``current_session()`` so the API
+    implementation can reach it without threading it through every call.
+    """
+    db = AsyncSessionLocal()
+    _request_session.set(db)
     try:
         yield db
+    except BaseException:
+        await db.rollback()
+        raise
     finally:
-        db.close()
+        await db.close()
+
+def current_session():
+    db = _request_session.get()
+    if db is None:
+        raise RuntimeError("No database session for this request; is get_db a dependency of the route?")
+    return db
@@ -1,5 +1,7 @@
 # coding: utf-8
 
+from datetime import date, datetime
+from functools import lru_cache
 from typing import Dict, List  # noqa: F401
 import importlib
 import pkgutil
@@ -23,26 +25,38 @@ from fastapi import (  # noqa: F401
     File,
 )
 
+from database import get_db
 from openapi_server.models.extra_models import TokenModel  # noqa: F401
+from openapi_server.impl.pagination import MAX_PAGE_SIZE
 from openapi_server.models.client import Client
 from openapi_server.models.client_create import ClientCreate
 from openapi_server.models.email_request import EmailRequest
 from openapi_server.models.import_clients_excel200_response import ImportClientsExcel200Response
 from openapi_server.models.import_clients_google_sheet_request import ImportClientsGoogleSheetRequest
-from openapi_server.models.send_email200_response import SendEmail200Response
+from openapi_server.models.campaign import Campaign, CampaignEnrollment, CampaignEnrollmentResult
+from openapi_server.models.send_job import SendJob
 from openapi_server.models.task import Task
+from openapi_server.models.task_counts import TaskCounts
 from openapi_server.models.email_log import EmailLog
+from openapi_server.models.email_delivery import EmailDelivery
 from openapi_server.models.template import Template
 from openapi_server.models.email_attachment import EmailAttachment
 
 
-router = APIRouter()
+# Every route gets a session that is closed as soon as the handler returns
+router = APIRouter(dependencies=[Depends(get_db, scope="function")])
 
 ns_pkg = openapi_server.impl
 for _, name, _ in pkgutil.iter_modules(ns_pkg.__path__, ns_pkg.__name__ + "."):
     importlib.import_module(name)
 
 
+@lru_cache(maxsize=None)
+def default_api() -> BaseDefaultApi:
+    """The implementation keeps no per-request state, so one instance serves every request."""
+    return BaseDefaultApi.subclasses[0]()
+
+
 @router.post(
     "/clients",
     responses={
@@ -56,7 +70,7 @@ async def create_client(
     client_create: ClientCreate = Body(description=""),
 ) -> Client:
     """Manually create a single client."""
-    return await BaseDefaultApi.subclasses[0]().create_client(client_create)
+    return await default_api().create_client(client_create)
 
 
 @router.delete(
@@ -72,7 +86,7 @@ async def delete_client(
     client_id: str = Path(..., description=""),
 ) -> None:
     """Delete a specific client by ID."""
-    return await BaseDefaultApi.subclasses[0]().delete_client(client_id)
+    return await default_api().delete_client(client_id)
 
 
 @router.get(
@@ -86,9 +100,14 @@ async def delete_client(
 )
 async def get_clients(
     search: str = Query(None, description="Search term for name, email, or company", alias="search"),
+    limit: int = Query(None, description="Page size", alias="limit", ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page", alias="cursor"),
+    accept: str = Header(None, description="application/x-ndjson streams every row instead of one page"),
+    if_none_match: str = Header(None, description="ETag of a previous response; 304 if the list is unchanged"),
+    response: Response = None,
 ) -> List[Client]:
     """Retrieve a list of clients with optional filtering."""
-    return await BaseDefaultApi.subclasses[0]().get_clients(search)
+    return await default_api().get_clients(search, limit, cursor, accept, response, if_none_match)
 
 
 @router.post(
@@ -103,15 +122,19 @@ async def get_clients(
 async def import_clients_excel(
     file: UploadFile = File(..., description="Excel file (.xlsx, .xls)"),
     skip_duplicates: bool = Query(False, description="If true, skip existing clients instead of erroring"),
+    summary_only: bool = Query(False, description="If true, return the count and a sample of the imported clients"),
 ) -> ImportClientsExcel200Response:
     """Upload an Excel file to bulk import clients."""
-    return await BaseDefaultApi.subclasses[0]().import_clients_excel(file, skip_duplicates)
+    return await default_api().import_clients_excel(file, skip_duplicates, summary_only)
 
 
 @router.post(
     "/clients/import/google-sheet",
     responses={
         200: {"model": ImportClientsExcel200Response, "description": "Clients imported successfully"},
+        409: {"description": "Some clients already exist; nothing was imported"},
+        413: {"description": "The sheet is over the size or row limit"},
+        422: {"description": "Not a Google Sheets link, or the sheet is not shared"},
     },
     tags=["default"],
     summary="Import clients from Google Sheet",
@@ -119,25 +142,101 @@ async def import_clients_excel(
 )
 async def import_clients_google_sheet(
     import_clients_google_sheet_request: ImportClientsGoogleSheetRequest = Body(description=""),
+    skip_duplicates: bool = Query(False, description="If true, skip existing clients instead of erroring"),
+    summary_only: bool = Query(False, description="If true, return the count and a sample of the imported clients"),
 ) -> ImportClientsExcel200Response:
     """Import clients from a public or shared Google Sheet URL."""
-    return await BaseDefaultApi.subclasses[0]().import_clients_google_sheet(import_clients_google_sheet_request)
+    return await default_api().import_clients_google_sheet(import_clients_google_sheet_request,
+                                                           skip_duplicates, summary_only)
 
 
 @router.post(
     "/email/send",
     responses={
-        200: {"model": SendEmail200Response, "description": "Emails accepted for delivery"},
+        202: {"model": SendJob, "description": "Emails accepted for delivery"},
     },
     tags=["default"],
     summary="Send email",
     response_model_by_alias=True,
+    status_code=202,
 )
 async def send_email(
     email_request: EmailRequest = Body(description=""),
-) -> SendEmail200Response:
-    """Send an email to a list of clients."""
-    return await BaseDefaultApi.subclasses[0]().send_email(email_request)
+) -> SendJob:
+    """Queue an email to a list of clients for background delivery."""
+    return await default_api().send_email(email_request)
+
+
+@router.get(
+    "/email/jobs/{job_id}",
+    responses={
+        200: {"model": SendJob, "description": "Successful response"},
+        404: {"description": "Send job not found"},
+    },
+    tags=["default"],
+    summary="Get send job",
+    response_model_by_alias=True,
+)
+async def get_send_job(
+    job_id: str = Path(..., description=""),
+) -> SendJob:
+    """Retrieve the progress of a send job."""
+    return await default_api().get_send_job(job_id)
+
+
+@router.post(
+    "/campaigns",
+    responses={
+        201: {"model": Campaign, "description": "Campaign created"},
+        400: {"description": "No steps, or a step's template does not exist"},
+    },
+    tags=["default"],
+    summary="Create a follow-up campaign",
+    response_model_by_alias=True,
+    status_code=201,
+)
+async def create_campaign(
+    campaign: Campaign = Body(description=""),
+) -> Campaign:
+    """Create a follow-up sequence of templates."""
+    return await default_api().create_campaign(campaign)
+
+
+@router.get(
+    "/campaigns",
+    responses={
+        200: {"model": List[Campaign], "description": "Successful response"},
+    },
+    tags=["default"],
+    summary="List campaigns",
+    response_model_by_alias=True,
+)
+async def get_campaigns(
+    limit: int = Query(None, description="Page size", alias="limit", ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page", alias="cursor"),
+    accept: str = Header(None, description="application/x-ndjson streams every row instead of one page"),
+    response: Response = None,
+) -> List[Campaign]:
+    """Retrieve the campaigns, newest first."""
+    return await default_api().get_campaigns(limit, cursor, accept, response)
+
+
+@router.post(
+    "/campaigns/{campaign_id}/enrollments",
+    responses={
+        200: {"model": CampaignEnrollmentResult, "description": "Clients enrolled"},
+        404: {"description": "Campaign not found"},
+    },
+    tags=["default"],
+    summary="Enroll clients in a campaign",
+    response_model_by_alias=True,
+)
+async def enroll_campaign_clients(
+    campaign_id: str = Path(..., description=""),
+    enrollment: CampaignEnrollment = Body(description=""),
+) -> CampaignEnrollmentResult:
+    """Schedule a campaign's first step for each client not already enrolled."""
+    return await default_api().enroll_campaign_clients(campaign_id, enrollment)
 
 
 @router.get(
@@ -149,9 +248,15 @@ async def send_email(
     summary="List attachments",
     response_model_by_alias=True,
 )
-async def get_attachments() -> List[EmailAttachment]:
+async def get_attachments(
+    limit: int = Query(None, description="Page size", alias="limit", ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page", alias="cursor"),
+    accept: str = Header(None, description="application/x-ndjson streams every row instead of one page"),
+    if_none_match: str = Header(None, description="ETag of a previous response; 304 if the list is unchanged"),
+    response: Response = None,
+) -> List[EmailAttachment]:
     """Retrieve a list of uploaded attachments."""
-    return await BaseDefaultApi.subclasses[0]().get_attachments()
+    return await default_api().get_attachments(limit, cursor, accept, response, if_none_match)
 
 
 @router.post(
@@ -167,7 +272,45 @@ async def upload_attachment(
     file: UploadFile = File(..., description=""),
 ) -> EmailAttachment:
     """Upload a new file."""
-    return await BaseDefaultApi.subclasses[0]().upload_attachment(file)
+    return await default_api().upload_attachment(file)
+
+
+@router.get(
+    "/attachments/{attachment_id}/content",
+    responses={
+        200: {"description": "The file"},
+        206: {"description": "The requested byte range"},
+        304: {"description": "Unchanged since the ETag in If-None-Match"},
+        404: {"description": "Attachment not found"},
+    },
+    tags=["default"],
+    summary="Download attachment",
+    response_model_by_alias=True,
+)
+async def get_attachment_content(
+    attachment_id: str = Path(..., description=""),
+    download: bool = Query(False, description="Send as a download rather than for inline preview"),
+    if_none_match: str = Header(None, description="ETag of a previous response; 304 if it still matches"),
+):
+    """The attachment's bytes, streamed from disk; honours Range and If-Range."""
+    return await default_api().get_attachment_content(attachment_id, download, if_none_match)
+
+
+@router.delete(
+    "/attachments/{attachment_id}",
+    responses={
+        204: {"description": "Attachment deleted successfully"},
+        404: {"description": "Attachment not found"},
+    },
+    tags=["default"],
+    summary="Delete attachment",
+    response_model_by_alias=True,
+)
+async def delete_attachment(
+    attachment_id: str = Path(..., description=""),
+) -> None:
+    """Delete an attachment."""
+    return await default_api().delete_attachment(attachment_id)
 
 
 @router.get(
@@ -179,9 +322,15 @@ async def upload_attachment(
     summary="List templates",
     response_model_by_alias=True,
 )
-async def get_templates() -> List[Template]:
+async def get_templates(
+    limit: int = Query(None, description="Page size", alias="limit", ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page", alias="cursor"),
+    accept: str = Header(None, description="application/x-ndjson streams every row instead of one page"),
+    if_none_match: str = Header(None, description="ETag of a previous response; 304 if the list is unchanged"),
+    response: Response = None,
+) -> List[Template]:
     """Retrieve a list of templates."""
-    return await BaseDefaultApi.subclasses[0]().get_templates()
+    return await default_api().get_templates(limit, cursor, accept, response, if_none_match)
 
 
 @router.post(
@@ -197,13 +346,14 @@ async def create_template(
     template: Template = Body(None, description=""),
 ) -> Template:
     """Create a new email template."""
-    return await BaseDefaultApi.subclasses[0]().create_template(template)
+    return await default_api().create_template(template)
 
 
 @router.delete(
     "/templates/{template_id}",
     responses={
         204: {"description": "Template deleted successfully"},
+        409: {"description": "A campaign step still sends the template"},
     },
     tags=["default"],
     summary="Delete template",
@@ -213,7 +363,7 @@ async def delete_template(
     template_id: str = Path(..., description=""),
 ) -> None:
     """Delete a specific template."""
-    return await BaseDefaultApi.subclasses[0]().delete_template(template_id)
+    return await default_api().delete_template(template_id)
 
 
 @router.put(
@@ -230,7 +380,25 @@ async def update_template(
     template: Template = Body(None, description=""),
 ) -> Template:
     """Update an existing template."""
-    return await BaseDefaultApi.subclasses[0]().update_template(template_id, template)
+    return await default_api().update_template(template_id, template)
+
+
+@router.get(
+    "/tasks/counts",
+    responses={
+        200: {"model": TaskCounts, "description": "Successful response"},
+    },
+    tags=["default"],
+    summary="Count tasks",
+    response_model_by_alias=True,
+)
+async def get_task_counts(
+    today: date = Query(None, description="The caller's date, for overdue and due today; default the server's"),
+    if_none_match: str = Header(None, description="ETag of a previous response; 304 if the tasks are unchanged"),
+    response: Response = None,
+) -> TaskCounts:
+    """Open, completed, overdue and due-today task counts."""
+    return await default_api().get_task_counts(today, response, if_none_match)
 
 
 @router.get(
@@ -242,9 +410,21 @@ async def update_template(
     summary="List tasks",
     response_model_by_alias=True,
 )
-async def get_tasks() -> List[Task]:
-    """Retrieve a list of tasks."""
-    return await BaseDefaultApi.subclasses[0]().get_tasks()
+async def get_tasks(
+    limit: int = Query(None, description="Page size", alias="limit", ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page", alias="cursor"),
+    completed: bool = Query(None, description="Only completed (true) or open (false) tasks", alias="completed"),
+    priority: str = Query(None, description="Only tasks with this priority", alias="priority"),
+    due_before: date = Query(None, description="Only tasks due before this date", alias="due_before"),
+    due_after: date = Query(None, description="Only tasks due on or after this date", alias="due_after"),
+    client_email: str = Query(None, description="Only tasks for this client email", alias="client_email"),
+    accept: str = Header(None, description="application/x-ndjson streams every row instead of one page"),
+    if_none_match: str = Header(None, description="ETag of a previous response; 304 if the list is unchanged"),
+    response: Response = None,
+) -> List[Task]:
+    """Retrieve a list of tasks; with a due date filter they come in due date order."""
+    return await default_api().get_tasks(limit, cursor, accept, response, if_none_match,
+                                         completed, priority, due_before, due_after, client_email)
 
 
 @router.get(
@@ -256,6 +436,53 @@ async def get_tasks() -> List[Task]:
     summary="Get email history",
     response_model_by_alias=True,
 )
-async def get_email_history() -> List[EmailLog]:
-    """Retrieve a log of sent emails."""
-    return await BaseDefaultApi.subclasses[0]().get_email_history()
+async def get_email_history(
+    limit: int = Query(None, description="Page size", alias="limit", ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page", alias="cursor"),
+    client_id: str = Query(None, description="Only sends that included this client", alias="client_id"),
+    since: datetime = Query(None, description="Only sends at or after this time", alias="since"),
+    until: datetime = Query(None, description="Only sends before this time", alias="until"),
+    status: str = Query(None, description="Only sends with this status, e.g. failed", alias="status"),
+    accept: str = Header(None, description="application/x-ndjson streams every row instead of one page"),
+    response: Response = None,
+) -> List[EmailLog]:
+    """Retrieve a log of sent emails, without their bodies."""
+    return await default_api().get_email_history(limit, cursor, accept, response, client_id, since, until, status)
+
+
+@router.get(
+    "/email/history/{log_id}",
+    responses={
+        200: {"model": EmailLog, "description": "Successful response"},
+        404: {"description": "Email log not found"},
+    },
+    tags=["default"],
+    summary="Get a logged email",
+    response_model_by_alias=True,
+)
+async def get_email_log(
+    log_id: str = Path(..., description=""),
+) -> EmailLog:
+    """One logged send, with its body and recipients."""
+    return await default_api().get_email_log(log_id)
+
+
+@router.get(
+    "/email/history/{log_id}/deliveries",
+    responses={
+        200: {"model": List[EmailDelivery], "description": "Successful response"},
+    },
+    tags=["default"],
+    summary="Get deliveries of a send",
+    response_model_by_alias=True,
+)
+async def get_email_deliveries(
+    log_id: str = Path(..., description=""),
+    status: str = Query(None, description="Only deliveries with this status, e.g. failed", alias="status"),
+    limit: int = Query(None, description="Page size", alias="limit", ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None, description="Value of X-Next-Cursor from the previous page", alias="cursor"),
+    accept: str = Header(None, description="application/x-ndjson streams every row instead of one page"),
+    response: Response = None,
+) -> List[EmailDelivery]:
+    """Per-recipient outcome of one logged send."""
+    return await default_api().get_email_deliveries(log_id, status, limit, cursor, accept, response)
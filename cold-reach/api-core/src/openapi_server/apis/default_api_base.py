@@ -2,12 +2,14 @@
 
 from typing import ClassVar, Dict, List, Tuple  # noqa: F401
 
+from fastapi import Response
+
 from openapi_server.models.client import Client
 from openapi_server.models.client_create import ClientCreate
 from openapi_server.models.email_request import EmailRequest
 from openapi_server.models.import_clients_excel200_response import ImportClientsExcel200Response
 from openapi_server.models.import_clients_google_sheet_request import ImportClientsGoogleSheetRequest
-from openapi_server.models.send_email200_response import SendEmail200Response
+from openapi_server.models.send_job import SendJob
 
 
 class BaseDefaultApi:
@@ -35,6 +37,11 @@ class BaseDefaultApi:
     async def get_clients(
         self,
         search: str,
+        limit: int,
+        cursor: str,
+        accept: str,
+        response: Response,
+        if_none_match: str,
     ) -> List[Client]:
         """Retrieve a list of clients with optional filtering."""
         ...
@@ -51,6 +58,8 @@ class BaseDefaultApi:
     async def import_clients_google_sheet(
         self,
         import_clients_google_sheet_request: ImportClientsGoogleSheetRequest,
+        skip_duplicates: bool = False,
+        summary_only: bool = False,
     ) -> ImportClientsExcel200Response:
         """Import clients from a public or shared Google Sheet URL."""
         ...
@@ -59,6 +68,14 @@ class BaseDefaultApi:
     async def send_email(
         self,
         email_request: EmailRequest,
-    ) -> SendEmail200Response:
-        """Send an email to a list of clients."""
+    ) -> SendJob:
+        """Queue an email to a list of clients for background delivery."""
+        ...
+
+
+    async def get_send_job(
+        self,
+        job_id: str,
+    ) -> SendJob:
+        """Retrieve the progress of a send job."""
         ...
@@ -0,0 +1,223 @@
+# coding: utf-8
+
+"""Asyncio SMTP transport for the send path, built on aiosmtplib.
+
+Every session lives on one event loop running in the ``smtp-io`` daemon
+thread, so up to ``size`` messages per account are in flight at once without
+a thread per session. Send workers hand over a chunk of messages and block on
+the result. When aiosmtplib is not installed, ``get_smtp_pool`` falls back to
+``SMTPConnectionPool`` (smtplib on a bounded thread pool).
+"""
+
+import asyncio
+import smtplib
+import threading
+import time
+from collections import deque
+from typing import Deque, List, Optional
+
+try:
+    import aiosmtplib
+except ImportError:  # get_smtp_pool uses the smtplib transport instead
+    aiosmtplib = None
+
+from openapi_server.impl.smtp_pool import (
+    SMTP_AUTH_RETRY_AFTER,
+    SMTP_POOL_HEALTH_CHECK_AFTER,
+    SMTP_POOL_IDLE_TIMEOUT,
+    SMTP_POOL_MAX_MESSAGES,
+    SMTP_POOL_SIZE,
+    SMTP_STARTTLS,
+    SMTP_TIMEOUT,
+    get_ssl_context,
+)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def smtp_loop() -> asyncio.AbstractEventLoop:
+    """The event loop all async SMTP sessions run on, started on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="smtp-io", daemon=True).start()
+        return _loop
+
+
+def run(coro):
+    """Run ``coro`` on the SMTP loop and block the calling thread until it is done."""
+    return asyncio.run_coroutine_threadsafe(coro, smtp_loop()).result()
+
+
+class _PooledConnection:
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+    async def close(self) -> None:
+        try:
+            await self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+
+def _is_reconnectable(exc: Exception) -> bool:
+    """True for errors that mean the session is gone, not that the message is bad."""
+    if isinstance(exc, aiosmtplib.SMTPResponseException) and exc.code == 421:
+        return True
+    return isinstance(exc, (aiosmtplib.SMTPServerDisconnected, asyncio.TimeoutError, ConnectionError))
+
+
+def _is_refusal(exc: Exception) -> bool:
+    """True when the server refused the message and aiosmtplib reset the envelope."""
+    refused = (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPResponseException)
+    return isinstance(exc, refused) and not _is_reconnectable(exc)
+
+
+class AsyncSMTPConnectionPool:
+    """Bounded pool of logged-in aiosmtplib sessions.
+
+    Same policy as ``SMTPConnectionPool`` (LIFO reuse, NOOP health checks,
+    idle expiry, message cap, one reconnect on a dropped session) and the
+    same blocking ``send_message`` / ``send_messages`` interface.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: str,
+        size: int = SMTP_POOL_SIZE,
+        idle_timeout: float = SMTP_POOL_IDLE_TIMEOUT,
+        max_messages: int = SMTP_POOL_MAX_MESSAGES,
+        timeout: float = SMTP_TIMEOUT,
+        health_check_after: float = SMTP_POOL_HEALTH_CHECK_AFTER,
+        starttls: bool = SMTP_STARTTLS,
+        auth_retry_after: float = SMTP_AUTH_RETRY_AFTER,
+    ):
+        if aiosmtplib is None:
+            raise RuntimeError("aiosmtplib is not installed")
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.starttls = starttls
+        self.auth_retry_after = auth_retry_after
+
+        self._idle: Deque[_PooledConnection] = deque()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._auth_error: Optional[smtplib.SMTPAuthenticationError] = None
+        self._auth_failed_at = 0.0
+        self._closed = False
+
+    async def _connect(self) -> _PooledConnection:
+        if self._auth_error is not None:
+            if time.monotonic() - self._auth_failed_at < self.auth_retry_after:
+                raise self._auth_error
+            self._auth_error = None
+        smtp = aiosmtplib.SMTP(
+            hostname=self.host, port=self.port, timeout=self.timeout,
+            start_tls=self.starttls, tls_context=get_ssl_context() if self.starttls else None,
+        )
+        try:
+            await smtp.connect()
+            await smtp.login(self.username, self.password)
+        except aiosmtplib.SMTPAuthenticationError as e:
+            smtp.close()
+            # Raised as smtplib's error so the send path aborts the job either way
+            self._auth_error = smtplib.SMTPAuthenticationError(e.code, e.message)
+            self._auth_failed_at = time.monotonic()
+            raise self._auth_error from e
+        except Exception:
+            smtp.close()
+            raise
+        return _PooledConnection(smtp)
+
+    async def _is_healthy(self, conn: _PooledConnection) -> bool:
+        idle_for = time.monotonic() - conn.last_used
+        if idle_for > self.idle_timeout:
+            return False
+        if idle_for <= self.health_check_after:
+            return True
+        try:
+            await conn.smtp.noop()
+        except Exception:
+            return False
+        return True
+
+    async def _acquire(self) -> _PooledConnection:
+        while self._idle:
+            conn = self._idle.pop()
+            if await self._is_healthy(conn):
+                return conn
+            await conn.close()
+        return await self._connect()
+
+    async def _release(self, conn: _PooledConnection) -> None:
+        conn.last_used = time.monotonic()
+        if self._closed or conn.messages_sent >= self.max_messages:
+            await conn.close()
+            return
+        self._idle.append(conn)
+
+    async def _send_on(self, conn: _PooledConnection, msg) -> None:
+        try:
+            await conn.smtp.send_message(msg)
+        except Exception as e:
+            if _is_refusal(e):
+                await self._release(conn)
+            else:
+                await conn.close()
+            raise
+        conn.messages_sent += 1
+        await self._release(conn)
+
+    async def _send(self, msg) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        async with self._slots:
+            try:
+                await self._send_on(await self._acquire(), msg)
+            except Exception as e:
+                if not _is_reconnectable(e):
+                    raise
+                await self._send_on(await self._connect(), msg)
+
+    def send_message(self, msg) -> None:
+        """Send one message, reconnecting once if the session was dropped."""
+        run(self._send(msg))
+
+    def send_messages(self, messages) -> List[Optional[BaseException]]:
+        """Send ``messages`` over up to ``size`` sessions at once.
+
+        Returns, per message, the exception it failed with or ``None``.
+        """
+        async def send_all():
+            return await asyncio.gather(*(self._send(m) for m in messages), return_exceptions=True)
+
+        return [r if isinstance(r, BaseException) else None for r in run(send_all())]
+
+    def close(self) -> None:
+        """Log out of every idle session and stop pooling new ones."""
+        self._closed = True
+        if not self._idle:
+            return
+
+        async def close_idle():
+            idle, self._idle = list(self._idle), deque()
+            for conn in idle:
+                await conn.close()
+
+        run(close_idle())
@@ -0,0 +1,67 @@
+# coding: utf-8
+
+"""Attachments read, typed and base64-encoded once per send job.
+
+Every recipient of a campaign gets byte-identical attachment parts, so the
+file read, ``mimetypes`` guess and base64 encoding happen once in
+``prepare_attachments``; ``attach_prepared`` then splices a fresh part that
+shares the already-encoded payload into each personalised message.
+"""
+
+import mimetypes
+from email.message import EmailMessage, MIMEPart
+from typing import Iterable, List, Optional
+
+
+class PreparedAttachment:
+    """The encoded headers and payload of one attachment MIME part."""
+
+    def __init__(self, filename: str, data: bytes, maintype: str, subtype: str):
+        template = MIMEPart()
+        template.set_content(data, maintype=maintype, subtype=subtype, filename=filename)
+        self.filename = filename
+        self.size = len(data)
+        self.headers = list(template.items())
+        self.payload = template.get_payload()
+
+    @classmethod
+    def from_file(cls, file_path: str, filename: str, mime_type: Optional[str] = None) -> "PreparedAttachment":
+        ctype = mime_type
+        if ctype is None:
+            ctype, encoding = mimetypes.guess_type(file_path)
+            if ctype is None or encoding is not None:
+                # No guess could be made, or the file is encoded (compressed), so
+                # use a generic bag-of-bits type.
+                ctype = 'application/octet-stream'
+        maintype, subtype = ctype.split('/', 1)
+        with open(file_path, 'rb') as f:
+            return cls(filename, f.read(), maintype, subtype)
+
+    def to_part(self) -> MIMEPart:
+        # Parts are cheap shells around the shared payload string, so messages
+        # can be serialised concurrently without sharing mutable objects.
+        part = MIMEPart()
+        for name, value in self.headers:
+            part[name] = value
+        part.set_payload(self.payload)
+        return part
+
+
+def prepare_attachments(attachments: Iterable) -> List[PreparedAttachment]:
+    """Encode each attachment once for the whole send, with the type stored at upload."""
+    prepared = []
+    for a in attachments:
+        try:
+            prepared.append(PreparedAttachment.from_file(a.file_path, a.filename, getattr(a, "mime_type", None)))
+        except FileNotFoundError:
+            print(f"Attachment {a.filename} is missing from {a.file_path}; sending without it")
+    return prepared
+
+
+def attach_prepared(msg: EmailMessage, prepared: List[PreparedAttachment]) -> None:
+    """Same result as ``msg.add_attachment`` for each file, without re-encoding."""
+    if not prepared:
+        return
+    msg.make_mixed()
+    for attachment in prepared:
+        msg.attach(attachment.to_part())
@@ -0,0 +1,178 @@
+# coding: utf-8
+
+"""Content-addressed storage for uploaded attachments.
+
+An upload is copied to a staging file in fixed-size chunks while its
+SHA-256 is computed, so memory does not grow with the file. The bytes are
+then kept once, at ``<ATTACHMENT_STORE_DIR>/sha256/<ab>/<digest>``, however
+many attachments share them. ``attachment_blobs`` counts the attachments
+that reference each file; the file is removed when the last one is deleted.
+
+Blob rows and files are only changed inside transactions that also bump
+the ``attachments`` table version. That row lock (SQLite's write lock, or
+a row lock on other databases) orders an upload and a delete of the same
+content, so a delete cannot remove a file that an upload just reused.
+
+Files follow the transaction's outcome. A released file is moved aside
+under the lock and unlinked once the commit succeeds; a newly placed file
+is removed again if the transaction rolls back, and a released one is put
+back.
+"""
+
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+import uuid
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from database import AttachmentBlobModel
+from openapi_server.impl.etags import bump_versions
+
+ATTACHMENT_STORE_DIR = os.getenv("ATTACHMENT_STORE_DIR", os.path.join(os.getcwd(), "uploads"))
+# Gmail refuses messages over 25 MB
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(25 * 1024 * 1024)))
+ATTACHMENT_CHUNK_BYTES = 1024 * 1024
+
+GENERIC_MIME_TYPE = "application/octet-stream"
+
+# Session.info keys for the file changes waiting on the transaction's outcome
+_PLACED = "attachment_store.placed"
+_REMOVED = "attachment_store.removed"
+
+
+class StagedUpload(NamedTuple):
+    sha256: str
+    size: int
+    path: str
+
+
+def blob_path(sha256: str, root: Optional[str] = None) -> str:
+    return os.path.join(root or ATTACHMENT_STORE_DIR, "sha256", sha256[:2], sha256)
+
+
+def detect_mime_type(filename: Optional[str], declared: Optional[str] = None) -> str:
+    """The type from the file name, else the type the client declared."""
+    ctype, encoding = mimetypes.guess_type(filename or "")
+    if encoding is not None:
+        # Compressed (e.g. .tar.gz): send as a generic bag of bits
+        return GENERIC_MIME_TYPE
+    if ctype is None and declared and "/" in declared:
+        ctype = declared.split(";")[0].strip().lower()
+    return ctype or GENERIC_MIME_TYPE
+
+
+def stage_upload(source, max_bytes: Optional[int] = None, root: Optional[str] = None) -> StagedUpload:
+    """Copy a file object next to the store in chunks, hashing it on the way."""
+    max_bytes = max_bytes or ATTACHMENT_MAX_BYTES
+    staging = os.path.join(root or ATTACHMENT_STORE_DIR, "tmp")
+    os.makedirs(staging, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=staging)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = source.read(ATTACHMENT_CHUNK_BYTES)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Attachment exceeds the {max_bytes} byte limit",
+                    )
+                digest.update(block)
+                out.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    return StagedUpload(digest.hexdigest(), size, path)
+
+
+def _place(staged: StagedUpload, path: str) -> bool:
+    """Put the staged copy at ``path``; True if this call created the file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        return False
+    try:
+        # A link leaves the staging file for a replayed write; the caller removes it
+        os.link(staged.path, path)
+    except FileExistsError:
+        return False
+    except OSError:
+        shutil.copyfile(staged.path, path)
+    return True
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_on_commit(db, path: str) -> None:
+    """Remove ``path`` if the transaction on ``db`` commits; a rollback keeps it."""
+    # Moved aside in its own directory, so it is a rename on any file system
+    aside = f"{path}.{uuid.uuid4().hex}.deleted"
+    try:
+        os.rename(path, aside)
+    except FileNotFoundError:
+        return
+    db.info.setdefault(_REMOVED, []).append((aside, path))
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_files(session) -> None:
+    session.info.pop(_PLACED, None)
+    for aside, _ in session.info.pop(_REMOVED, ()):
+        _unlink(aside)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _roll_back_files(session, transaction) -> None:
+    # Whatever a commit did not claim was rolled back (or closed without a commit)
+    if transaction.parent is not None:
+        return
+    for path in session.info.pop(_PLACED, ()):
+        _unlink(path)
+    for aside, path in reversed(session.info.pop(_REMOVED, ())):
+        if os.path.exists(path):
+            _unlink(aside)
+        else:
+            os.rename(aside, path)
+
+
+def acquire_blob(db, staged: StagedUpload, root: Optional[str] = None) -> str:
+    """Reference the stored copy of ``staged``, storing it if it is new, and return its path.
+
+    Call it inside the transaction that adds the attachment row.
+    """
+    b = AttachmentBlobModel
+    bump_versions(db, "attachments")
+    if not db.execute(update(b).where(b.sha256 == staged.sha256).values(refcount=b.refcount + 1)).rowcount:
+        db.add(b(sha256=staged.sha256, size_bytes=staged.size, refcount=1))
+        db.flush()
+    path = blob_path(staged.sha256, root)
+    # Also restores a file lost after its row was kept
+    if _place(staged, path):
+        db.info.setdefault(_PLACED, []).append(path)
+    return path
+
+
+def release_blob(db, sha256: str, root: Optional[str] = None) -> None:
+    """Drop one reference to a stored file; the last one removes it once committed.
+
+    Call it inside the transaction that deletes the attachment row.
+    """
+    b = AttachmentBlobModel
+    bump_versions(db, "attachments")
+    db.execute(update(b).where(b.sha256 == sha256).values(refcount=b.refcount - 1))
+    if db.execute(b.__table__.delete().where(b.sha256 == sha256, b.refcount <= 0)).rowcount:
+        remove_on_commit(db, blob_path(sha256, root))
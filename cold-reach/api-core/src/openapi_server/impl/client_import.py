@@ -0,0 +1,441 @@
+# coding: utf-8
+
+"""Chunked client import pipeline shared by the Excel and Google Sheet imports.
+
+Uploads, and the CSV export of a Google Sheet (downloaded as a stream), are
+spooled to a temporary file and read back in fixed-size row chunks; each
+chunk is validated, checked against existing clients and committed before
+the next one is parsed, so memory depends on the chunk size rather than the
+file size (plus one lower-cased key per accepted email, used to drop repeats
+within the file).
+"""
+
+import csv
+import os
+import re
+import tempfile
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from database import (
+    ClientModel,
+    TaskModel,
+    chunked,
+    insert_client_ignoring_duplicates,
+)
+from openapi_server.impl.etags import bump_versions
+from openapi_server.models.client import Client
+from openapi_server.models.import_clients_excel200_response import (
+    ImportClientsExcel200Response,
+)
+from openapi_server.models.import_rejection import ImportRejection
+
+IMPORT_MAX_UPLOAD_BYTES = int(
+    os.getenv("IMPORT_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024))
+)
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "1000"))
+IMPORT_MAX_REJECTIONS = int(os.getenv("IMPORT_MAX_REJECTIONS", "1000"))
+IMPORT_SAMPLE_SIZE = int(os.getenv("IMPORT_SAMPLE_SIZE", "20"))
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "500000"))
+SPOOL_BUFFER_BYTES = 1024 * 1024
+
+# Sheets are fetched from here only, whatever host the submitted link names
+GOOGLE_SHEETS_URL = os.getenv(
+    "GOOGLE_SHEETS_URL", "https://docs.google.com"
+).rstrip("/")
+SHEET_CONNECT_TIMEOUT = float(os.getenv("SHEET_CONNECT_TIMEOUT", "10"))
+# Longest wait for the next block of the export, not for the whole download
+SHEET_READ_TIMEOUT = float(os.getenv("SHEET_READ_TIMEOUT", "60"))
+
+REQUIRED_COLUMNS = ["name", "email"]
+
+# (spreadsheet row number, {normalised column name: cell value})
+Row = Tuple[int, Dict[str, object]]
+# (spreadsheet row number, email as written, reason)
+Rejection = Tuple[int, Optional[str], str]
+
+
+def spool_upload(
+    source, suffix: str = "", max_bytes: int = IMPORT_MAX_UPLOAD_BYTES
+) -> str:
+    """Copy a file object to a temporary file, enforcing ``max_bytes``."""
+    blocks = iter(lambda: source.read(SPOOL_BUFFER_BYTES), b"")
+    return spool_blocks(blocks, suffix, max_bytes)
+
+
+def spool_blocks(
+    blocks: Iterable[bytes], suffix: str = "", max_bytes: int = IMPORT_MAX_UPLOAD_BYTES
+) -> str:
+    """Write byte blocks to a temporary file, enforcing ``max_bytes``."""
+    fd, path = tempfile.mkstemp(prefix="cold-reach-import-", suffix=suffix)
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for block in blocks:
+                written += len(block)
+                if written > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Upload exceeds the {max_bytes} byte import limit",
+                    )
+                out.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def normalize_columns(header: Iterable[object]) -> List[str]:
+    columns = [str(c).lower().strip() if c is not None else "" for c in header]
+    missing_cols = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing_cols:
+        raise HTTPException(status_code=422, detail=f"Missing columns: {missing_cols}")
+    return columns
+
+
+def chunk_rows(columns: List[str], rows: Iterable[tuple], first_row: int,
+               chunk_size: int) -> Iterator[List[Row]]:
+    """Zip raw row tuples with the header and group them into chunks."""
+    chunk: List[Row] = []
+    for number, values in enumerate(rows, first_row):
+        if not any(v is not None and v != "" for v in values):
+            continue
+        chunk.append((number, dict(zip(columns, values))))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_excel_chunks(
+    path: str, chunk_size: int = IMPORT_CHUNK_ROWS
+) -> Iterator[List[Row]]:
+    """Stream the first sheet of a workbook with openpyxl's read-only mode."""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise HTTPException(
+                status_code=422, detail=f"Missing columns: {REQUIRED_COLUMNS}"
+            )
+        yield from chunk_rows(normalize_columns(header), rows, 2, chunk_size)
+    finally:
+        wb.close()
+
+
+def iter_csv_chunks(
+    path: str, chunk_size: int = IMPORT_CHUNK_ROWS
+) -> Iterator[List[Row]]:
+    """Stream a CSV file with the csv module."""
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        rows = csv.reader(f)
+        header = next(rows, None)
+        if header is None:
+            raise HTTPException(
+                status_code=422, detail=f"Missing columns: {REQUIRED_COLUMNS}"
+            )
+        yield from chunk_rows(normalize_columns(header), rows, 2, chunk_size)
+
+
+EMAIL_PATTERN = re.compile(
+    r"[A-Za-z0-9.!#$%&'*+/=?^_`{|}~-]+"
+    r"@(?:[A-Za-z0-9](?:[A-Za-z0-9-]*[A-Za-z0-9])?\.)+[A-Za-z]{2,}"
+)
+
+# Rejection reasons reported back to the caller
+MISSING_EMAIL = "missing_email"
+INVALID_EMAIL = "invalid_email"
+DUPLICATE_IN_FILE = "duplicate_in_file"
+ALREADY_EXISTS = "already_exists"
+
+
+def _clean(values: pd.Series) -> pd.Series:
+    """Stripped strings with blanks turned into missing values."""
+    cleaned = values.astype("string").str.strip()
+    return cleaned.mask(cleaned == "")
+
+
+def validate_chunk(
+    chunk: List[Row], seen: Set[str]
+) -> Tuple[pd.DataFrame, List[Rejection]]:
+    """Normalise, validate and dedupe a chunk with column-wide operations.
+
+    Returns the accepted rows (indexed by spreadsheet row number, with
+    ``name``, ``email``, ``company`` and the lower-cased ``key``) and a
+    ``(row, email, reason)`` entry for every rejected row. ``seen`` holds the
+    keys accepted from earlier chunks and is updated in place.
+    """
+    df = pd.DataFrame.from_records(
+        [record for _, record in chunk], index=[number for number, _ in chunk],
+        columns=["name", "email", "company"],
+    )
+    email = _clean(df["email"])
+    key = email.str.lower()
+
+    missing = email.isna()
+    invalid = ~missing & ~email.str.fullmatch(EMAIL_PATTERN).fillna(False).astype(bool)
+    well_formed = ~(missing | invalid)
+    # Repeats inside this chunk, then hash lookups against the earlier chunks
+    duplicate = well_formed & key.where(well_formed).duplicated()
+    earlier = key.map(seen.__contains__, na_action="ignore")
+    duplicate |= well_formed & earlier.fillna(False).astype(bool)
+
+    reasons = pd.Series(
+        np.select(
+            [missing, invalid, duplicate],
+            [MISSING_EMAIL, INVALID_EMAIL, DUPLICATE_IN_FILE],
+            None,
+        ),
+        index=df.index,
+    )
+    rejected = reasons.notna()
+    rejections = [
+        (number, None if pd.isna(value) else value, reason)
+        for number, value, reason in zip(
+            df.index[rejected], email[rejected], reasons[rejected]
+        )
+    ]
+
+    accepted = pd.DataFrame({
+        "name": _clean(df["name"]).fillna("Unknown"),
+        "email": email,
+        "company": _clean(df["company"]),
+        "key": key,
+    })[~rejected]
+    seen.update(accepted["key"])
+    return accepted, rejections
+
+
+def find_existing_emails(db, keys: Iterable[str]) -> Set[str]:
+    """Which normalised emails already belong to a client.
+
+    One lookup on the unique ``email_normalized`` index per 500 keys.
+    """
+    found: Set[str] = set()
+    for batch in chunked(list(keys), 500):
+        rows = db.query(ClientModel.email_normalized)\
+                 .filter(ClientModel.email_normalized.in_(batch)).all()
+        found.update(r[0] for r in rows)
+    return found
+
+
+def run_import(
+    db,
+    open_chunks: Callable[[], Iterator[List[Row]]],
+    skip_duplicates: bool = False,
+    sample_size: Optional[int] = None,
+    max_rejections: int = IMPORT_MAX_REJECTIONS,
+    max_rows: Optional[int] = None,
+) -> ImportClientsExcel200Response:
+    """Import every chunk produced by ``open_chunks``.
+
+    Without ``skip_duplicates`` a first pass only looks for emails that
+    already exist and raises 409 before anything is written; the second pass
+    bulk-inserts with ``ON CONFLICT DO NOTHING`` and commits chunk by chunk,
+    so existing clients are skipped by the database. Every imported client is
+    echoed back unless ``sample_size`` caps the list. Rejected rows are
+    counted, and the first ``max_rejections`` of them are returned with their
+    reason (as are the emails listed in the 409).
+
+    More than ``max_rows`` rows is refused with 413 as soon as a chunk
+    crosses the limit, so the source is read once. That is before anything
+    is written unless ``skip_duplicates`` leaves out the first pass; then the
+    chunks before it are already committed.
+    """
+    def limited_chunks() -> Iterator[List[Row]]:
+        rows = 0
+        for chunk in open_chunks():
+            rows += len(chunk)
+            if max_rows is not None and rows > max_rows:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"The import has more than {max_rows} rows",
+                )
+            yield chunk
+
+    if not skip_duplicates:
+        duplicate_count = 0
+        duplicates: List[str] = []
+        seen: Set[str] = set()
+        for chunk in limited_chunks():
+            accepted, _ = validate_chunk(chunk, seen)
+            found = find_existing_emails(db, accepted["key"])
+            duplicate_count += len(found)
+            duplicates.extend(sorted(found)[:max_rejections - len(duplicates)])
+        if duplicate_count:
+            raise HTTPException(
+                status_code=409,
+                detail={
+                    "message": "Duplicate clients found",
+                    "existing_emails": duplicates,
+                    "count": duplicate_count
+                }
+            )
+
+    count = 0
+    imported_clients: List[Client] = []
+    rejected: List[ImportRejection] = []
+    rejected_count = 0
+    seen: Set[str] = set()
+    today = datetime.now().strftime("%Y-%m-%d")
+    insert_clients = insert_client_ignoring_duplicates(db.get_bind())\
+        .returning(ClientModel.__table__.c.email_normalized)
+
+    def reject(number: int, email: Optional[str], reason: str) -> None:
+        nonlocal rejected_count
+        rejected_count += 1
+        if len(rejected) < max_rejections:
+            rejected.append(ImportRejection(row=number, email=email, reason=reason))
+
+    for chunk in limited_chunks():
+        accepted, rejections = validate_chunk(chunk, seen)
+        for rejection in rejections:
+            reject(*rejection)
+        if accepted.empty:
+            continue
+
+        client_rows = [
+            {
+                "id": str(uuid.uuid4()),
+                "name": name,
+                "email": email,
+                "email_normalized": key,
+                "company": None if pd.isna(company) else company,
+                "status": "not_contacted",
+                "last_contact": None,
+            }
+            for name, email, company, key
+            in accepted.astype(object).itertuples(index=False)
+        ]
+        # One executemany; rows whose email is already taken come back missing
+        inserted = set(db.execute(insert_clients, client_rows).scalars())
+
+        task_rows: List[dict] = []
+        for number, row in zip(accepted.index, client_rows):
+            if row["email_normalized"] not in inserted:
+                reject(number, row["email"], ALREADY_EXISTS)
+                continue
+            # Auto-create task
+            task_rows.append({
+                "id": str(uuid.uuid4()),
+                "type": "follow_up",
+                "client_name": row["name"],
+                "client_email": row["email"],
+                "company": row["company"] or "",
+                "description": f"Send initial email to {row['name']}",
+                "due_date": today,
+                "priority": "high",
+                "completed": False,
+            })
+            count += 1
+            if sample_size is not None and len(imported_clients) >= sample_size:
+                continue
+            try:
+                imported_clients.append(Client(
+                    id=row["id"],
+                    name=row["name"],
+                    email=row["email"],
+                    company=row["company"],
+                    status=row["status"]
+                ))
+            except ValueError as e:
+                # Imported, but not representable by the response model
+                print(f"Leaving {row['email']} out of the import response: {e}")
+
+        if task_rows:
+            db.execute(insert(TaskModel.__table__), task_rows)
+        if inserted:
+            bump_versions(db, "clients", "tasks")
+        db.commit()
+
+    return ImportClientsExcel200Response(
+        count=count,
+        clients=imported_clients,
+        rejectedCount=rejected_count,
+        rejected=rejected,
+    )
+
+
+def import_excel_upload(
+    db, source, filename: str, skip_duplicates: bool,
+    sample_size: Optional[int] = None,
+) -> ImportClientsExcel200Response:
+    """Spool an uploaded workbook to disk and run it through ``run_import``."""
+    path = spool_upload(source, suffix=os.path.splitext(filename or "")[1])
+    try:
+        return run_import(
+            db, lambda: iter_excel_chunks(path), skip_duplicates, sample_size
+        )
+    finally:
+        os.remove(path)
+
+
+_SHEET_ID = re.compile(r"/spreadsheets/d/([A-Za-z0-9_-]+)")
+_SHEET_GID = re.compile(r"[#?&]gid=(\d+)")
+
+
+def sheet_export_url(url: Optional[str]) -> str:
+    """The CSV export of the tab a Google Sheets link points at."""
+    sheet = _SHEET_ID.search(url or "")
+    if not sheet:
+        raise HTTPException(status_code=422, detail="Not a Google Sheets link")
+    export = f"{GOOGLE_SHEETS_URL}/spreadsheets/d/{sheet.group(1)}/export?format=csv"
+    gid = _SHEET_GID.search(url)
+    return f"{export}&gid={gid.group(1)}" if gid else export
+
+
+def download_sheet(
+    url: Optional[str], max_bytes: int = IMPORT_MAX_UPLOAD_BYTES
+) -> str:
+    """Stream a sheet's CSV export to a temporary file and return its path."""
+    import httpx
+
+    timeout = httpx.Timeout(SHEET_READ_TIMEOUT, connect=SHEET_CONNECT_TIMEOUT)
+    try:
+        with httpx.stream(
+            "GET", sheet_export_url(url), timeout=timeout, follow_redirects=True
+        ) as response:
+            if response.status_code != 200:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Could not export the sheet (HTTP {response.status_code})",
+                )
+            if response.headers.get("content-type", "").startswith("text/html"):
+                # Sheets not shared by link redirect to a sign-in page
+                raise HTTPException(
+                    status_code=422,
+                    detail="The sheet is not shared with anyone with the link",
+                )
+            blocks = response.iter_bytes(SPOOL_BUFFER_BYTES)
+            return spool_blocks(blocks, ".csv", max_bytes)
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="Timed out fetching the sheet")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Could not fetch the sheet: {e}")
+
+
+def import_google_sheet(
+    db, url: Optional[str], skip_duplicates: bool,
+    sample_size: Optional[int] = None,
+    max_rows: Optional[int] = None,
+) -> ImportClientsExcel200Response:
+    """Download a sheet's CSV export and run it through ``run_import``."""
+    max_rows = max_rows or IMPORT_MAX_ROWS
+    path = download_sheet(url)
+    try:
+        return run_import(
+            db, lambda: iter_csv_chunks(path), skip_duplicates, sample_size,
+            max_rows=max_rows,
+        )
+    finally:
+        os.remove(path)
@@ -0,0 +1,65 @@
+# coding: utf-8
+
+"""Database-side client search over name, email and company.
+
+SQLite uses the ``clients_fts`` FTS5 index (prefix match per word, ordered by
+bm25), Postgres uses the ``pg_trgm`` index (substring match ordered by
+similarity). Anything else, and searches with no words for FTS5 to match
+(such as ``"@"``), falls back to ``ILIKE`` filters. The indexes and
+the triggers that maintain them are installed by ``database.py``.
+"""
+
+import re
+
+from sqlalchemy import column, func, literal_column, or_, table, text
+
+from database import ClientModel, client_search_backend
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+clients_fts = table("clients_fts", column("rowid"), column("rank"))
+
+
+def fts_match_expression(search: str) -> str:
+    """``"sarah j"`` -> ``"sarah"* "j"*``: every word must prefix-match."""
+    return " ".join(f'"{word}"*' for word in _WORD.findall(search.lower()))
+
+
+def _like_pattern(search: str) -> str:
+    escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def search_document():
+    """The expression the Postgres trigram index is built on."""
+    return func.coalesce(ClientModel.name, "") + " " + func.coalesce(ClientModel.email, "")\
+        + " " + func.coalesce(ClientModel.company, "")
+
+
+def search_clients(stmt, search: str, bind):
+    """Restrict a ``select(ClientModel)`` on ``bind`` to matches.
+
+    Returns the filtered statement and its sort keys (best match first,
+    ending in a unique column) for ``pagination.paginate``.
+    """
+    backend = client_search_backend(bind)
+
+    match = fts_match_expression(search) if backend == "fts5" else ""
+    if match:
+        rowid = literal_column("clients.rowid")
+        stmt = stmt.join(clients_fts, clients_fts.c.rowid == rowid)\
+                   .filter(text("clients_fts MATCH :match").bindparams(match=match))
+        return stmt, [(clients_fts.c.rank, False), (rowid, False)]
+
+    pattern = _like_pattern(search)
+    if backend == "trigram":
+        document = search_document()
+        stmt = stmt.filter(document.ilike(pattern, escape="\\"))
+        return stmt, [(func.similarity(document, search), True), (ClientModel.id, False)]
+
+    stmt = stmt.filter(or_(
+        ClientModel.name.ilike(pattern, escape="\\"),
+        ClientModel.email.ilike(pattern, escape="\\"),
+        ClientModel.company.ilike(pattern, escape="\\"),
+    ))
+    return stmt, [(ClientModel.id, False)]
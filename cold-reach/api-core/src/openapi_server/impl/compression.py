@@ -0,0 +1,151 @@
+# coding: utf-8
+
+"""Response compression: brotli when the client accepts it, else gzip.
+
+Bodies under ``COMPRESS_MIN_BYTES``, byte ranges and binary media types go
+out as they are. Brotli needs the optional ``brotli`` package; without it
+every client gets gzip. Streamed (NDJSON) bodies are compressed chunk by
+chunk and flushed after each one, so rows still reach the client as they
+are produced. Only Starlette's public header types are used, not the
+private responders behind its GZip middleware.
+"""
+
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Dynamic responses: favour speed over ratio
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+
+# Only text-like bodies; files (PDFs, images, archives) are already compressed
+_COMPRESSIBLE = ("text/", "application/json", "application/x-ndjson", "application/javascript",
+                 "application/xml", "image/svg+xml")
+# Server-sent events must reach the client unbuffered
+_EXCLUDED = ("text/event-stream",)
+
+
+class IdentityResponder:
+    """Holds the response start until the first body chunk says whether to compress.
+
+    Subclasses set ``content_encoding`` and implement ``compress``; this one
+    only adds ``Vary: Accept-Encoding`` to bodies that could have been
+    compressed. Compressed bodies get a weak ETag, so a cached gzip body is
+    never taken for the byte-identical plain one.
+    """
+
+    content_encoding = ""
+
+    def __init__(self, app: ASGIApp, minimum_size: int) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.start: Message = {}
+        self.started = False
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def compress(self, body: bytes, *, more_body: bool) -> bytes:
+        return body
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers or message["status"] == 206 or "content-range" in headers
+                or not content_type.startswith(_COMPRESSIBLE) or content_type.startswith(_EXCLUDED)
+            )
+            return
+        if message["type"] != "http.response.body":  # e.g. pathsend: files go out as they are
+            self.passthrough = True
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.started:
+            if not self.passthrough:
+                message["body"] = self.compress(body, more_body=more_body)
+            await self.send(message)
+            return
+
+        self.started = True
+        if not self.passthrough and (more_body or len(body) >= self.minimum_size):
+            headers = MutableHeaders(raw=self.start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if self.content_encoding:
+                message["body"] = self.compress(body, more_body=more_body)
+                headers["Content-Encoding"] = self.content_encoding
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(message["body"]))
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+        await self.send(self.start)
+        await self.send(message)
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = BROTLI_QUALITY) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+
+    def compress(self, body: bytes, *, more_body: bool) -> bytes:
+        data = self.compressor.process(body)
+        return data + (self.compressor.flush() if more_body else self.compressor.finish())
+
+
+class GZipResponder(IdentityResponder):
+    content_encoding = "gzip"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, compresslevel: int = GZIP_LEVEL) -> None:
+        super().__init__(app, minimum_size)
+        # wbits 16 + 15: the gzip container around a full-window deflate stream
+        self.compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)
+
+    def compress(self, body: bytes, *, more_body: bool) -> bytes:
+        data = self.compressor.compress(body)
+        return data + self.compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() == coding:
+            return params.replace(" ", "").lower() not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESS_MIN_BYTES) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("Accept-Encoding", "")
+        if brotli is not None and _accepts(accept_encoding, "br"):
+            responder = BrotliResponder(self.app, self.minimum_size)
+        elif _accepts(accept_encoding, "gzip"):
+            responder = GZipResponder(self.app, self.minimum_size)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
@@ -1,33 +1,51 @@
 # coding: utf-8
 
+import json
 import uuid
 import os
-import io
 from typing import ClassVar, Dict, List, Tuple, Optional
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
 
-import pandas as pd
-from fastapi import UploadFile, HTTPException
+from fastapi import UploadFile, HTTPException, Response
+from fastapi.responses import FileResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import load_only
 
 from openapi_server.apis.default_api_base import BaseDefaultApi
+from openapi_server.impl.etags import bump_versions, conditional, etag_matches, read_versions
+from openapi_server.impl.lookup_cache import cached_page, lookup_cache
+from openapi_server.impl.pagination import paginate, wants_ndjson
+from openapi_server.impl.write_queue import write
 from openapi_server.models.client import Client
 from openapi_server.models.client_create import ClientCreate
 from openapi_server.models.client_status import ClientStatus
 from openapi_server.models.email_request import EmailRequest
 from openapi_server.models.import_clients_excel200_response import ImportClientsExcel200Response
 from openapi_server.models.import_clients_google_sheet_request import ImportClientsGoogleSheetRequest
-from openapi_server.models.send_email200_response import SendEmail200Response
+from openapi_server.models.campaign import Campaign, CampaignEnrollment, CampaignEnrollmentResult, CampaignStep
+from openapi_server.models.send_job import SendJob
 from openapi_server.models.task import Task
+from openapi_server.models.task_counts import TaskCounts
 from openapi_server.models.email_log import EmailLog
+from openapi_server.models.email_delivery import EmailDelivery
 from openapi_server.models.template import Template
 from openapi_server.models.email_attachment import EmailAttachment
-from database import SessionLocal, ClientModel, TaskModel, EmailLogModel, TemplateModel, AttachmentModel
+from database import SessionLocal, current_session, insert_client_ignoring_duplicates, ClientModel, TaskModel, EmailLogModel, EmailDeliveryModel, TemplateModel, AttachmentModel, SendJobModel, CampaignModel
+
+
+def format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
 
 
 class DefaultApiImpl(BaseDefaultApi):
     
-    def __init__(self):
-        self.db = SessionLocal()
+    @property
+    def db(self):
+        return current_session()
 
     async def create_client(
         self,
@@ -42,8 +60,6 @@ class DefaultApiImpl(BaseDefaultApi):
             status=client_create.status if client_create.status else "not_contacted",
             last_contact=client_create.last_contact.isoformat() if client_create.last_contact else None
         )
-        self.db.add(db_client)
-        
         # Auto-create task
         db_task = TaskModel(
             id=str(uuid.uuid4()),
@@ -56,9 +72,25 @@ class DefaultApiImpl(BaseDefaultApi):
             priority="high",
             completed=False
         )
-        self.db.add(db_task)
-        self.db.commit()
-        
+
+        def insert(db):
+            # The unique email index decides whether the client already exists
+            stmt = insert_client_ignoring_duplicates(db.get_bind()).values(
+                id=db_client.id,
+                name=db_client.name,
+                email=db_client.email,
+                email_normalized=db_client.email_normalized,
+                company=db_client.company,
+                status=db_client.status,
+                last_contact=db_client.last_contact
+            ).returning(ClientModel.__table__.c.id)
+            if db.execute(stmt).first() is None:
+                raise HTTPException(status_code=409, detail=f"A client with email {db_client.email} already exists")
+            db.add(db_task)
+            bump_versions(db, "clients", "tasks")
+
+        await write(insert)
+
         return Client(
             id=db_client.id,
             name=db_client.name,
@@ -68,156 +100,156 @@ class DefaultApiImpl(BaseDefaultApi):
             lastContact=db_client.last_contact
         )
 
-    async def get_tasks(self) -> List[Task]:
-        """Retrieve a list of tasks."""
-        db_tasks = self.db.query(TaskModel).all()
-        return [
-            Task(
+    async def get_tasks(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        accept: Optional[str] = None,
+        response: Optional[Response] = None,
+        if_none_match: Optional[str] = None,
+        completed: Optional[bool] = None,
+        priority: Optional[str] = None,
+        due_before: Optional[date] = None,
+        due_after: Optional[date] = None,
+        client_email: Optional[str] = None,
+    ) -> List[Task]:
+        """Retrieve a list of tasks, filtered in SQL."""
+        versions = await read_versions(self.db, ["tasks"])
+        query = [limit, cursor, accept, completed, priority, due_before, due_after, client_email]
+        not_modified = conditional(versions, query, if_none_match, response)
+        if not_modified:
+            return not_modified
+
+        def to_task(t: TaskModel) -> Task:
+            return Task(
                 id=t.id,
                 type=t.type,
                 clientName=t.client_name,
                 clientEmail=t.client_email,
                 company=t.company,
                 description=t.description,
-                dueDate=datetime.strptime(t.due_date, "%Y-%m-%d").date() if t.due_date else None,
+                dueDate=date.fromisoformat(t.due_date) if t.due_date else None,
                 priority=t.priority,
                 completed=t.completed
             )
-            for t in db_tasks
-        ]
+
+        stmt = select(TaskModel)
+        if completed is not None:
+            stmt = stmt.where(TaskModel.completed == completed)
+        if priority:
+            stmt = stmt.where(TaskModel.priority == priority)
+        if client_email:
+            stmt = stmt.where(TaskModel.client_email == client_email)
+        keys = [(TaskModel.id, False)]
+        if due_before or due_after:
+            # ISO dates sort as strings; with the flags above this is one index range, already in key order
+            if due_after:
+                stmt = stmt.where(TaskModel.due_date >= due_after.isoformat())
+            if due_before:
+                stmt = stmt.where(TaskModel.due_date < due_before.isoformat())
+            keys = [(TaskModel.due_date, False), (TaskModel.id, False)]
+        return await paginate(self.db, stmt, keys, to_task, limit, cursor, accept, response)
+
+    async def get_task_counts(
+        self,
+        today: Optional[date] = None,
+        response: Optional[Response] = None,
+        if_none_match: Optional[str] = None,
+    ) -> TaskCounts:
+        """Open, completed, overdue and due-today task counts, from the task index alone."""
+        today = today or date.today()
+        versions = await read_versions(self.db, ["tasks"])
+        not_modified = conditional(versions, ["counts", today], if_none_match, response)
+        if not_modified:
+            return not_modified
+
+        by_state = dict((await self.db.execute(
+            select(TaskModel.completed, func.count()).group_by(TaskModel.completed)
+        )).all())
+
+        async def open_due(*conditions) -> int:
+            return await self.db.scalar(select(func.count()).select_from(TaskModel).where(
+                TaskModel.completed == False, *conditions  # noqa: E712
+            ))
+
+        tomorrow = today + timedelta(days=1)
+        return TaskCounts(
+            # Tasks created without the flag count as open
+            pending=by_state.get(False, 0) + by_state.get(None, 0),
+            completed=by_state.get(True, 0),
+            overdue=await open_due(TaskModel.due_date < today.isoformat()),
+            due_today=await open_due(TaskModel.due_date >= today.isoformat(),
+                                     TaskModel.due_date < tomorrow.isoformat()),
+        )
 
     async def delete_client(
         self,
         client_id: str,
     ) -> None:
         """Delete a specific client by ID."""
-        self.db.query(ClientModel).filter(ClientModel.id == client_id).delete()
-        self.db.commit()
+        def delete(db):
+            if db.query(ClientModel).filter(ClientModel.id == client_id).delete():
+                bump_versions(db, "clients")
+
+        await write(delete)
 
     async def get_clients(
         self,
         search: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        accept: Optional[str] = None,
+        response: Optional[Response] = None,
+        if_none_match: Optional[str] = None,
     ) -> List[Client]:
         """Retrieve a list of clients with optional filtering."""
-        query = self.db.query(ClientModel)
-        
+        from openapi_server.impl.client_search import search_clients
+
+        versions = await read_versions(self.db, ["clients"])
+        not_modified = conditional(versions, [search, limit, cursor, accept], if_none_match, response)
+        if not_modified:
+            return not_modified
+
+        stmt = select(ClientModel)
+        keys = [(ClientModel.id, False)]
         if search:
-            search_lower = f"%{search.lower()}%"
-            # Basic SQLAlchemy filter simulation for SQLite
-            # Actually, let's keep it simple. filter logic in python or use ilike
-            # For sqlite, ilike matches case insensitive
-            pass  # Doing manual filtering for simplicity if needed, but db based is better
-            
-        all_clients = query.all()
-        
-        filtered = []
-        for c in all_clients:
-            if search:
-                s = search.lower()
-                if (s not in (c.name or "").lower() and 
-                    s not in (c.email or "").lower() and 
-                    s not in (c.company or "").lower()):
-                    continue
-            
-            filtered.append(Client(
-                id=c.id,
-                name=c.name,
-                email=c.email,
-                company=c.company,
-                status=c.status,
-                lastContact=c.last_contact
-            ))
-            
-        return filtered
+            stmt, keys = search_clients(stmt, search, self.db.get_bind())
+
+        return await paginate(self.db, stmt, keys, self._client, limit, cursor, accept, response)
+
+    @staticmethod
+    def _client(c: ClientModel) -> Client:
+        return Client(
+            id=c.id,
+            name=c.name,
+            email=c.email,
+            company=c.company,
+            status=c.status,
+            lastContact=c.last_contact
+        )
 
     async def import_clients_excel(
         self,
         file: UploadFile,
         skip_duplicates: bool = False,
+        summary_only: bool = False,
     ) -> ImportClientsExcel200Response:
         """Upload an Excel file to bulk import clients."""
-        try:
-            contents = await file.read()
-            df = pd.read_excel(io.BytesIO(contents))
-            
-            # Normalize column names
-            df.columns = [c.lower().strip() for c in df.columns]
-            
-            required_columns = ["name", "email"]
-            missing_cols = [c for c in required_columns if c not in df.columns]
-            
-            if missing_cols:
-                raise HTTPException(status_code=422, detail=f"Missing columns: {missing_cols}")    
-
-            # Check for duplicates using DB
-            existing_emails_query = self.db.query(ClientModel.email).all()
-            existing_emails = {r[0].lower() for r in existing_emails_query if r[0]}
-            
-            upload_emails = set(df['email'].astype(str).str.lower())
-            duplicates = existing_emails.intersection(upload_emails)
-            
-            if duplicates and not skip_duplicates:
-                raise HTTPException(
-                    status_code=409,
-                    detail={
-                        "message": "Duplicate clients found",
-                        "existing_emails": list(duplicates),
-                        "count": len(duplicates)
-                    }
-                )
-
-            imported_clients = []
-            for _, row in df.iterrows():
-                try:
-                    email = str(row.get("email")).lower()
-                    if pd.isna(row.get("email")) or "@" not in email:
-                        continue
-                    
-                    if email in existing_emails:
-                        continue
-                        
-                    db_client = ClientModel(
-                        id=str(uuid.uuid4()),
-                        name=str(row.get("name", "Unknown")),
-                        email=str(row.get("email")),
-                        company=str(row.get("company")) if pd.notna(row.get("company")) else None,
-                        status="not_contacted"
-                    )
-                    self.db.add(db_client)
-                    
-                    new_client_obj = Client(
-                        id=db_client.id,
-                        name=db_client.name,
-                        email=db_client.email,
-                        company=db_client.company,
-                        status=db_client.status
-                    )
-                    imported_clients.append(new_client_obj)
-
-                    # Auto-create task
-                    db_task = TaskModel(
-                        id=str(uuid.uuid4()),
-                        type="follow_up",
-                        client_name=db_client.name,
-                        client_email=db_client.email,
-                        company=db_client.company if db_client.company else "",
-                        description=f"Send initial email to {db_client.name}",
-                        due_date=datetime.now().strftime("%Y-%m-%d"),
-                        priority="high",
-                        completed=False
-                    )
-                    self.db.add(db_task)
-                    
-                except Exception as e:
-                    print(f"Skipping row: {e}")
-                    continue
-            
-            self.db.commit()
+        from starlette.concurrency import run_in_threadpool
+        from openapi_server.impl.client_import import IMPORT_SAMPLE_SIZE, import_excel_upload
+
+        def import_upload():
+            # The import commits chunk by chunk on a session of its own
+            db = SessionLocal()
+            try:
+                return import_excel_upload(db, file.file, file.filename, skip_duplicates,
+                                           IMPORT_SAMPLE_SIZE if summary_only else None)
+            finally:
+                db.close()
 
-            return ImportClientsExcel200Response(
-                count=len(imported_clients),
-                clients=imported_clients
-            )
+        try:
+            # Spooling and parsing are blocking; keep them off the event loop
+            return await run_in_threadpool(import_upload)
             
         except HTTPException:
             raise
@@ -228,222 +260,279 @@ class DefaultApiImpl(BaseDefaultApi):
     async def import_clients_google_sheet(
         self,
         import_clients_google_sheet_request: ImportClientsGoogleSheetRequest,
+        skip_duplicates: bool = False,
+        summary_only: bool = False,
     ) -> ImportClientsExcel200Response:
-        # Mock implementation for Google Sheet remains simple or could use DB
-        # For brevity, leaving as mock but creating real DB entry
-        mock_client = ClientModel(
-            id=str(uuid.uuid4()),
-            name="Sheet User",
-            email="sheet@example.com",
-            company="Sheet Company",
-            status="not_contacted"
-        )
-        self.db.add(mock_client)
-        self.db.commit()
-        
-        return ImportClientsExcel200Response(count=1, clients=[Client(id=mock_client.id, name=mock_client.name, email=mock_client.email)])
+        """Import clients from the CSV export of a shared Google Sheet."""
+        from starlette.concurrency import run_in_threadpool
+        from openapi_server.impl.client_import import IMPORT_SAMPLE_SIZE, import_google_sheet
+
+        def import_sheet():
+            # The import commits chunk by chunk on a session of its own
+            db = SessionLocal()
+            try:
+                return import_google_sheet(db, import_clients_google_sheet_request.url, skip_duplicates,
+                                           IMPORT_SAMPLE_SIZE if summary_only else None)
+            finally:
+                db.close()
 
-    async def get_attachments(self) -> List[EmailAttachment]:
+        try:
+            # The download and the parsing are blocking; keep them off the event loop
+            return await run_in_threadpool(import_sheet)
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"Error: {e}")
+            raise HTTPException(status_code=422, detail=f"Import failed: {str(e)}")
+
+    async def get_attachments(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        accept: Optional[str] = None,
+        response: Optional[Response] = None,
+        if_none_match: Optional[str] = None,
+    ) -> List[EmailAttachment]:
         """Retrieve a list of uploaded attachments."""
-        from openapi_server.models.email_attachment import EmailAttachment
-        db_attachments = self.db.query(AttachmentModel).order_by(AttachmentModel.created_at.desc()).all()
-        return [
-            EmailAttachment(
-                id=a.id,
-                name=a.filename,
-                size=a.size
-            )
-            for a in db_attachments
-        ]
+        versions = await read_versions(self.db, ["attachments"])
+        not_modified = conditional(versions, [limit, cursor, accept], if_none_match, response)
+        if not_modified:
+            return not_modified
+
+        keys = [(AttachmentModel.created_at, True), (AttachmentModel.id, True)]
+        stmt = select(AttachmentModel)
+        if wants_ndjson(accept):
+            return await paginate(self.db, stmt, keys, self._attachment, limit, cursor, accept, response)
+        # JSON pages are served from the cache while the table is unchanged
+        return await cached_page("attachments", versions.get("attachments"), (limit, cursor), response,
+                                 lambda r: paginate(self.db, stmt, keys, self._attachment, limit, cursor, None, r))
 
     async def upload_attachment(self, file: UploadFile) -> EmailAttachment:
         """Upload a new file."""
-        from openapi_server.models.email_attachment import EmailAttachment
-        
-        # Ensure uploads directory exists
-        upload_dir = os.path.join(os.getcwd(), "uploads")
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        file_id = str(uuid.uuid4())
-        filename = file.filename
-        file_path = os.path.join(upload_dir, f"{file_id}_{filename}")
-        
-        # Save file
-        with open(file_path, "wb") as buffer:
-            contents = await file.read()
-            buffer.write(contents)
-            file_size_bytes = len(contents)
-            
-        # Format size string
-        if file_size_bytes < 1024:
-            size_str = f"{file_size_bytes} B"
-        elif file_size_bytes < 1024 * 1024:
-            size_str = f"{file_size_bytes / 1024:.1f} KB"
-        else:
-            size_str = f"{file_size_bytes / (1024 * 1024):.1f} MB"
-            
-        # Create DB record
-        db_attachment = AttachmentModel(
-            id=file_id,
-            filename=filename,
-            file_path=file_path,
-            size=size_str
+        from starlette.concurrency import run_in_threadpool
+        from openapi_server.impl.attachment_store import acquire_blob, detect_mime_type, stage_upload
+
+        # Chunked copy and hash of the spooled upload, off the event loop
+        staged = await run_in_threadpool(stage_upload, file.file)
+        try:
+            db_attachment = AttachmentModel(
+                id=str(uuid.uuid4()),
+                filename=file.filename,
+                sha256=staged.sha256,
+                size_bytes=staged.size,
+                mime_type=detect_mime_type(file.filename, file.content_type)
+            )
+
+            def insert(db):
+                db_attachment.file_path = acquire_blob(db, staged)
+                db.add(db_attachment)
+
+            await write(insert)
+        finally:
+            os.remove(staged.path)
+        lookup_cache.invalidate("attachments")
+
+        return self._attachment(db_attachment)
+
+    async def get_attachment_content(
+        self,
+        attachment_id: str,
+        download: bool = False,
+        if_none_match: Optional[str] = None,
+    ) -> Response:
+        """The attachment's bytes, streamed from disk."""
+        attachment = await self.db.get(AttachmentModel, attachment_id)
+        if attachment is None:
+            raise HTTPException(status_code=404, detail="Attachment not found")
+        headers = {}
+        if attachment.sha256:
+            # An attachment's bytes never change, so the content hash is a strong validator
+            headers = {"ETag": f'"{attachment.sha256}"', "Cache-Control": "private, max-age=31536000, immutable"}
+            if etag_matches(if_none_match, headers["ETag"]):
+                return Response(status_code=304, headers=headers)
+        if not attachment.file_path or not os.path.isfile(attachment.file_path):
+            raise HTTPException(status_code=404, detail="Attachment file is missing")
+        # Read in chunks (or handed to the server with pathsend) and never held in memory;
+        # FileResponse answers Range and If-Range itself
+        return FileResponse(
+            attachment.file_path,
+            media_type=attachment.mime_type,
+            filename=attachment.filename,
+            headers=headers,
+            content_disposition_type="attachment" if download else "inline",
         )
-        self.db.add(db_attachment)
-        self.db.commit()
-        
+
+    async def delete_attachment(self, attachment_id: str) -> None:
+        """Delete an attachment; its file goes with the last attachment that shares it."""
+        from openapi_server.impl.attachment_store import release_blob, remove_on_commit
+
+        def delete(db):
+            attachment = db.get(AttachmentModel, attachment_id)
+            if attachment is None:
+                raise HTTPException(status_code=404, detail="Attachment not found")
+            db.delete(attachment)
+            if attachment.sha256:
+                release_blob(db, attachment.sha256)
+            else:
+                # Uploads from before the content store have a file of their own
+                bump_versions(db, "attachments")
+                if attachment.file_path:
+                    remove_on_commit(db, attachment.file_path)
+
+        await write(delete)
+        lookup_cache.invalidate("attachments")
+
+    @staticmethod
+    def _attachment(a: AttachmentModel) -> EmailAttachment:
         return EmailAttachment(
-            id=db_attachment.id,
-            name=db_attachment.filename,
-            size=db_attachment.size
+            id=a.id,
+            name=a.filename,
+            size=format_size(a.size_bytes) if a.size_bytes is not None else a.size,
+            size_bytes=a.size_bytes,
+            mime_type=a.mime_type
         )
 
     async def send_email(
         self,
         email_request: EmailRequest,
-    ) -> SendEmail200Response:
-        """Send an email to a list of clients."""
-        import os
-        import smtplib
-        import ssl
-        from email.message import EmailMessage
-        import certifi
-
-        gmail_user = os.getenv("GMAIL_USER")
-        gmail_password = os.getenv("GMAIL_PASSWORD")
-
-        sent_count = 0
-        
-        # Collect attachments if any
-        attachment_files = []
-        if email_request.attachment_ids:
-            for att_id in email_request.attachment_ids:
-                att = self.db.query(AttachmentModel).filter(AttachmentModel.id == att_id).first()
-                if att and os.path.exists(att.file_path):
-                    attachment_files.append(att)
-
-        # If no credentials, mock send but update DB
-        if not gmail_user or not gmail_password:
-             print("Mock sending...")
-             for cid in email_request.recipient_ids:
-                 client = self.db.query(ClientModel).filter(ClientModel.id == cid).first()
-                 if client:
-                     client.status = "emailed"
-                     client.last_contact = datetime.now().isoformat()
-             self.db.commit()
-             # Log mock
-             log = EmailLogModel(
-                 id=str(uuid.uuid4()),
-                 timestamp=datetime.now(),
-                 recipient_count=len(email_request.recipient_ids),
-                 subject=email_request.subject,
-                 body=email_request.body,
-                 status="sent_mock",
-                 recipients=",".join(email_request.recipient_ids)
-             )
-             self.db.add(log)
-             self.db.commit()
-             return SendEmail200Response(success=True, sent_count=len(email_request.recipient_ids))
-
-        try:
-            context = ssl.create_default_context(cafile=certifi.where())
-        except:
-            context = ssl._create_unverified_context()
-
-        try:
-            with smtplib.SMTP("smtp.gmail.com", 587) as server:
-                server.starttls(context=context)
-                server.login(gmail_user, gmail_password)
-                
-                for cid in email_request.recipient_ids:
-                    # Find client
-                    client = self.db.query(ClientModel).filter(ClientModel.id == cid).first()
-                    if not client or not client.email:
-                        continue
-                    
-                    # Template Interpolation
-                    subject_final = email_request.subject.format(
-                        name=client.name,
-                        company=client.company or "",
-                        email=client.email
-                    )
-                    
-                    body_final = email_request.body.replace("{name}", client.name)\
-                                                 .replace("{company}", client.company or "")\
-                                                 .replace("{email}", client.email)
-                    
-                    subject_final = email_request.subject.replace("{name}", client.name)\
-                                                   .replace("{company}", client.company or "")\
-                                                   .replace("{email}", client.email)
-
-                    msg = EmailMessage()
-                    msg.set_content(body_final)
-                    msg["Subject"] = subject_final
-                    msg["From"] = gmail_user
-                    msg["To"] = client.email
-                    
-                    # Attach files
-                    for att in attachment_files:
-                        import mimetypes
-                        ctype, encoding = mimetypes.guess_type(att.file_path)
-                        if ctype is None or encoding is not None:
-                            # No guess could be made, or the file is encoded (compressed), so
-                            # use a generic bag-of-bits type.
-                            ctype = 'application/octet-stream'
-                        maintype, subtype = ctype.split('/', 1)
-                        
-                        with open(att.file_path, 'rb') as f:
-                            file_data = f.read()
-                            msg.add_attachment(file_data,
-                                               maintype=maintype,
-                                               subtype=subtype,
-                                               filename=att.filename)
-
-                    try:
-                        server.send_message(msg)
-                        client.status = "emailed"
-                        client.last_contact = datetime.now().isoformat()
-                        sent_count += 1
-                    except Exception as e:
-                        print(f"Failed to send to {client.email}: {e}")
-                
-            self.db.commit()
+    ) -> SendJob:
+        """Queue an email to a list of clients for background delivery."""
+        from openapi_server.impl.send_worker import get_send_worker_pool
 
-        except Exception as e:
-            print(f"SMTP Error: {e}")
-            raise HTTPException(status_code=500, detail=str(e))
-
-        # Log entry
-        log_entry = EmailLogModel(
+        # Drop repeated ids so nobody is emailed twice by the same job
+        recipient_ids = list(dict.fromkeys(email_request.recipient_ids))
+        db_job = SendJobModel(
             id=str(uuid.uuid4()),
-            timestamp=datetime.now(),
-            recipient_count=sent_count,
+            status="queued",
             subject=email_request.subject,
             body=email_request.body,
-            status="sent" if sent_count > 0 else "failed",
-            recipients=",".join(email_request.recipient_ids)
+            template_id=email_request.template_id,
+            recipient_ids=",".join(recipient_ids),
+            attachment_ids=",".join(email_request.attachment_ids) if email_request.attachment_ids else None,
+            total_count=len(recipient_ids),
+            sent_count=0,
+            failed_count=0
+        )
+
+        def insert(db):
+            db.add(db_job)
+            db.flush()
+            return self._send_job(db_job)
+
+        send_job = await write(insert)
+        get_send_worker_pool().submit(db_job.id)
+
+        return send_job
+
+    async def get_send_job(self, job_id: str) -> SendJob:
+        """Retrieve the progress of a send job."""
+        db_job = await self.db.get(SendJobModel, job_id)
+        if not db_job:
+            raise HTTPException(status_code=404, detail="Send job not found")
+        return self._send_job(db_job)
+
+    @staticmethod
+    def _send_job(j: SendJobModel) -> SendJob:
+        return SendJob(
+            id=j.id,
+            status=j.status,
+            total=j.total_count,
+            sent=j.sent_count,
+            failed=j.failed_count,
+            pending=max(j.total_count - j.sent_count - j.failed_count, 0),
+            error=j.error,
+            created_at=j.created_at,
+            updated_at=j.updated_at
         )
-        self.db.add(log_entry)
-        self.db.commit()
 
-        return SendEmail200Response(
-            success=True,
-            sent_count=sent_count
+    async def create_campaign(self, campaign: Campaign) -> Campaign:
+        """Create a follow-up sequence of templates."""
+        if not campaign.steps:
+            raise HTTPException(status_code=400, detail="A campaign needs at least one step")
+        template_ids = {step.template_id for step in campaign.steps}
+        db_campaign = CampaignModel(
+            id=str(uuid.uuid4()),
+            name=campaign.name,
+            steps=json.dumps([step.dict() for step in campaign.steps]),
+            created_at=datetime.utcnow()
+        )
+
+        def insert(db):
+            # Checked in the same transaction that a template delete checks campaigns in
+            found = {t for (t,) in db.query(TemplateModel.id).filter(TemplateModel.id.in_(template_ids))}
+            if template_ids - found:
+                raise HTTPException(status_code=400,
+                                    detail=f"Template not found: {', '.join(sorted(template_ids - found))}")
+            db.add(db_campaign)
+
+        await write(insert)
+        return self._campaign(db_campaign)
+
+    async def get_campaigns(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        accept: Optional[str] = None,
+        response: Optional[Response] = None,
+    ) -> List[Campaign]:
+        """Retrieve the campaigns, newest first."""
+        keys = [(CampaignModel.created_at, True), (CampaignModel.id, True)]
+        return await paginate(self.db, select(CampaignModel), keys, self._campaign, limit, cursor, accept, response)
+
+    async def enroll_campaign_clients(self, campaign_id: str, enrollment: CampaignEnrollment) -> CampaignEnrollmentResult:
+        """Schedule a campaign's first step for each client."""
+        from openapi_server.impl.sequence_scheduler import enroll, get_sequence_scheduler
+
+        db_campaign = await self.db.get(CampaignModel, campaign_id)
+        if not db_campaign:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+        requested = len(set(enrollment.client_ids))
+
+        def insert(db):
+            return enroll(db, db_campaign, enrollment.client_ids)
+
+        enrolled = await write(insert)
+        get_sequence_scheduler().wake()
+        return CampaignEnrollmentResult(enrolled=enrolled, skipped=requested - enrolled)
+
+    @staticmethod
+    def _campaign(c: CampaignModel) -> Campaign:
+        return Campaign(
+            id=c.id,
+            name=c.name,
+            steps=[CampaignStep(**step) for step in json.loads(c.steps or "[]")],
+            created_at=c.created_at
         )
 
-    async def get_templates(self) -> List[Template]:
+    async def get_templates(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        accept: Optional[str] = None,
+        response: Optional[Response] = None,
+        if_none_match: Optional[str] = None,
+    ) -> List[Template]:
         """Retrieve a list of templates."""
-        from openapi_server.models.template import Template
-        db_templates = self.db.query(TemplateModel).all()
-        return [
-            Template(
+        versions = await read_versions(self.db, ["templates"])
+        not_modified = conditional(versions, [limit, cursor, accept], if_none_match, response)
+        if not_modified:
+            return not_modified
+
+        def to_template(t: TemplateModel) -> Template:
+            return Template(
                 id=t.id,
                 name=t.name,
                 subject=t.subject,
                 body=t.body
             )
-            for t in db_templates
-        ]
+
+        keys = [(TemplateModel.name, False), (TemplateModel.id, False)]
+        stmt = select(TemplateModel)
+        if wants_ndjson(accept):
+            return await paginate(self.db, stmt, keys, to_template, limit, cursor, accept, response)
+        # JSON pages are served from the cache while the table is unchanged
+        return await cached_page("templates", versions.get("templates"), (limit, cursor), response,
+                                 lambda r: paginate(self.db, stmt, keys, to_template, limit, cursor, None, r))
 
     async def create_template(self, template: Template) -> Template:
         """Create a new email template."""
@@ -454,8 +543,12 @@ class DefaultApiImpl(BaseDefaultApi):
             subject=template.subject,
             body=template.body
         )
-        self.db.add(db_template)
-        self.db.commit()
+        def insert(db):
+            db.add(db_template)
+            bump_versions(db, "templates")
+
+        await write(insert)
+        lookup_cache.invalidate("templates")
         
         return Template(
             id=db_template.id,
@@ -467,39 +560,135 @@ class DefaultApiImpl(BaseDefaultApi):
     async def update_template(self, template_id: str, template: Template) -> Template:
         """Update an existing template."""
         from openapi_server.models.template import Template
-        db_template = self.db.query(TemplateModel).filter(TemplateModel.id == template_id).first()
-        if not db_template:
-            raise HTTPException(status_code=404, detail="Template not found")
-        
-        db_template.name = template.name
-        db_template.subject = template.subject
-        db_template.body = template.body
-        self.db.commit()
-        
+
+        def update(db):
+            updated = db.query(TemplateModel).filter(TemplateModel.id == template_id).update({
+                TemplateModel.name: template.name,
+                TemplateModel.subject: template.subject,
+                TemplateModel.body: template.body
+            }, synchronize_session=False)
+            if not updated:
+                raise HTTPException(status_code=404, detail="Template not found")
+            bump_versions(db, "templates")
+
+        await write(update)
+        lookup_cache.invalidate("templates")
+
         return Template(
-            id=db_template.id,
-            name=db_template.name,
-            subject=db_template.subject,
-            body=db_template.body
+            id=template_id,
+            name=template.name,
+            subject=template.subject,
+            body=template.body
         )
 
     async def delete_template(self, template_id: str) -> None:
-        """Delete a specific template."""
-        self.db.query(TemplateModel).filter(TemplateModel.id == template_id).delete()
-        self.db.commit()
-
-    async def get_email_history(self) -> List[EmailLog]:
-        """Retrieve a log of sent emails."""
-        logs = self.db.query(EmailLogModel).order_by(EmailLogModel.timestamp.desc()).all()
-        return [
-            EmailLog(
+        """Delete a specific template, unless a campaign step still sends it."""
+        from openapi_server.impl.sequence_scheduler import campaign_steps
+
+        def delete(db):
+            candidates = db.query(CampaignModel).filter(CampaignModel.steps.contains(template_id))
+            in_use = [c.name for c in candidates
+                      if any(step["template_id"] == template_id for step in campaign_steps(c))]
+            if in_use:
+                raise HTTPException(status_code=409, detail=f"Template is used by campaigns: {', '.join(in_use)}")
+            if db.query(TemplateModel).filter(TemplateModel.id == template_id).delete():
+                bump_versions(db, "templates")
+
+        await write(delete)
+        lookup_cache.invalidate("templates")
+
+    async def get_email_history(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        accept: Optional[str] = None,
+        response: Optional[Response] = None,
+        client_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        status: Optional[str] = None,
+    ) -> List[EmailLog]:
+        """Retrieve a log of sent emails: summary columns only, newest first."""
+        def to_log(l: EmailLogModel) -> EmailLog:
+            return EmailLog(
                 id=l.id,
                 timestamp=l.timestamp,
                 recipient_count=l.recipient_count,
                 subject=l.subject,
-                body=l.body,
-                status=l.status,
-                recipients=l.recipients.split(",") if l.recipients else []
+                status=l.status
             )
-            for l in logs
-        ]
+
+        # Bodies and recipients are left to GET /email/history/{log_id}
+        stmt = select(EmailLogModel).options(load_only(
+            EmailLogModel.id, EmailLogModel.timestamp, EmailLogModel.recipient_count,
+            EmailLogModel.subject, EmailLogModel.status,
+        ))
+        # The date range and the keyset both seek on the timestamp index
+        since, until = self._naive_utc(since), self._naive_utc(until)
+        if since:
+            stmt = stmt.where(EmailLogModel.timestamp >= since)
+        if until:
+            stmt = stmt.where(EmailLogModel.timestamp < until)
+        if status:
+            stmt = stmt.where(EmailLogModel.status == status)
+        if client_id:
+            # Index-only lookup on (client_id, log_id)
+            stmt = stmt.where(EmailLogModel.id.in_(
+                select(EmailDeliveryModel.log_id).where(EmailDeliveryModel.client_id == client_id)
+            ))
+        keys = [(EmailLogModel.timestamp, True), (EmailLogModel.id, True)]
+        return await paginate(self.db, stmt, keys, to_log, limit, cursor, accept, response)
+
+    @staticmethod
+    def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+        # Log timestamps are stored as naive UTC
+        if value is not None and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    async def get_email_log(self, log_id: str) -> EmailLog:
+        """One logged send, with its body and recipients."""
+        log = await self.db.get(EmailLogModel, log_id)
+        if not log:
+            raise HTTPException(status_code=404, detail="Email log not found")
+        recipients = await self.db.scalars(
+            select(EmailDeliveryModel.client_id)
+            .where(EmailDeliveryModel.log_id == log_id)
+            .order_by(EmailDeliveryModel.id)
+        )
+        return EmailLog(
+            id=log.id,
+            timestamp=log.timestamp,
+            recipient_count=log.recipient_count,
+            subject=log.subject,
+            body=log.body,
+            status=log.status,
+            recipients=list(recipients)
+        )
+
+    async def get_email_deliveries(
+        self,
+        log_id: str,
+        status: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        accept: Optional[str] = None,
+        response: Optional[Response] = None,
+    ) -> List[EmailDelivery]:
+        """Per-recipient outcome of one logged send."""
+        def to_delivery(d: EmailDeliveryModel) -> EmailDelivery:
+            return EmailDelivery(
+                log_id=d.log_id,
+                client_id=d.client_id,
+                email=d.email,
+                status=d.status,
+                error=d.error,
+                attempts=d.attempts or 0,
+                sent_at=d.sent_at
+            )
+
+        stmt = select(EmailDeliveryModel).where(EmailDeliveryModel.log_id == log_id)
+        if status:
+            stmt = stmt.where(EmailDeliveryModel.status == status)
+        keys = [(EmailDeliveryModel.id, False)]
+        return await paginate(self.db, stmt, keys, to_delivery, limit, cursor, accept, response)
@@ -0,0 +1,68 @@
+# coding: utf-8
+
+"""Strong ETags for the list endpoints, derived from per-table change versions.
+
+Every write path that changes a listed table calls ``bump_versions`` in the
+same transaction, which increments the table's row in ``table_versions``. A
+list response's ETag hashes those versions together with the query that
+produced it, so an ``If-None-Match`` request is answered with a single
+primary-key lookup and a 304, without reading any of the listed rows. The
+versions are read before the rows, so a tag never claims rows newer than
+the ones it was sent with.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Mapping, Optional, Sequence
+
+from fastapi import Response
+from sqlalchemy import select, update
+
+from database import TableVersionModel
+
+ETAG_HEADER = "ETag"
+
+
+def bump_versions(db, *tables: str) -> None:
+    """Mark ``tables`` as changed; call it inside the transaction that changes them."""
+    v = TableVersionModel
+    db.execute(update(v).where(v.name.in_(tables)).values(version=v.version + 1))
+
+
+def _versions(tables: Sequence[str]):
+    v = TableVersionModel
+    return select(v.name, v.version).where(v.name.in_(tables))
+
+
+async def read_versions(db, tables: Sequence[str]) -> Dict[str, int]:
+    """Current versions of ``tables``, on the ``AsyncSession`` ``db``."""
+    return dict((await db.execute(_versions(tables))).all())
+
+
+def read_versions_sync(db, tables: Sequence[str]) -> Dict[str, int]:
+    return dict(db.execute(_versions(tables)).all())
+
+
+def list_etag(versions: Mapping[str, int], *query: Any) -> str:
+    """The ETag of the rows of the tables in ``versions`` selected by ``query``."""
+    key = json.dumps([sorted(versions.items()), list(query)], default=str)
+    return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """``If-None-Match`` comparison, which is weak: ``W/`` prefixes are ignored."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+
+def conditional(versions: Mapping[str, int], query: Sequence[Any],
+                if_none_match: Optional[str], response: Optional[Response]) -> Optional[Response]:
+    """A 304 when the client's copy is current; otherwise tag ``response`` and return ``None``."""
+    etag = list_etag(versions, *query)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={ETAG_HEADER: etag})
+    if response is not None:
+        response.headers[ETAG_HEADER] = etag
+    return None
@@ -0,0 +1,135 @@
+# coding: utf-8
+
+"""Bounded LRU/TTL cache for data that rarely changes.
+
+It holds template and attachment list pages, and the template and
+attachment rows a send job reads. Each entry is stamped with its table's
+``table_versions`` version when it is loaded and is only served while that
+version is unchanged. A write made by any worker process therefore makes
+the entry stale everywhere. Checking the version is one primary-key read,
+which list requests already make for their ETag. Writes in this process
+also drop their table's entries at once (``invalidate``).
+
+``CACHE_ENABLED=false`` turns the cache off. ``stats()`` returns the
+hit/miss counters, which ``GET /cache/stats`` serves.
+"""
+
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Response
+
+from openapi_server.impl.etags import read_versions_sync
+from openapi_server.impl.pagination import NEXT_CURSOR_HEADER
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+# Seconds an entry is kept even if its table never changes
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+
+MISSING = object()
+
+
+class LookupCache:
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL,
+                 enabled: bool = CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        # (table, key) -> (table version, expiry, value)
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[Optional[int], float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Counter = Counter()
+
+    def get(self, table: str, key: Hashable, version: Optional[int]) -> Any:
+        """The value cached at ``version`` of ``table``, or ``MISSING``."""
+        if not self.enabled:
+            return MISSING
+        with self._lock:
+            entry = self._entries.get((table, key))
+            if entry is not None:
+                if entry[0] == version and entry[1] > time.monotonic():
+                    self._entries.move_to_end((table, key))
+                    self._counters["hits"] += 1
+                    return entry[2]
+                del self._entries[(table, key)]
+                self._counters["stale"] += 1
+            self._counters["misses"] += 1
+            return MISSING
+
+    def put(self, table: str, key: Hashable, version: Optional[int], value: Any) -> None:
+        """Cache ``value``, loaded after ``version`` of ``table`` was read."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[(table, key)] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end((table, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def invalidate(self, table: str) -> None:
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == table]
+            for k in keys:
+                del self._entries[k]
+            self._counters["invalidations"] += len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                **{name: self._counters[name] for name in ("hits", "misses", "stale", "evictions", "invalidations")},
+                "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+            }
+
+
+lookup_cache = LookupCache()
+
+
+async def cached_page(table: str, version: Optional[int], key: Hashable, response: Optional[Response],
+                      load_page: Callable[[Response], Any]) -> list:
+    """One list page through the cache.
+
+    ``load_page(response)`` is a ``paginate`` call. Its ``X-Next-Cursor`` is
+    cached with the rows.
+    """
+    page = lookup_cache.get(table, ("page", key), version)
+    if page is MISSING:
+        page_response = Response()
+        page = (await load_page(page_response), page_response.headers.get(NEXT_CURSOR_HEADER))
+        lookup_cache.put(table, ("page", key), version, page)
+    rows, next_cursor = page
+    if next_cursor and response is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+
+def cached_rows(db, table: str, ids, load: Callable[[list], Dict[Hashable, Any]]) -> Dict[Hashable, Any]:
+    """Values by id from the cache, calling ``load(missing_ids)`` on a synchronous session for the rest."""
+    version = read_versions_sync(db, [table]).get(table)
+    found, missing = {}, []
+    for i in ids:
+        value = lookup_cache.get(table, ("row", i), version)
+        if value is MISSING:
+            missing.append(i)
+        else:
+            found[i] = value
+    if missing:
+        loaded = load(missing)
+        for i in missing:
+            # Unknown ids are cached as None, so they cost no query either
+            lookup_cache.put(table, ("row", i), version, loaded.get(i))
+        found.update(loaded)
+    return {i: v for i, v in found.items() if v is not None}
@@ -0,0 +1,110 @@
+# coding: utf-8
+
+"""Keyset pagination and NDJSON streaming for the list endpoints.
+
+A page is ordered by a fixed list of sort keys ending in a unique column.
+The next page starts strictly after the last row's key values, which are
+handed to the client as an opaque ``X-Next-Cursor`` header, so deep pages
+cost the same index seek as the first one. Sending
+``Accept: application/x-ndjson`` streams the rows instead, one JSON object
+per line, fetched from the database in batches.
+"""
+
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import DateTime, and_, or_
+
+from database import AsyncSessionLocal
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+NDJSON = "application/x-ndjson"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# (column or expression, descending)
+SortKey = Tuple[Any, bool]
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence[SortKey]) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(v) if isinstance(getattr(col, "type", None), DateTime) and v else v
+            for (col, _), v in zip(keys, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after(keys: Sequence[SortKey], values: Sequence[Any]):
+    """``WHERE`` clause selecting rows that sort strictly after ``values``."""
+    clauses = []
+    for i, (col, desc) in enumerate(keys):
+        ties = [keys[j][0] == values[j] for j in range(i)]
+        step = col < values[i] if desc else col > values[i]
+        clauses.append(and_(*ties, step))
+    return or_(*clauses)
+
+
+def order_by_keys(stmt, keys: Sequence[SortKey]):
+    return stmt.order_by(*[col.desc() if desc else col.asc() for col, desc in keys])
+
+
+def wants_ndjson(accept: Optional[str]) -> bool:
+    return bool(accept) and NDJSON in accept
+
+
+async def paginate(
+    db,
+    stmt,
+    keys: Sequence[SortKey],
+    to_model: Callable[[Any], Any],
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    accept: Optional[str] = None,
+    response: Optional[Response] = None,
+):
+    """Return one page of ``to_model(row)``s, or a streaming NDJSON response.
+
+    ``stmt`` is a ``select()`` of one entity, run on the ``AsyncSession`` ``db``.
+    """
+    stmt = order_by_keys(stmt.add_columns(*[col for col, _ in keys]), keys)
+    if cursor:
+        stmt = stmt.where(after(keys, decode_cursor(cursor, keys)))
+
+    if wants_ndjson(accept):
+        if limit:
+            stmt = stmt.limit(limit)
+
+        async def lines():
+            # The request's session is closed before the body is sent; stream on our own
+            async with AsyncSessionLocal() as stream_db:
+                rows = await stream_db.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+                async for row in rows:
+                    yield to_model(row[0]).json(by_alias=True) + "\n"
+
+        return StreamingResponse(lines(), media_type=NDJSON)
+
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    rows = (await db.execute(stmt.limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if response is not None:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(list(rows[-1][1:]))
+    return [to_model(row[0]) for row in rows]
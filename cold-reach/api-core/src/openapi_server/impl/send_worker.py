@@ -0,0 +1,310 @@
+# coding: utf-8
+
+"""Background workers that drain persisted send jobs.
+
+The ``send_jobs`` table is the queue: ``POST /email/send`` inserts a row and
+wakes a worker through an in-process queue, and on startup every job that
+was still queued is picked up again, so no broker is needed. Jobs left
+``running`` by a crashed process are not restarted automatically, since
+part of their recipients may already have been emailed.
+"""
+
+import os
+import queue
+import smtplib
+import threading
+import uuid
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import insert
+
+from database import SessionLocal, ClientModel, EmailLogModel, EmailDeliveryModel, AttachmentModel, SendJobModel, chunked
+from openapi_server.impl.etags import bump_versions
+from openapi_server.impl.lookup_cache import cached_rows
+
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", "2"))
+# Recipients are resolved, marked as emailed and reported on the job row in
+# chunks of this size, so a send costs O(recipients / chunk) queries.
+SEND_CHUNK_SIZE = int(os.getenv("SEND_CHUNK_SIZE", "500"))
+
+
+def split_ids(value: Optional[str]) -> List[str]:
+    return value.split(",") if value else []
+
+
+def iter_recipients(db, recipient_ids: List[str], chunk_size: int = SEND_CHUNK_SIZE):
+    """Yield ``(requested_ids, rows)`` per chunk, one ``IN (...)`` query each."""
+    for ids in chunked(recipient_ids, chunk_size):
+        rows = db.query(ClientModel.id, ClientModel.name, ClientModel.email, ClientModel.company)\
+                 .filter(ClientModel.id.in_(ids)).all()
+        yield ids, rows
+
+
+def mark_emailed(db, client_ids: List[str], chunk_size: int = SEND_CHUNK_SIZE) -> None:
+    """Bulk-update status/last_contact without loading ORM objects."""
+    now = datetime.now().isoformat()
+    for ids in chunked(client_ids, chunk_size):
+        db.query(ClientModel).filter(ClientModel.id.in_(ids))\
+          .update({ClientModel.status: "emailed", ClientModel.last_contact: now},
+                  synchronize_session=False)
+    if client_ids:
+        bump_versions(db, "clients")
+
+
+def record_deliveries(db, rows: List[dict]) -> None:
+    """Insert a chunk's per-recipient outcomes in one executemany."""
+    if rows:
+        db.execute(insert(EmailDeliveryModel.__table__), rows)
+
+
+def _delivery(log_id: str, client_id: str, email: Optional[str], status: str,
+              error: Optional[BaseException] = None, attempts: int = 0) -> dict:
+    return {
+        "log_id": log_id, "client_id": client_id, "email": email, "status": status,
+        "error": str(error)[:1000] if error is not None else None, "attempts": attempts,
+        "sent_at": datetime.utcnow() if status in ("sent", "sent_mock") else None,
+    }
+
+
+class AttachmentFile(NamedTuple):
+    id: str
+    filename: str
+    file_path: str
+    mime_type: Optional[str]
+
+
+def load_attachments(db, attachment_ids: List[str], chunk_size: int = SEND_CHUNK_SIZE) -> List[AttachmentFile]:
+    def load(missing):
+        found = {}
+        for ids in chunked(missing, chunk_size):
+            for att in db.query(AttachmentModel).filter(AttachmentModel.id.in_(ids)):
+                found[att.id] = AttachmentFile(att.id, att.filename, att.file_path, att.mime_type)
+        return found
+
+    found = cached_rows(db, "attachments", attachment_ids, load)
+    return [found[i] for i in attachment_ids if i in found]
+
+
+def deliver_send_job(db, job: SendJobModel, chunk_size: int = SEND_CHUNK_SIZE) -> None:
+    """Send one job's emails and record the outcome on the job row."""
+    from email.message import EmailMessage
+    from openapi_server.impl.attachment_cache import attach_prepared, prepare_attachments
+    from openapi_server.impl.sender_accounts import SenderQuotaExhausted, load_sender_accounts, send_across_accounts
+    from openapi_server.impl.template_engine import TemplateNotFound, resolve_template
+
+    accounts = load_sender_accounts()
+    # Deliveries reference the log written at the end of the job
+    log_id = str(uuid.uuid4())
+
+    recipient_ids = split_ids(job.recipient_ids)
+
+    # Collect attachments if any
+    attachment_files = load_attachments(db, split_ids(job.attachment_ids), chunk_size)
+    try:
+        template = resolve_template(db, job.template_id, job.subject, job.body)
+    except TemplateNotFound as e:
+        # Nothing is sent rather than a blank email to every recipient
+        print(f"Send job {job.id}: {e}")
+        job.status = "failed"
+        job.error = str(e)
+        job.failed_count = len(recipient_ids)
+        db.commit()
+        return
+
+    # If no credentials, mock send but update DB
+    if not accounts:
+        print("Mock sending...")
+        # Recipients are resolved as on the real path, so the counts mean the same
+        for ids, clients in iter_recipients(db, recipient_ids, chunk_size):
+            found = {client.id: client for client in clients}
+            sent_ids, deliveries = [], []
+            for client_id in ids:
+                client = found.get(client_id)
+                if client is None:
+                    deliveries.append(_delivery(log_id, client_id, None, "failed", LookupError("Client not found")))
+                elif not client.email:
+                    deliveries.append(_delivery(log_id, client_id, None, "failed", ValueError("No email address")))
+                else:
+                    sent_ids.append(client_id)
+                    deliveries.append(_delivery(log_id, client_id, client.email, "sent_mock", attempts=1))
+            record_deliveries(db, deliveries)
+            mark_emailed(db, sent_ids, chunk_size)
+            job.sent_count += len(sent_ids)
+            job.failed_count += len(ids) - len(sent_ids)
+            db.commit()
+        job.status = "completed"
+        db.add(EmailLogModel(
+            id=log_id,
+            timestamp=datetime.utcnow(),
+            recipient_count=job.sent_count,
+            subject=template.subject.source,
+            body=template.body.source,
+            status="sent_mock"
+        ))
+        db.commit()
+        return
+
+    prepared_attachments = prepare_attachments(attachment_files)
+
+    try:
+        for ids, clients in iter_recipients(db, recipient_ids, chunk_size):
+            sent_ids = []
+            found = {client.id for client in clients}
+            deliveries = [_delivery(log_id, client_id, None, "failed", LookupError("Client not found"))
+                          for client_id in ids if client_id not in found]
+            job.failed_count += len(ids) - len(clients)
+            try:
+                outbox = []
+                for client in clients:
+                    if not client.email:
+                        job.failed_count += 1
+                        deliveries.append(_delivery(log_id, client.id, None, "failed", ValueError("No email address")))
+                        continue
+
+                    subject_final, body_final = template.render({
+                        "name": client.name,
+                        "company": client.company or "",
+                        "email": client.email
+                    })
+
+                    msg = EmailMessage()
+                    msg.set_content(body_final)
+                    msg["Subject"] = subject_final
+                    msg["To"] = client.email
+
+                    attach_prepared(msg, prepared_attachments)
+                    outbox.append((client, msg))
+
+                # The chunk is sharded over the sender accounts (From is set
+                # per account) and each share goes out over that account's sessions
+                attempts = [0] * len(outbox)
+                errors = send_across_accounts(db, accounts, [msg for _, msg in outbox], attempts=attempts)
+                abort_error = None
+                for (client, _), error, tries in zip(outbox, errors, attempts):
+                    if error is None:
+                        sent_ids.append(client.id)
+                        deliveries.append(_delivery(log_id, client.id, client.email, "sent", attempts=tries))
+                    elif isinstance(error, (smtplib.SMTPAuthenticationError, SenderQuotaExhausted)):
+                        abort_error = error
+                        deliveries.append(_delivery(log_id, client.id, client.email, "skipped", error, tries))
+                    else:
+                        print(f"Failed to send to {client.email}: {error}")
+                        job.failed_count += 1
+                        deliveries.append(_delivery(log_id, client.id, client.email, "failed", error, tries))
+                if abort_error is not None:
+                    raise abort_error
+            finally:
+                record_deliveries(db, deliveries)
+                mark_emailed(db, sent_ids, chunk_size)
+                job.sent_count += len(sent_ids)
+                db.commit()
+
+        job.status = "completed"
+
+    except Exception as e:
+        print(f"SMTP Error: {e}")
+        job.status = "failed"
+        job.error = str(e)
+
+    # Log entry
+    db.add(EmailLogModel(
+        id=log_id,
+        timestamp=datetime.utcnow(),
+        recipient_count=job.sent_count,
+        subject=template.subject.source,
+        body=template.body.source,
+        status="sent" if job.sent_count > 0 else "failed"
+    ))
+    db.commit()
+
+
+class SendWorkerPool:
+    """Fixed set of daemon threads that run send jobs one at a time each."""
+
+    def __init__(self, workers: int = SEND_WORKERS):
+        self.workers = max(1, workers)
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the threads and requeue jobs a previous process never picked up."""
+        with self._lock:
+            if self._threads:
+                return
+            db = SessionLocal()
+            try:
+                queued = db.query(SendJobModel.id)\
+                           .filter(SendJobModel.status == "queued")\
+                           .order_by(SendJobModel.created_at).all()
+            finally:
+                db.close()
+            for (job_id,) in queued:
+                self._queue.put(job_id)
+            for n in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"send-worker-{n}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, job_id: str) -> None:
+        self.start()
+        self._queue.put(job_id)
+
+    def stop(self) -> None:
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for t in threads:
+            t.join(timeout=5)
+
+    def join(self) -> None:
+        """Block until every submitted job has been processed."""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            try:
+                if job_id is None:
+                    return
+                self._process(job_id)
+            except Exception as e:
+                print(f"Send job {job_id} crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _process(self, job_id: str) -> None:
+        db = SessionLocal()
+        try:
+            # Claim the job; losing the race means another worker already has it.
+            claimed = db.query(SendJobModel)\
+                        .filter(SendJobModel.id == job_id, SendJobModel.status == "queued")\
+                        .update({SendJobModel.status: "running"}, synchronize_session=False)
+            db.commit()
+            if not claimed:
+                return
+            job = db.query(SendJobModel).filter(SendJobModel.id == job_id).first()
+            try:
+                deliver_send_job(db, job)
+            except Exception as e:
+                db.rollback()
+                job.status = "failed"
+                job.error = str(e)
+                db.commit()
+                raise
+        finally:
+            db.close()
+
+
+_pool: Optional[SendWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_send_worker_pool() -> SendWorkerPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SendWorkerPool()
+        return _pool
@@ -0,0 +1,283 @@
+# coding: utf-8
+
+"""Sender accounts and the hourly/daily quotas they share across workers.
+
+Accounts come from ``SENDER_ACCOUNTS``, a JSON list (or the path of a JSON
+file) of ``{"user", "password", "host", "port", "hourly_limit",
+"daily_limit"}`` objects. Without it the single ``GMAIL_USER`` /
+``GMAIL_PASSWORD`` pair is the only account. A limit of 0 means unlimited.
+
+Quota use lives in the ``sender_quotas`` table. Every change is a single-row
+compare-and-set ``UPDATE``, so send workers in any number of processes draw
+from the same counts without holding a lock across a send. The changes are
+made and committed in a session of their own, so they never commit (or roll
+back) the calling worker's unit of work.
+"""
+
+import json
+import os
+import smtplib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SenderQuotaModel
+from openapi_server.impl import smtp_pool
+
+SENDER_HOURLY_LIMIT = int(os.getenv("SENDER_HOURLY_LIMIT", "0"))
+SENDER_DAILY_LIMIT = int(os.getenv("SENDER_DAILY_LIMIT", "0"))
+# How long an account the server throttled (or refused to log in) is skipped
+SENDER_THROTTLE_COOLDOWN = int(os.getenv("SENDER_THROTTLE_COOLDOWN", "3600"))
+
+# Compare-and-set attempts before a reservation gives up on a contended account
+_RESERVE_ATTEMPTS = 20
+
+
+class SenderAccount(NamedTuple):
+    user: str
+    password: str
+    host: str
+    port: int
+    hourly_limit: int = 0
+    daily_limit: int = 0
+
+    @property
+    def key(self) -> str:
+        return f"{self.user}@{self.host}:{self.port}"
+
+
+def load_sender_accounts() -> List[SenderAccount]:
+    """The configured accounts; empty when no credentials are set (mock sending)."""
+    raw = os.getenv("SENDER_ACCOUNTS")
+    if raw:
+        if not raw.lstrip().startswith("["):
+            with open(raw) as f:
+                raw = f.read()
+        return [
+            SenderAccount(
+                user=a["user"],
+                password=a["password"],
+                host=a.get("host") or smtp_pool.SMTP_HOST,
+                port=int(a.get("port") or smtp_pool.SMTP_PORT),
+                hourly_limit=int(a.get("hourly_limit", SENDER_HOURLY_LIMIT)),
+                daily_limit=int(a.get("daily_limit", SENDER_DAILY_LIMIT)),
+            )
+            for a in json.loads(raw)
+        ]
+    user, password = os.getenv("GMAIL_USER"), os.getenv("GMAIL_PASSWORD")
+    if user and password:
+        return [SenderAccount(user, password, smtp_pool.SMTP_HOST, smtp_pool.SMTP_PORT,
+                              SENDER_HOURLY_LIMIT, SENDER_DAILY_LIMIT)]
+    return []
+
+
+def _windows(now: datetime):
+    return now.strftime("%Y-%m-%dT%H"), now.strftime("%Y-%m-%d")
+
+
+def _left(limit: int, used: int) -> float:
+    return float("inf") if limit <= 0 else limit - used
+
+
+def _quota_session(db) -> Session:
+    """A short-lived session on ``db``'s database for one quota change."""
+    return Session(bind=db.get_bind())
+
+
+def reserve(db, account: SenderAccount, wanted: int, now: Optional[datetime] = None) -> int:
+    """Claim up to ``wanted`` sends from ``account``'s quota and return how many were granted."""
+    with _quota_session(db) as quota:
+        return _reserve(quota, account, wanted, now or datetime.utcnow())
+
+
+def _reserve(db, account: SenderAccount, wanted: int, now: datetime) -> int:
+    hour, day = _windows(now)
+    q = SenderQuotaModel
+    for _ in range(_RESERVE_ATTEMPTS):
+        db.commit()
+        row = db.execute(
+            select(q.hour_start, q.hour_sent, q.day_start, q.day_sent, q.throttled_until)
+            .where(q.account == account.key)
+        ).first()
+        db.commit()
+
+        if row is not None and row.throttled_until is not None and row.throttled_until > now:
+            return 0
+        hour_sent = row.hour_sent if row is not None and row.hour_start == hour else 0
+        day_sent = row.day_sent if row is not None and row.day_start == day else 0
+        granted = int(min(wanted, _left(account.hourly_limit, hour_sent), _left(account.daily_limit, day_sent)))
+        if granted <= 0:
+            return 0
+
+        values = {"hour_start": hour, "hour_sent": hour_sent + granted,
+                  "day_start": day, "day_sent": day_sent + granted}
+        if row is None:
+            db.add(q(account=account.key, **values))
+            try:
+                db.commit()
+                return granted
+            except IntegrityError:
+                # Another worker created the row first; go round again
+                db.rollback()
+                continue
+
+        # Only applies if nobody else changed the row since it was read
+        claimed = db.execute(
+            update(q).where(
+                q.account == account.key,
+                q.hour_start.is_not_distinct_from(row.hour_start),
+                q.hour_sent == row.hour_sent,
+                q.day_start.is_not_distinct_from(row.day_start),
+                q.day_sent == row.day_sent,
+                q.throttled_until.is_not_distinct_from(row.throttled_until),
+            ).values(**values)
+        ).rowcount
+        db.commit()
+        if claimed:
+            return granted
+    return 0
+
+
+def release(db, account: SenderAccount, unused: int, now: Optional[datetime] = None) -> None:
+    """Give back ``unused`` reserved sends that were never accepted by the server."""
+    if unused <= 0:
+        return
+    hour, day = _windows(now or datetime.utcnow())
+    q = SenderQuotaModel
+    with _quota_session(db) as quota:
+        quota.execute(update(q).where(q.account == account.key, q.hour_start == hour, q.hour_sent >= unused)
+                      .values(hour_sent=q.hour_sent - unused))
+        quota.execute(update(q).where(q.account == account.key, q.day_start == day, q.day_sent >= unused)
+                      .values(day_sent=q.day_sent - unused))
+        quota.commit()
+
+
+def throttle(db, account: SenderAccount, now: Optional[datetime] = None,
+             cooldown: Optional[int] = None) -> None:
+    """Take ``account`` out of rotation for every worker for ``cooldown`` seconds."""
+    now = now or datetime.utcnow()
+    until = now + timedelta(seconds=SENDER_THROTTLE_COOLDOWN if cooldown is None else cooldown)
+    q = SenderQuotaModel
+    with _quota_session(db) as quota:
+        if not quota.execute(update(q).where(q.account == account.key).values(throttled_until=until)).rowcount:
+            quota.add(q(account=account.key, hour_sent=0, day_sent=0, throttled_until=until))
+        quota.commit()
+
+
+def allocate(db, accounts: List[SenderAccount], wanted: int,
+             now: Optional[datetime] = None) -> Dict[SenderAccount, int]:
+    """Shard ``wanted`` sends evenly across ``accounts`` within their remaining quota.
+
+    An account that cannot take its full share is skipped in later rounds
+    and its part goes to the accounts that still have room.
+    """
+    grants: Dict[SenderAccount, int] = {}
+    remaining = wanted
+    candidates = list(accounts)
+    while remaining and candidates:
+        share = -(-remaining // len(candidates))
+        has_room = []
+        for account in candidates:
+            granted = reserve(db, account, min(share, remaining), now)
+            if granted:
+                grants[account] = grants.get(account, 0) + granted
+                remaining -= granted
+            if granted == share:
+                has_room.append(account)
+            if not remaining:
+                break
+        candidates = has_room
+    return grants
+
+
+# Replies that mean the account is rate limited or over its quota
+_THROTTLE_MARKERS = ("4.7.0", "4.7.28", "5.4.5", "quota", "rate limit", "sending limit", "too many")
+
+
+def is_throttled(exc: BaseException) -> bool:
+    """True when ``exc`` says the account (not the recipient) may not send right now."""
+    if isinstance(exc, smtplib.SMTPAuthenticationError):
+        return False
+    code = getattr(exc, "smtp_code", None) or getattr(exc, "code", None)
+    if code == 421:
+        return True
+    if code not in (450, 451, 452, 454, 550, 554):
+        return False
+    message = getattr(exc, "smtp_error", None) or getattr(exc, "message", "")
+    if isinstance(message, bytes):
+        message = message.decode("utf-8", "replace")
+    message = message.lower()
+    return any(marker in message for marker in _THROTTLE_MARKERS)
+
+
+class SenderQuotaExhausted(Exception):
+    """No configured account can send right now."""
+
+
+def _send_batch(account: SenderAccount, messages) -> List[Optional[BaseException]]:
+    pool = smtp_pool.get_smtp_pool(account.user, account.password, account.host, account.port)
+    for msg in messages:
+        del msg["From"]
+        msg["From"] = account.user
+    return pool.send_messages(messages)
+
+
+def send_across_accounts(db, accounts: List[SenderAccount], messages, now: Optional[datetime] = None,
+                         attempts: Optional[List[int]] = None) -> List[Optional[BaseException]]:
+    """Send ``messages`` sharded over ``accounts``, all accounts at once.
+
+    Returns, per message, the exception it failed with or ``None``, like
+    ``send_messages``. When an account is throttled or its login is refused
+    it is put on cooldown, its unsent share is given back and the messages
+    go to the other accounts. Messages no account can take fail with
+    ``SenderQuotaExhausted`` (or the last account's own error). ``attempts``,
+    if given, counts how many accounts each message was handed to.
+    """
+    outcomes: List[Optional[BaseException]] = [None] * len(messages)
+    pending = list(range(len(messages)))
+    available = list(accounts)
+    account_error: Optional[BaseException] = None
+    while pending:
+        grants = allocate(db, available, len(pending), now)
+        if not grants:
+            error = SenderQuotaExhausted("No sender account has quota left")
+            if account_error is not None:
+                error = account_error
+            for i in pending:
+                outcomes[i] = error
+            break
+
+        batches, start = [], 0
+        for account, count in grants.items():
+            batches.append((account, pending[start:start + count]))
+            start += count
+        # Whatever no account could take this round is tried again (and fails
+        # with SenderQuotaExhausted if it still cannot be placed)
+        pending = pending[start:]
+        if len(batches) == 1:
+            results = [_send_batch(batches[0][0], [messages[i] for i in batches[0][1]])]
+        else:
+            with ThreadPoolExecutor(len(batches), thread_name_prefix="sender") as executor:
+                results = list(executor.map(
+                    lambda batch: _send_batch(batch[0], [messages[i] for i in batch[1]]), batches))
+
+        for (account, indexes), errors in zip(batches, results):
+            retry = []
+            for i, error in zip(indexes, errors):
+                outcomes[i] = error
+                if attempts is not None:
+                    attempts[i] += 1
+                if error is not None and (is_throttled(error) or isinstance(error, smtplib.SMTPAuthenticationError)):
+                    retry.append(i)
+            if retry:
+                print(f"Sender {account.user} unavailable, moving {len(retry)} messages: {outcomes[retry[0]]}")
+                account_error = outcomes[retry[0]]
+                throttle(db, account, now)
+                release(db, account, len(retry), now)
+                available.remove(account)
+                pending.extend(retry)
+    return outcomes
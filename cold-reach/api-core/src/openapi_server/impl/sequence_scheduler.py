@@ -0,0 +1,227 @@
+# coding: utf-8
+
+"""Follow-up sequences: campaign steps sent to enrolled clients on a schedule.
+
+Enrolling a client adds one ``scheduled_sends`` row holding the campaign
+step due next and when it is due. The ``(status, due_at)`` index is the
+scheduler's priority queue: a tick reads only the rows that are already
+due, earliest first, and the first pending ``due_at`` (one index seek) says
+how long to sleep. Pending steps cost nothing until they are due, however
+many there are. Enrolling wakes the scheduler early; other processes'
+enrollments are seen within ``SCHEDULER_MAX_SLEEP``.
+
+A tick claims a batch of due rows, turns it into one send job per campaign
+step and moves each row on to its next step, in one transaction. The jobs
+then go to the send workers like any other. Clients who replied or were
+closed are stopped instead of emailed.
+"""
+
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import or_, select, tuple_, update
+
+from database import SessionLocal, CampaignModel, ClientModel, ScheduledSendModel, SendJobModel, chunked, insert_ignoring_duplicates
+
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "500"))
+# Longest sleep between ticks, so steps scheduled by other processes are picked up
+SCHEDULER_MAX_SLEEP = float(os.getenv("SCHEDULER_MAX_SLEEP", "60"))
+
+# Clients in these states get no further steps
+STOP_STATUSES = ("replied", "closed")
+
+
+class DueBatch(NamedTuple):
+    claimed: int
+    job_ids: List[str]
+
+
+def campaign_steps(campaign: CampaignModel) -> List[dict]:
+    return json.loads(campaign.steps or "[]")
+
+
+def enroll(db, campaign: CampaignModel, client_ids: List[str], now: Optional[datetime] = None) -> int:
+    """Schedule the first step for the clients not already in ``campaign``; returns how many were added.
+
+    Unknown clients and clients who replied or were closed are left out.
+    """
+    now = now or datetime.utcnow()
+    due_at = now + timedelta(minutes=campaign_steps(campaign)[0]["delay_minutes"])
+    statement = insert_ignoring_duplicates(db.get_bind(), ScheduledSendModel.__table__, ["campaign_id", "client_id"])
+    enrolled = 0
+    for ids in chunked(list(dict.fromkeys(client_ids)), SCHEDULER_BATCH_SIZE):
+        found = db.execute(
+            select(ClientModel.id).where(
+                ClientModel.id.in_(ids),
+                or_(ClientModel.status.is_(None), ClientModel.status.not_in(STOP_STATUSES)),
+            )
+        ).scalars().all()
+        if found:
+            enrolled += db.execute(statement, [
+                {"campaign_id": campaign.id, "client_id": client_id, "step": 0, "due_at": due_at, "status": "pending"}
+                for client_id in found
+            ]).rowcount
+    return enrolled
+
+
+def run_due(db, now: Optional[datetime] = None, batch_size: int = SCHEDULER_BATCH_SIZE) -> DueBatch:
+    """Turn one batch of due steps into queued send jobs and commit.
+
+    The claim is a single ``UPDATE`` guarded on the row still being pending,
+    due and at the step that was read, so schedulers in other processes
+    never hand out the same step twice, nor a later step early from a stale
+    list of due rows.
+    """
+    now = now or datetime.utcnow()
+    s = ScheduledSendModel
+    due = db.execute(
+        select(s.id, s.step).where(s.status == "pending", s.due_at <= now).order_by(s.due_at).limit(batch_size)
+    ).all()
+    if not due:
+        db.commit()
+        return DueBatch(0, [])
+
+    token = str(uuid.uuid4())
+    db.execute(
+        update(s)
+        .where(tuple_(s.id, s.step).in_([tuple(row) for row in due]), s.status == "pending",
+               s.due_at <= now, s.claim.is_(None))
+        .values(claim=token)
+    )
+    rows = db.execute(
+        select(s.id, s.campaign_id, s.client_id, s.step, s.due_at, s.job_id,
+               ClientModel.id.label("found"), ClientModel.status.label("client_status"))
+        .outerjoin(ClientModel, ClientModel.id == s.client_id)
+        .where(s.id.in_([row.id for row in due]), s.claim == token)
+    ).all()
+    steps = {
+        c.id: campaign_steps(c)
+        for c in db.query(CampaignModel).filter(CampaignModel.id.in_({r.campaign_id for r in rows}))
+    }
+
+    groups: Dict[Tuple[str, int], list] = {}
+    changes = []
+    for r in rows:
+        campaign = steps.get(r.campaign_id)
+        if r.found is None or r.client_status in STOP_STATUSES or not campaign or r.step >= len(campaign):
+            changes.append({"id": r.id, "step": r.step, "due_at": r.due_at, "status": "stopped",
+                            "claim": None, "job_id": r.job_id})
+        else:
+            groups.setdefault((r.campaign_id, r.step), []).append(r)
+
+    job_ids = []
+    for (campaign_id, step), group in groups.items():
+        campaign = steps[campaign_id]
+        job_id = str(uuid.uuid4())
+        db.add(SendJobModel(
+            id=job_id,
+            status="queued",
+            # Blank subject and body are filled from the template
+            subject="",
+            body="",
+            template_id=campaign[step]["template_id"],
+            recipient_ids=",".join(r.client_id for r in group),
+            total_count=len(group),
+            sent_count=0,
+            failed_count=0
+        ))
+        job_ids.append(job_id)
+        if step + 1 < len(campaign):
+            following = {"step": step + 1, "status": "pending",
+                         "due_at": now + timedelta(minutes=campaign[step + 1]["delay_minutes"])}
+        else:
+            following = {"step": step, "status": "completed", "due_at": None}
+        changes.extend({"id": r.id, "claim": None, "job_id": job_id, **following} for r in group)
+
+    if changes:
+        db.execute(update(ScheduledSendModel), changes)
+    db.commit()
+    return DueBatch(len(rows), job_ids)
+
+
+def next_due(db) -> Optional[datetime]:
+    """When the earliest pending step is due: the first entry of the due index."""
+    s = ScheduledSendModel
+    return db.execute(
+        select(s.due_at).where(s.status == "pending").order_by(s.due_at).limit(1)
+    ).scalar()
+
+
+def tick(db, submit: Callable[[str], None], now: Optional[datetime] = None,
+         batch_size: int = SCHEDULER_BATCH_SIZE) -> float:
+    """Send every step that is due and return the seconds until the next one."""
+    while True:
+        batch = run_due(db, now, batch_size)
+        for job_id in batch.job_ids:
+            submit(job_id)
+        if batch.claimed < batch_size:
+            break
+    upcoming = next_due(db)
+    db.commit()
+    if upcoming is None:
+        return SCHEDULER_MAX_SLEEP
+    wait = (upcoming - (now or datetime.utcnow())).total_seconds()
+    return min(max(wait, 0.0), SCHEDULER_MAX_SLEEP)
+
+
+class SequenceScheduler:
+    """One daemon thread that sleeps until the next step is due, then sends it."""
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="sequence-scheduler", daemon=True)
+            self._thread.start()
+
+    def wake(self) -> None:
+        """Look for due steps now, e.g. after enrolling clients."""
+        self.start()
+        self._wake.set()
+
+    def stop(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+        self._wake.set()
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def _run(self) -> None:
+        from openapi_server.impl.send_worker import get_send_worker_pool
+
+        while not self._stopping:
+            self._wake.clear()
+            db = SessionLocal()
+            try:
+                wait = tick(db, get_send_worker_pool().submit)
+            except Exception as e:
+                print(f"Sequence scheduler tick failed: {e}")
+                db.rollback()
+                wait = SCHEDULER_MAX_SLEEP
+            finally:
+                db.close()
+            self._wake.wait(wait)
+
+
+_scheduler: Optional[SequenceScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_sequence_scheduler() -> SequenceScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SequenceScheduler()
+        return _scheduler
@@ -0,0 +1,277 @@
+# coding: utf-8
+
+"""Process-wide pool of authenticated SMTP sessions used by the send path.
+
+``get_smtp_pool`` returns an ``AsyncSMTPConnectionPool`` (``async_smtp``)
+when aiosmtplib is installed and ``SMTPConnectionPool`` (smtplib, with a
+bounded thread pool for concurrent sends) otherwise; ``SMTP_TRANSPORT``
+forces one or the other.
+"""
+
+import os
+import smtplib
+import socket
+import ssl
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import certifi
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+# Off only for a local relay or test sink without TLS
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+# "auto" (async when aiosmtplib is installed), "async" or "thread"
+SMTP_TRANSPORT = os.getenv("SMTP_TRANSPORT", "auto").lower()
+SMTP_POOL_IDLE_TIMEOUT = float(os.getenv("SMTP_POOL_IDLE_TIMEOUT", "60"))
+SMTP_POOL_MAX_MESSAGES = int(os.getenv("SMTP_POOL_MAX_MESSAGES", "100"))
+# Connections idle for longer than this are NOOP-checked before being reused.
+SMTP_POOL_HEALTH_CHECK_AFTER = float(os.getenv("SMTP_POOL_HEALTH_CHECK_AFTER", "5"))
+# How long a rejected login is replayed before logging in again; the sender
+# rotation skips the account for the same SENDER_THROTTLE_COOLDOWN.
+SMTP_AUTH_RETRY_AFTER = float(os.getenv("SENDER_THROTTLE_COOLDOWN", "3600"))
+
+
+@lru_cache(maxsize=1)
+def get_ssl_context() -> ssl.SSLContext:
+    """Build the STARTTLS context once; loading the CA bundle is not free."""
+    try:
+        return ssl.create_default_context(cafile=certifi.where())
+    except Exception:
+        return ssl._create_unverified_context()
+
+
+class _PooledConnection:
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        try:
+            self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+
+def _is_reconnectable(exc: Exception) -> bool:
+    """True for errors that mean the session is gone, not that the message is bad."""
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code == 421:
+        return True
+    return isinstance(exc, (socket.timeout, ConnectionError))
+
+
+def _is_refusal(exc: Exception) -> bool:
+    """True when the server refused the message and reset the envelope.
+
+    The session is still logged in and can carry the next message.
+    """
+    refused = (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException)
+    return isinstance(exc, refused) and not _is_reconnectable(exc)
+
+
+class SMTPConnectionPool:
+    """Bounded pool of logged-in SMTP sessions.
+
+    Idle sessions are kept LIFO so the warmest one is reused first, checked
+    with NOOP when they have been idle for a while, dropped after
+    ``idle_timeout`` seconds and retired after ``max_messages`` sends. A
+    rejected login is remembered for ``auth_retry_after`` seconds: sends in
+    that window fail with it straight away rather than logging in again
+    with the same credentials, and the first one after it tries again.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: str,
+        size: int = SMTP_POOL_SIZE,
+        idle_timeout: float = SMTP_POOL_IDLE_TIMEOUT,
+        max_messages: int = SMTP_POOL_MAX_MESSAGES,
+        timeout: float = SMTP_TIMEOUT,
+        health_check_after: float = SMTP_POOL_HEALTH_CHECK_AFTER,
+        starttls: bool = SMTP_STARTTLS,
+        auth_retry_after: float = SMTP_AUTH_RETRY_AFTER,
+        smtp_factory: Callable[..., smtplib.SMTP] = smtplib.SMTP,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.starttls = starttls
+        self.auth_retry_after = auth_retry_after
+        self.smtp_factory = smtp_factory
+
+        self._idle: Deque[_PooledConnection] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._auth_error: Optional[smtplib.SMTPAuthenticationError] = None
+        self._auth_failed_at = 0.0
+        self._closed = False
+
+    def _connect(self) -> _PooledConnection:
+        if self._auth_error is not None:
+            if time.monotonic() - self._auth_failed_at < self.auth_retry_after:
+                raise self._auth_error
+            self._auth_error = None
+        smtp = self.smtp_factory(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls(context=get_ssl_context())
+            smtp.login(self.username, self.password)
+        except smtplib.SMTPAuthenticationError as e:
+            self._auth_error, self._auth_failed_at = e, time.monotonic()
+            try:
+                smtp.close()
+            except Exception:
+                pass
+            raise
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+            raise
+        return _PooledConnection(smtp)
+
+    def _is_healthy(self, conn: _PooledConnection) -> bool:
+        idle_for = time.monotonic() - conn.last_used
+        if idle_for > self.idle_timeout:
+            return False
+        if idle_for <= self.health_check_after:
+            return True
+        try:
+            code, _ = conn.smtp.noop()
+        except Exception:
+            return False
+        return code == 250
+
+    def _acquire(self) -> _PooledConnection:
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return self._connect()
+            if self._is_healthy(conn):
+                return conn
+            conn.close()
+
+    def _release(self, conn: _PooledConnection) -> None:
+        conn.last_used = time.monotonic()
+        if self._closed or conn.messages_sent >= self.max_messages:
+            conn.close()
+            return
+        with self._lock:
+            self._idle.append(conn)
+
+    def _send_on(self, conn: _PooledConnection, msg) -> None:
+        """Send ``msg`` over ``conn``; the session is pooled again unless it was lost."""
+        try:
+            conn.smtp.send_message(msg)
+        except Exception as e:
+            if _is_refusal(e):
+                self._release(conn)
+            else:
+                conn.close()
+            raise
+        conn.messages_sent += 1
+        self._release(conn)
+
+    def send_message(self, msg) -> None:
+        """Send one message, reconnecting once if the session was dropped."""
+        self._slots.acquire()
+        try:
+            try:
+                self._send_on(self._acquire(), msg)
+            except Exception as e:
+                if not _is_reconnectable(e):
+                    raise
+                self._send_on(self._connect(), msg)
+        finally:
+            self._slots.release()
+
+    def send_messages(self, messages) -> List[Optional[BaseException]]:
+        """Send ``messages`` over up to ``size`` sessions at once.
+
+        Returns, per message, the exception it failed with or ``None``.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.size, thread_name_prefix="smtp-send")
+            executor = self._executor
+        futures = [executor.submit(self.send_message, msg) for msg in messages]
+        return [f.exception() for f in futures]
+
+    def close(self) -> None:
+        """Log out of every idle session and stop pooling new ones."""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+        for conn in idle:
+            conn.close()
+
+
+_pools: Dict[Tuple[str, int, str], SMTPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def smtp_pool_class():
+    """The pool class for ``SMTP_TRANSPORT``."""
+    from openapi_server.impl import async_smtp
+
+    if SMTP_TRANSPORT == "thread" or (SMTP_TRANSPORT == "auto" and async_smtp.aiosmtplib is None):
+        return SMTPConnectionPool
+    return async_smtp.AsyncSMTPConnectionPool
+
+
+def get_smtp_pool(
+    username: str,
+    password: str,
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+) -> SMTPConnectionPool:
+    """Return the shared pool for an account, creating it on first use."""
+    host = host or SMTP_HOST
+    port = port or SMTP_PORT
+    key = (host, port, username)
+    pool_class = smtp_pool_class()
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None and (pool.password != password or not isinstance(pool, pool_class)):
+            # Credentials were rotated; drain the sessions logged in with the old ones.
+            pool.close()
+            pool = None
+        if pool is None:
+            pool = pool_class(host, port, username, password, starttls=SMTP_STARTTLS)
+            _pools[key] = pool
+        return pool
+
+
+def close_smtp_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
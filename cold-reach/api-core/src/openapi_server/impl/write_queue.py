@@ -0,0 +1,153 @@
+# coding: utf-8
+
+"""Single-writer queue for the small writes issued by request handlers.
+
+SQLite allows one writer at a time. Instead of every request opening its own
+write transaction and racing for the lock, handlers hand a function to one
+writer thread, which runs whatever has queued up in a single transaction and
+commits once. Readers keep using the request session and, in WAL mode, never
+wait for the writer. Other databases skip the queue and commit on the request
+session.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from functools import partial
+from typing import Any, Callable, List, Optional, Tuple
+
+from database import SessionLocal, current_session
+
+WRITE_QUEUE_ENABLED = os.getenv("SQLITE_WRITE_QUEUE", "true").lower() in ("1", "true", "yes")
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "64"))
+
+# A write is ``fn(session) -> result``; it must not commit, the queue does.
+Write = Callable[[Any], Any]
+
+
+class WriteQueue:
+    """One daemon thread applying queued writes in batched transactions."""
+
+    def __init__(self, session_factory=None, max_batch: int = WRITE_QUEUE_MAX_BATCH):
+        # Objects a write added stay readable by the caller after the commit
+        self.session_factory = session_factory or partial(SessionLocal, expire_on_commit=False)
+        self.max_batch = max(1, max_batch)
+        self.commits = 0
+        self._queue: "queue.Queue[Optional[Tuple[Write, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, fn: Write) -> Future:
+        self.start()
+        future: Future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def stop(self) -> None:
+        """Apply everything already queued, then stop the thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # Take whatever else is already waiting; never wait for more
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._apply(batch)
+                    return
+                batch.append(item)
+            self._apply(batch)
+
+    def _apply(self, batch: List[Tuple[Write, Future]]) -> None:
+        """Run ``batch`` in one transaction.
+
+        A write that raises is failed on its own: the transaction is rolled
+        back and the rest of the batch is replayed without it.
+        """
+        pending = [(fn, future) for fn, future in batch if future.set_running_or_notify_cancel()]
+        while pending:
+            db = self.session_factory()
+            done = []
+            try:
+                for fn, future in pending:
+                    try:
+                        result = fn(db)
+                        db.flush()
+                    except BaseException as e:
+                        db.rollback()
+                        future.set_exception(e)
+                        pending = [p for p in pending if p[1] is not future]
+                        break
+                    done.append((future, result))
+                else:
+                    db.commit()
+                    self.commits += 1
+                    pending = []
+                    for future, result in done:
+                        future.set_result(result)
+            except BaseException as e:
+                # The commit itself failed; every write in it failed with it
+                db.rollback()
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                pending = []
+            finally:
+                db.close()
+
+
+_writer: Optional[WriteQueue] = None
+_writer_lock = threading.Lock()
+
+
+def get_write_queue() -> WriteQueue:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = WriteQueue()
+        return _writer
+
+
+def close_write_queue() -> None:
+    with _writer_lock:
+        writer = _writer
+    if writer is not None:
+        writer.stop()
+
+
+async def write(fn: Write):
+    """Apply ``fn(session)`` as a committed write and return its result.
+
+    On SQLite it goes through the shared writer thread; otherwise it runs on
+    the request's ``AsyncSession`` (``fn`` gets its synchronous facade),
+    which is committed (or rolled back) here.
+    """
+    db = current_session()
+    if WRITE_QUEUE_ENABLED and db.get_bind().dialect.name == "sqlite":
+        return await asyncio.wrap_future(get_write_queue().submit(fn))
+    try:
+        result = await db.run_sync(fn)
+        await db.commit()
+        return result
+    except BaseException:
+        await db.rollback()
+        raise
@@ -10,15 +10,42 @@
 """
 
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from database import async_engine
 from openapi_server.apis.default_api import router as DefaultApiRouter
+from openapi_server.impl.compression import CompressionMiddleware
+from openapi_server.impl.etags import ETAG_HEADER
+from openapi_server.impl.lookup_cache import lookup_cache
+from openapi_server.impl.pagination import NEXT_CURSOR_HEADER
+from openapi_server.impl.send_worker import get_send_worker_pool
+from openapi_server.impl.sequence_scheduler import get_sequence_scheduler
+from openapi_server.impl.smtp_pool import close_smtp_pools
+from openapi_server.impl.write_queue import close_write_queue
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resume send jobs that were queued before the last shutdown.
+    get_send_worker_pool().start()
+    # Send the campaign steps that fell due while the server was down
+    get_sequence_scheduler().start()
+    yield
+    get_sequence_scheduler().stop()
+    get_send_worker_pool().stop()
+    close_smtp_pools()
+    close_write_queue()
+    await async_engine.dispose()
+
 
 app = FastAPI(
     title="Cold Reach API",
     description="API for Cold Reach email outreach platform",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -27,10 +54,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER],
 )
 
+# Large list pages are repetitive JSON and shrink several-fold
+app.add_middleware(CompressionMiddleware)
+
 @app.get("/")
 def read_root():
     return {"message": "Cold Reach API is running!"}
 
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters of this process's lookup cache, for monitoring."""
+    return lookup_cache.stats()
+
 app.include_router(DefaultApiRouter)
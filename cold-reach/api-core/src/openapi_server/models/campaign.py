@@ -0,0 +1,48 @@
+# coding: utf-8
+
+from __future__ import annotations
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+class CampaignStep(BaseModel):
+    """
+    CampaignStep - a template sent a delay after the previous step (or the enrollment)
+    """
+    template_id: str = Field(alias="template_id")
+    delay_minutes: int = Field(alias="delay_minutes", default=0, ge=0)
+
+    class Config:
+        allow_population_by_field_name = True
+
+class Campaign(BaseModel):
+    """
+    Campaign - a follow-up sequence of templates sent to each enrolled client
+    """
+    id: Optional[str] = Field(alias="id", default=None)
+    name: str = Field(alias="name")
+    steps: List[CampaignStep] = Field(alias="steps")
+    created_at: Optional[datetime] = Field(alias="created_at", default=None)
+
+    class Config:
+        allow_population_by_field_name = True
+
+class CampaignEnrollment(BaseModel):
+    """
+    CampaignEnrollment - clients to start a campaign for
+    """
+    client_ids: List[str] = Field(alias="client_ids")
+
+    class Config:
+        allow_population_by_field_name = True
+
+class CampaignEnrollmentResult(BaseModel):
+    """
+    CampaignEnrollmentResult - how many of the clients were enrolled
+    """
+    enrolled: int = Field(alias="enrolled", default=0)
+    skipped: int = Field(alias="skipped", default=0)
+
+    class Config:
+        allow_population_by_field_name = True
@@ -19,10 +19,14 @@ class EmailAttachment(BaseModel):
         id: The id of this EmailAttachment [Optional].
         name: The name of this EmailAttachment [Optional].
         size: The size of this EmailAttachment [Optional].
+        size_bytes: The size_bytes of this EmailAttachment [Optional].
+        mime_type: The mime_type of this EmailAttachment [Optional].
     """
 
     id: Optional[str] = Field(alias="id", default=None)
     name: Optional[str] = Field(alias="name", default=None)
     size: Optional[str] = Field(alias="size", default=None)
+    size_bytes: Optional[int] = Field(alias="size_bytes", default=None)
+    mime_type: Optional[str] = Field(alias="mime_type", default=None)
 
 EmailAttachment.update_forward_refs()
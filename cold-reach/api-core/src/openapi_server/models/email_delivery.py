@@ -0,0 +1,22 @@
+# coding: utf-8
+
+from __future__ import annotations
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+class EmailDelivery(BaseModel):
+    """
+    EmailDelivery - what happened to one recipient of a logged send
+    """
+    log_id: str = Field(alias="log_id")
+    client_id: str = Field(alias="client_id")
+    email: Optional[str] = Field(alias="email", default=None)
+    status: str = Field(alias="status")
+    error: Optional[str] = Field(alias="error", default=None)
+    attempts: int = Field(alias="attempts", default=0)
+    sent_at: Optional[datetime] = Field(alias="sent_at", default=None)
+
+    class Config:
+        allow_population_by_field_name = True
@@ -8,6 +8,7 @@ from typing import Any, Dict, List, Optional  # noqa: F401
 
 from pydantic import AnyUrl, BaseModel, EmailStr, Field, validator  # noqa: F401
 from openapi_server.models.client import Client
+from openapi_server.models.import_rejection import ImportRejection
 
 
 class ImportClientsExcel200Response(BaseModel):
@@ -19,9 +20,13 @@ class ImportClientsExcel200Response(BaseModel):
 
         count: The count of this ImportClientsExcel200Response [Optional].
         clients: The clients of this ImportClientsExcel200Response [Optional].
+        rejected_count: The rejected_count of this ImportClientsExcel200Response [Optional].
+        rejected: The rejected of this ImportClientsExcel200Response [Optional].
     """
 
     count: Optional[int] = Field(alias="count", default=None)
     clients: Optional[List[Client]] = Field(alias="clients", default=None)
+    rejected_count: Optional[int] = Field(alias="rejectedCount", default=None)
+    rejected: Optional[List[ImportRejection]] = Field(alias="rejected", default=None)
 
 ImportClientsExcel200Response.update_forward_refs()
@@ -0,0 +1,17 @@
+# coding: utf-8
+
+from __future__ import annotations
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+class ImportRejection(BaseModel):
+    """
+    ImportRejection - a spreadsheet row that was not imported, and why
+    """
+    row: int = Field(alias="row")
+    email: Optional[str] = Field(alias="email", default=None)
+    reason: str = Field(alias="reason")
+
+    class Config:
+        allow_population_by_field_name = True
@@ -0,0 +1,24 @@
+# coding: utf-8
+
+from __future__ import annotations
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+class SendJob(BaseModel):
+    """
+    SendJob - a queued or running email campaign send
+    """
+    id: str = Field(alias="id")
+    status: str = Field(alias="status")
+    total: int = Field(alias="total", default=0)
+    sent: int = Field(alias="sent", default=0)
+    failed: int = Field(alias="failed", default=0)
+    pending: int = Field(alias="pending", default=0)
+    error: Optional[str] = Field(alias="error", default=None)
+    created_at: Optional[datetime] = Field(alias="created_at", default=None)
+    updated_at: Optional[datetime] = Field(alias="updated_at", default=None)
+
+    class Config:
+        allow_population_by_field_name = True
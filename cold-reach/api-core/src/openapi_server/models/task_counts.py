@@ -0,0 +1,17 @@
+# coding: utf-8
+
+from __future__ import annotations
+
+from pydantic import BaseModel, Field
+
+class TaskCounts(BaseModel):
+    """
+    TaskCounts - the numbers behind the tasks tab's filters and cards
+    """
+    pending: int = Field(alias="pending", default=0)
+    completed: int = Field(alias="completed", default=0)
+    overdue: int = Field(alias="overdue", default=0)
+    due_today: int = Field(alias="dueToday", default=0)
+
+    class Config:
+        allow_population_by_field_name = True
@@ -1,9 +1,35 @@
+import asyncio
+import os
+import subprocess
+import sys
+
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
+from database import AsyncSessionLocal, Base, SessionLocal, async_url, make_async_engine, make_engine
+from openapi_server.impl.lookup_cache import lookup_cache
 from openapi_server.main import app as application
 
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+# Row counts for the import memory tests; set e.g. IMPORT_RSS_TEST_ROWS=20000,500000 for the full-size run.
+IMPORT_RSS_TEST_ROWS = [int(n) for n in os.getenv("IMPORT_RSS_TEST_ROWS", "10000,60000").split(",")]
+
+MEASURE_IMPORT = """
+import resource, sys
+from database import SessionLocal
+from openapi_server.impl import client_import
+
+db = SessionLocal()
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+result = client_import.{call}
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(result.count, before, after)
+"""
+
 
 @pytest.fixture
 def app() -> FastAPI:
@@ -13,5 +39,86 @@ def app() -> FastAPI:
 
 
 @pytest.fixture
-def client(app) -> TestClient:
+def tmp_database(tmp_path_factory):
+    """Point request sessions, the write queue and the workers at a fresh database file."""
+    url = f"sqlite:///{tmp_path_factory.mktemp('db')}/cold_reach.db"
+    engine = make_engine(url)
+    async_engine = make_async_engine(async_url(url))
+
+    async def create_tables():
+        # Also records the client search backend for the async engine
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    Base.metadata.create_all(bind=engine)
+    asyncio.run(create_tables())
+    originals = SessionLocal.kw["bind"], AsyncSessionLocal.kw["bind"]
+    SessionLocal.configure(bind=engine)
+    AsyncSessionLocal.configure(bind=async_engine)
+    # Table versions start over with the database; so must anything cached against them
+    lookup_cache.clear()
+    try:
+        yield engine
+    finally:
+        SessionLocal.configure(bind=originals[0])
+        AsyncSessionLocal.configure(bind=originals[1])
+        lookup_cache.clear()
+        engine.dispose()
+        asyncio.run(async_engine.dispose())
+
+
+@pytest.fixture
+def client(app, tmp_database) -> TestClient:
     return TestClient(app)
+
+
+@pytest.fixture
+def db_session():
+    """A session on a throwaway in-memory database with every table created."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def import_memory(tmp_path):
+    """Check that an import's peak memory does not grow with the number of rows.
+
+    ``source(rows, workdir)`` prepares an import of ``rows`` clients and
+    returns the ``client_import`` call to make, e.g.
+    ``"import_excel_upload(db, open('clients.xlsx', 'rb'), 'clients.xlsx', True, sample_size=0)"``.
+    Each size runs in a fresh interpreter on a fresh database in ``workdir``.
+    """
+    if sys.platform == "win32":
+        pytest.skip("needs resource.getrusage")
+
+    def measure(source, env=None):
+        growth = {}
+        for rows in IMPORT_RSS_TEST_ROWS:
+            workdir = tmp_path / str(rows)
+            workdir.mkdir()
+            call = source(rows, workdir)
+            result = subprocess.run(
+                [sys.executable, "-c", MEASURE_IMPORT.format(call=call)],
+                # SQLite's page cache and mmap window fill up towards their configured caps as the
+                # database grows; keep them at SQLite's defaults so only the import is measured
+                cwd=workdir, env={**os.environ, "PYTHONPATH": SRC, "SQLITE_MMAP_SIZE": "0",
+                                  "SQLITE_CACHE_SIZE": "-2000", **(env or {})},
+                capture_output=True, text=True, check=True,
+            )
+            count, before, after = map(int, result.stdout.split()[-3:])
+            assert count == rows
+            growth[rows] = (after - before) / 1024  # ru_maxrss is in KiB on Linux
+
+        small, large = min(growth), max(growth)
+        assert growth[large] < 100, growth
+        assert growth[large] - growth[small] < 25, growth
+
+    return measure
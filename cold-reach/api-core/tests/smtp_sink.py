@@ -0,0 +1,72 @@
+# coding: utf-8
+
+"""SMTP stand-in for the send tests."""
+
+import asyncio
+import multiprocessing
+import socket
+
+
+async def _handle(reader, writer, messages, sessions, throttle_after):
+    """Accept any login and count the messages delivered; refuse ``refused@`` recipients."""
+    with sessions.get_lock():
+        sessions.value += 1
+    writer.write(b"220 sink ESMTP\r\n")
+    while True:
+        line = await reader.readline()
+        verb = line[:4].upper()
+        if not line or verb == b"QUIT":
+            writer.write(b"221 bye\r\n")
+            break
+        if verb == b"EHLO":
+            writer.write(b"250-sink\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+        elif verb == b"AUTH":
+            writer.write(b"235 accepted\r\n")
+        elif verb == b"MAIL" and throttle_after is not None and messages.value >= throttle_after:
+            writer.write(b"550 5.4.5 Daily user sending limit exceeded\r\n")
+        elif verb == b"RCPT" and b"refused@" in line:
+            writer.write(b"550 5.1.1 No such user\r\n")
+        elif verb == b"DATA":
+            writer.write(b"354 end with .\r\n")
+            while (await reader.readline()) not in (b".\r\n", b""):
+                pass
+            with messages.get_lock():
+                messages.value += 1
+            writer.write(b"250 queued\r\n")
+        else:
+            writer.write(b"250 OK\r\n")
+        await writer.drain()
+    await writer.drain()
+    writer.close()
+
+
+def _serve(sock, messages, sessions, throttle_after):
+    async def serve():
+        server = await asyncio.start_server(
+            lambda r, w: _handle(r, w, messages, sessions, throttle_after), sock=sock)
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+class SMTPSink:
+    """Local SMTP server in its own process, like a real relay would be.
+
+    With ``throttle_after`` it answers ``MAIL FROM`` with Gmail's daily
+    limit error once that many messages have been delivered.
+    """
+
+    def __init__(self, throttle_after=None):
+        ctx = multiprocessing.get_context("spawn")
+        self.messages = ctx.Value("i", 0)
+        self.sessions = ctx.Value("i", 0)
+        sock = socket.create_server(("127.0.0.1", 0))
+        self.port = sock.getsockname()[1]
+        self.process = ctx.Process(target=_serve, args=(sock, self.messages, self.sessions, throttle_after),
+                                   daemon=True)
+        self.process.start()
+        sock.close()
+
+    def close(self):
+        self.process.terminate()
+        self.process.join()
@@ -0,0 +1,87 @@
+# coding: utf-8
+
+import asyncio
+import os
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import AsyncSessionLocal, Base, ClientModel, SessionLocal, async_url
+
+SEED_CLIENTS = int(os.getenv("LATENCY_CLIENTS", "30000"))
+PROBES = 200
+
+
+@pytest.fixture
+def large_db(tmp_path):
+    """Point request sessions at a file database holding many clients."""
+    url = f"sqlite:///{tmp_path}/latency.db"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(async_url(url))
+
+    async def create():
+        # Created through the asyncio engine so its search backend is registered
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create())
+    with engine.begin() as conn:
+        conn.execute(insert(ClientModel.__table__), [
+            {"id": str(uuid.uuid4()), "name": f"Client {n}", "email": f"client{n}@example.com",
+             "email_normalized": f"client{n}@example.com", "company": "Acme", "status": "not_contacted"}
+            for n in range(SEED_CLIENTS)
+        ])
+
+    originals = SessionLocal.kw["bind"], AsyncSessionLocal.kw["bind"]
+    SessionLocal.configure(bind=engine)
+    AsyncSessionLocal.configure(bind=async_engine)
+    try:
+        yield
+    finally:
+        SessionLocal.configure(bind=originals[0])
+        AsyncSessionLocal.configure(bind=originals[1])
+        engine.dispose()
+        asyncio.run(async_engine.dispose())
+
+
+def test_heavy_client_query_does_not_stall_other_requests(app, large_db):
+    async def measure():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            answered = 0
+
+            async def probes():
+                nonlocal answered
+                for _ in range(PROBES):
+                    assert (await client.get("/templates", params={"limit": 10})).status_code == 200
+                    answered += 1
+                    await asyncio.sleep(0.002)
+
+            async def heavy():
+                # Every client matches: SQLite ranks the whole FTS result for one small page
+                before = answered
+                response = await client.get("/clients", params={"search": "client", "limit": 20})
+                assert response.status_code == 200 and len(response.json()) == 20
+                return answered - before
+
+            stop = asyncio.Event()
+            overlapping = []
+
+            async def load():
+                while not stop.is_set():
+                    overlapping.append(await heavy())
+
+            loader = asyncio.create_task(load())
+            await probes()
+            stop.set()
+            await loader
+            return overlapping
+
+    # Probes answered while each heavy search was in flight
+    overlapping = asyncio.run(measure())
+    assert overlapping
+    # A search run on the event loop would let at most the probe already in progress finish
+    assert max(overlapping) >= 5, overlapping
@@ -0,0 +1,58 @@
+# coding: utf-8
+
+import builtins
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+from types import SimpleNamespace
+
+from openapi_server.impl.attachment_cache import attach_prepared, prepare_attachments
+
+
+def _message(body: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg.set_content(body)
+    msg["Subject"] = "Hello"
+    msg["To"] = "someone@example.com"
+    return msg
+
+
+def test_prepared_parts_match_add_attachment(tmp_path):
+    path = tmp_path / "deck.pdf"
+    data = bytes(range(256)) * 100
+    path.write_bytes(data)
+    prepared = prepare_attachments([SimpleNamespace(file_path=str(path), filename="deck.pdf")])
+
+    spliced = _message("Hi Ann")
+    attach_prepared(spliced, prepared)
+    expected = _message("Hi Ann")
+    expected.add_attachment(data, maintype="application", subtype="pdf", filename="deck.pdf")
+
+    ours, theirs = next(spliced.iter_attachments()), next(expected.iter_attachments())
+    assert ours["Content-Disposition"] == theirs["Content-Disposition"]
+    assert ours.get_payload() == theirs.get_payload()
+    parsed = message_from_bytes(spliced.as_bytes(), policy=policy.default)
+    attachment = next(parsed.iter_attachments())
+    assert attachment.get_content_type() == "application/pdf"
+    assert attachment.get_filename() == "deck.pdf"
+    assert attachment.get_content() == data
+
+
+def test_each_file_is_read_once_per_send(tmp_path, monkeypatch):
+    path = tmp_path / "notes.txt.gz"
+    path.write_bytes(b"\x1f\x8b compressed")
+    opened = []
+    real_open = builtins.open
+    monkeypatch.setattr(
+        builtins, "open", lambda f, *a, **kw: opened.append(f) or real_open(f, *a, **kw)
+    )
+
+    prepared = prepare_attachments([SimpleNamespace(file_path=str(path), filename="notes.txt.gz")])
+    messages = [_message(f"Hi {n}") for n in range(50)]
+    for msg in messages:
+        attach_prepared(msg, prepared)
+
+    assert opened == [str(path)]
+    for msg in messages:
+        attachment = next(msg.iter_attachments())
+        assert attachment.get_content_type() == "application/octet-stream"
+    assert next(messages[0].iter_attachments()) is not next(messages[1].iter_attachments())
@@ -0,0 +1,150 @@
+# coding: utf-8
+
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, DateTime, MetaData, String, Table, create_engine, inspect
+from sqlalchemy.pool import StaticPool
+
+from database import AttachmentBlobModel, AttachmentModel, Base, SessionLocal
+from openapi_server.impl import attachment_store
+from openapi_server.impl.attachment_cache import prepare_attachments
+from openapi_server.impl.send_worker import load_attachments
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(attachment_store, "ATTACHMENT_STORE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _blob(sha256):
+    with SessionLocal() as db:
+        return db.get(AttachmentBlobModel, sha256)
+
+
+def test_identical_uploads_share_one_file(client: TestClient, store):
+    data = b"0123456789abcdef" * (3 * attachment_store.ATTACHMENT_CHUNK_BYTES // 16 + 1)
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    first = client.post("/attachments", files={"file": ("brochure.pdf", data, "application/pdf")}).json()
+    second = client.post("/attachments", files={"file": ("copy", data, "application/pdf")}).json()
+
+    assert first["id"] != second["id"]
+    assert (first["size_bytes"], first["mime_type"], first["size"]) == (len(data), "application/pdf", "3.0 MB")
+    # No extension: the declared type is kept
+    assert second["mime_type"] == "application/pdf"
+    stored = [p for p in store.rglob("*") if p.is_file()]
+    assert [p.name for p in stored] == [sha256]
+    assert stored[0].read_bytes() == data
+    assert _blob(sha256).refcount == 2
+
+    with SessionLocal() as db:
+        files = load_attachments(db, [first["id"], second["id"]])
+    assert [f.mime_type for f in files] == ["application/pdf", "application/pdf"]
+    assert prepare_attachments(files)[1].headers[0] == ("Content-Type", "application/pdf")
+
+    client.delete(f"/attachments/{first['id']}")
+    assert os.path.exists(attachment_store.blob_path(sha256)) and _blob(sha256).refcount == 1
+
+    client.delete(f"/attachments/{second['id']}")
+    assert not os.path.exists(attachment_store.blob_path(sha256)) and _blob(sha256) is None
+    assert client.delete(f"/attachments/{second['id']}").status_code == 404
+    assert [p for p in store.rglob("*") if p.is_file()] == []
+
+
+def test_files_follow_the_transaction(db_session, store):
+    staged = attachment_store.stage_upload(io.BytesIO(b"kept only if committed"))
+
+    path = attachment_store.acquire_blob(db_session, staged)
+    assert os.path.exists(path)
+    db_session.rollback()
+    assert not os.path.exists(path)
+
+    attachment_store.acquire_blob(db_session, staged)
+    db_session.commit()
+    attachment_store.release_blob(db_session, staged.sha256)
+    db_session.rollback()
+    assert open(path, "rb").read() == b"kept only if committed"
+
+    attachment_store.release_blob(db_session, staged.sha256)
+    assert not os.path.exists(path)
+    db_session.commit()
+    os.remove(staged.path)
+    assert [p for p in store.rglob("*") if p.is_file()] == []
+
+
+def test_oversized_upload_is_refused(client: TestClient, store, monkeypatch):
+    monkeypatch.setattr(attachment_store, "ATTACHMENT_MAX_BYTES", 1024)
+
+    response = client.post("/attachments", files={"file": ("big.bin", b"x" * 4096, "application/octet-stream")})
+
+    assert response.status_code == 413
+    assert [p for p in store.rglob("*") if p.is_file()] == []
+
+
+def test_legacy_attachments_are_migrated(tmp_path):
+    legacy_file = tmp_path / "old_notes.txt"
+    legacy_file.write_bytes(b"hello")
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    old = Table("attachments", MetaData(), Column("id", String, primary_key=True), Column("filename", String),
+                Column("file_path", String), Column("size", String), Column("created_at", DateTime))
+    old.create(engine)
+    with engine.begin() as conn:
+        conn.execute(old.insert(), [{"id": "a", "filename": "notes.txt", "file_path": str(legacy_file), "size": "5 B"}])
+
+    Base.metadata.create_all(bind=engine)
+
+    assert {"sha256", "size_bytes", "mime_type"} <= {c["name"] for c in inspect(engine).get_columns("attachments")}
+    with engine.connect() as conn:
+        row = conn.execute(AttachmentModel.__table__.select()).one()
+    engine.dispose()
+    assert (row.size_bytes, row.mime_type, row.sha256) == (5, "text/plain", None)
+
+
+def test_content_is_streamed_with_ranges_and_etags(app, client: TestClient, store):
+    data = bytes(range(256)) * 1250
+    attachment = client.post("/attachments", files={"file": ("deck.pdf", data, "application/pdf")}).json()
+    url = f"/attachments/{attachment['id']}/content"
+    etag = f'"{hashlib.sha256(data).hexdigest()}"'
+
+    full = client.get(url)
+    assert full.content == data
+    assert full.headers["content-type"] == "application/pdf"
+    assert full.headers["etag"] == etag
+    assert full.headers["content-disposition"] == 'inline; filename="deck.pdf"'
+    assert "content-encoding" not in full.headers
+    assert client.get(url, params={"download": True}).headers["content-disposition"].startswith("attachment")
+
+    part = client.get(url, headers={"Range": "bytes=100-199", "Accept-Encoding": "gzip"})
+    assert part.status_code == 206
+    assert part.content == data[100:200]
+    assert part.headers["content-range"] == f"bytes 100-199/{len(data)}"
+    assert client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'}).status_code == 200
+
+    cached = client.get(url, headers={"If-None-Match": etag})
+    assert (cached.status_code, cached.content) == (304, b"")
+    assert client.get("/attachments/missing/content").status_code == 404
+
+    # Sent as bounded chunks read from disk, never as one body
+    async def fetch():
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        await app({"type": "http", "method": "GET", "path": url, "raw_path": url.encode(), "query_string": b"",
+                   "headers": [], "http_version": "1.1", "scheme": "http", "server": ("test", 80),
+                   "client": ("test", 1), "root_path": ""}, receive, send)
+        return [m["body"] for m in messages if m["type"] == "http.response.body"]
+
+    bodies = asyncio.run(fetch())
+    assert b"".join(bodies) == data
+    assert len(bodies) > 1 and max(len(b) for b in bodies) <= 64 * 1024
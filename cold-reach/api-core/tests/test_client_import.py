@@ -0,0 +1,200 @@
+# coding: utf-8
+
+import io
+
+import openpyxl
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.pool import StaticPool
+
+from database import Base, ClientModel, TaskModel
+from openapi_server.impl import client_import
+
+
+def _workbook(rows, header=("Name", "Email", "Company")) -> bytes:
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(list(header))
+    for row in rows:
+        ws.append(list(row))
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _upload(client: TestClient, content: bytes, skip_duplicates: bool = False, **params):
+    return client.post(
+        "/clients/import/excel",
+        params={"skip_duplicates": str(skip_duplicates).lower(), **params},
+        files={"file": ("clients.xlsx", content, "application/octet-stream")},
+    )
+
+
+def test_import_then_duplicate_detection(client: TestClient):
+    content = _workbook([
+        ("Ann", "ann@example.com", "Acme"),
+        (None, "anon@example.com", None),
+        ("No Email", None, "Acme"),
+        ("Bad Email", "not-an-email", "Acme"),
+    ])
+
+    response = _upload(client, content)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["count"] == 2
+    assert {c["name"] for c in body["clients"]} == {"Ann", "Unknown"}
+
+    response = _upload(client, content)
+    assert response.status_code == 409
+    assert response.json()["detail"]["count"] == 2
+
+    response = _upload(client, content, skip_duplicates=True)
+    assert response.status_code == 200
+    assert response.json()["count"] == 0
+
+
+def test_rejection_report(client: TestClient):
+    content = _workbook([
+        ("Ann", "ann@example.com", "Acme"),
+        ("Ann again", " ANN@Example.com ", "Acme"),
+        ("No Email", None, "Acme"),
+        ("Bad Email", "not-an-email", "Acme"),
+        ("Bob", "bob@example.com", None),
+    ])
+
+    body = _upload(client, content).json()
+
+    assert body["count"] == 2
+    assert body["rejectedCount"] == 3
+    assert body["rejected"] == [
+        {"row": 3, "email": "ANN@Example.com", "reason": "duplicate_in_file"},
+        {"row": 4, "email": None, "reason": "missing_email"},
+        {"row": 5, "email": "not-an-email", "reason": "invalid_email"},
+    ]
+
+    body = _upload(client, content, skip_duplicates=True).json()
+    assert body["count"] == 0
+    assert sorted((r["row"], r["reason"]) for r in body["rejected"]) == [
+        (2, "already_exists"), (3, "duplicate_in_file"), (4, "missing_email"),
+        (5, "invalid_email"), (6, "already_exists"),
+    ]
+
+
+def test_duplicates_across_chunks(db_session):
+    chunks = [
+        [(2, {"name": "A", "email": "a@example.com"})],
+        [(3, {"name": "A", "email": "A@example.com"}), (4, {"name": "B", "email": "b@example.com"})],
+    ]
+
+    result = client_import.run_import(db_session, lambda: iter(chunks), max_rejections=0)
+
+    assert result.count == 2
+    assert result.rejected_count == 1
+    assert result.rejected == []
+    assert db_session.query(ClientModel).count() == 2
+    assert db_session.query(TaskModel).count() == 2
+
+
+def test_summary_only_returns_a_sample(client: TestClient, monkeypatch):
+    monkeypatch.setattr(client_import, "IMPORT_SAMPLE_SIZE", 2)
+    content = _workbook([(f"C{n}", f"c{n}@example.com", None) for n in range(5)])
+
+    body = _upload(client, content, summary_only="true").json()
+
+    assert body["count"] == 5
+    assert [c["name"] for c in body["clients"]] == ["C0", "C1"]
+
+
+def test_bulk_insert_creates_clients_and_tasks(db_session):
+    chunks = [[(n + 2, {"name": f"C{n}", "email": f"c{n}@example.com", "company": "Acme"}) for n in range(3)]]
+
+    result = client_import.run_import(db_session, lambda: iter(chunks), sample_size=0)
+
+    assert result.count == 3
+    assert result.clients == []
+    client = db_session.query(ClientModel).filter_by(email="c1@example.com").one()
+    assert (client.name, client.company, client.status) == ("C1", "Acme", "not_contacted")
+    task = db_session.query(TaskModel).filter_by(client_email="c1@example.com").one()
+    assert (task.description, task.company, task.completed) == ("Send initial email to C1", "Acme", False)
+
+
+def test_create_client_rejects_existing_email(client: TestClient):
+    email = "dup@example.com"
+
+    assert client.post("/clients", json={"name": "First", "email": email}).status_code == 200
+    response = client.post("/clients", json={"name": "Second", "email": f"  {email.upper()}"})
+
+    assert response.status_code == 409
+
+
+def test_skip_duplicates_relies_on_unique_index(db_session):
+    db_session.add(ClientModel(id="old", name="Old", email=" A@Example.com"))
+    db_session.commit()
+    chunks = [[(2, {"name": "A", "email": "a@example.com"}), (3, {"name": "B", "email": "b@example.com"})]]
+
+    result = client_import.run_import(db_session, lambda: iter(chunks), skip_duplicates=True)
+
+    assert result.count == 1
+    assert [(r.row, r.reason) for r in result.rejected] == [(2, "already_exists")]
+    assert db_session.query(TaskModel).count() == 1
+
+
+def test_duplicate_report_is_bounded(db_session):
+    db_session.add_all([ClientModel(id=str(n), name="Old", email=f"c{n}@example.com") for n in range(5)])
+    db_session.commit()
+    chunks = [[(n + 2, {"name": "C", "email": f"C{n}@example.com"}) for n in range(5)]]
+
+    with pytest.raises(HTTPException) as exc:
+        client_import.run_import(db_session, lambda: iter(chunks), max_rejections=2)
+
+    assert exc.value.status_code == 409
+    assert exc.value.detail["count"] == 5
+    assert exc.value.detail["existing_emails"] == ["c0@example.com", "c1@example.com"]
+
+
+def test_email_index_migration_backfills_first_duplicate():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE clients (id VARCHAR PRIMARY KEY, name VARCHAR, email VARCHAR, "
+                             "company VARCHAR, status VARCHAR, last_contact VARCHAR)")
+        conn.exec_driver_sql("INSERT INTO clients (id, name, email) VALUES "
+                             "('1', 'A', 'Ann@Example.com'), ('2', 'A', ' ann@example.com'), ('3', 'B', 'b@example.com')")
+
+    Base.metadata.create_all(bind=engine)
+
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT id, email_normalized FROM clients ORDER BY id").all()
+    assert rows == [("1", "ann@example.com"), ("2", None), ("3", "b@example.com")]
+    assert "ux_clients_email_normalized" in {i["name"] for i in inspect(engine).get_indexes("clients")}
+
+
+def test_missing_columns(client: TestClient):
+    response = _upload(client, _workbook([("x",)], header=("Name",)))
+
+    assert response.status_code == 422
+
+
+def test_upload_size_limit(client: TestClient, monkeypatch):
+    real_spool = client_import.spool_upload
+    monkeypatch.setattr(
+        client_import, "spool_upload", lambda source, suffix="": real_spool(source, suffix, max_bytes=100)
+    )
+
+    response = _upload(client, _workbook([("Ann", "ann@example.com", "Acme")]))
+
+    assert response.status_code == 413
+
+
+def test_peak_memory_does_not_grow_with_file_size(import_memory):
+    def workbook(rows, workdir):
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(["Name", "Email", "Company"])
+        for n in range(rows):
+            ws.append([f"Client {n}", f"c{n}@example.com", f"Company {n % 100}"])
+        wb.save(workdir / "clients.xlsx")
+        return "import_excel_upload(db, open('clients.xlsx', 'rb'), 'clients.xlsx', True, sample_size=0)"
+
+    import_memory(workbook)
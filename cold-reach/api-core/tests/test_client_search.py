@@ -0,0 +1,65 @@
+# coding: utf-8
+
+import pytest
+from sqlalchemy import select
+
+from database import ClientModel, client_search_backend
+from openapi_server.impl.client_search import fts_match_expression, search_clients
+from openapi_server.impl.pagination import order_by_keys
+
+
+@pytest.fixture
+def clients(db_session):
+    db_session.add_all([
+        ClientModel(id="1", name="Sarah Johnson", email="sarah.j@techcorp.com", company="TechCorp Inc"),
+        ClientModel(id="2", name="John Smith", email="john@example.io", company="Acme"),
+        ClientModel(id="3", name="Techno Viking", email="viking@example.com", company=None),
+    ])
+    db_session.commit()
+    return db_session
+
+
+def _search(db_session, term):
+    stmt, keys = search_clients(select(ClientModel), term, db_session.get_bind())
+    return [c.id for c in db_session.scalars(order_by_keys(stmt, keys))]
+
+
+def test_sqlite_uses_fts5(clients):
+    assert client_search_backend(clients.get_bind()) == "fts5"
+
+
+def test_prefix_match_across_columns(clients):
+    assert sorted(_search(clients, "tech")) == ["1", "3"]
+    assert _search(clients, "acme") == ["2"]
+    assert _search(clients, "sarah.j@tech") == ["1"]
+    assert sorted(_search(clients, "JOHN")) == ["1", "2"]
+    assert _search(clients, "nomatch") == []
+    # Punctuation only: nothing for FTS5 to match, so it is a substring search
+    assert _search(clients, "!!") == []
+    assert _search(clients, "@") == ["1", "2", "3"]
+
+
+def test_index_follows_updates_and_deletes(clients):
+    client = clients.query(ClientModel).filter(ClientModel.id == "2").first()
+    client.company = "Globex"
+    clients.commit()
+    assert _search(clients, "acme") == []
+    assert _search(clients, "globex") == ["2"]
+
+    clients.query(ClientModel).filter(ClientModel.id == "2").delete()
+    clients.commit()
+    assert _search(clients, "globex") == []
+
+
+def test_match_expression_quotes_words():
+    assert fts_match_expression('Sarah "OR" j') == '"sarah"* "or"* "j"*'
+
+
+def test_get_clients_search_endpoint(client):
+    created = client.post("/clients", json={"name": "Zebulon Quartz", "email": "zq@example.com"})
+    assert created.status_code == 200
+
+    response = client.get("/clients", params={"search": "zebu"})
+
+    assert response.status_code == 200
+    assert [c["id"] for c in response.json()] == [created.json()["id"]]
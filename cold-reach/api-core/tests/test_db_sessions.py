@@ -0,0 +1,109 @@
+# coding: utf-8
+
+import asyncio
+import os
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import AsyncSessionLocal, Base, SessionLocal, async_url, engine_options
+from openapi_server.apis.default_api import default_api
+
+# Kept short for the regular suite; set SOAK_REQUESTS=50000 for the full soak
+SOAK_REQUESTS = int(os.getenv("SOAK_REQUESTS", "2000"))
+POOL_SIZE = 3
+
+
+@pytest.fixture
+def pooled_engines(tmp_path):
+    """Route request sessions and the write queue to small, strictly bounded pools."""
+    url = f"sqlite:///{tmp_path}/soak.db"
+    options = {"pool_size": POOL_SIZE, "max_overflow": 0, "pool_timeout": 5}
+    engine = create_engine(url, connect_args={"check_same_thread": False}, **options)
+    async_engine = create_async_engine(async_url(url), **options)
+    Base.metadata.create_all(bind=engine)
+    originals = SessionLocal.kw["bind"], AsyncSessionLocal.kw["bind"]
+    SessionLocal.configure(bind=engine)
+    AsyncSessionLocal.configure(bind=async_engine)
+    try:
+        yield engine, async_engine.sync_engine
+    finally:
+        SessionLocal.configure(bind=originals[0])
+        AsyncSessionLocal.configure(bind=originals[1])
+        engine.dispose()
+        asyncio.run(async_engine.dispose())
+
+
+def test_engine_options_from_environment(monkeypatch):
+    import database
+
+    monkeypatch.setattr(database, "DB_POOL_SIZE", 7)
+    monkeypatch.setattr(database, "DB_MAX_OVERFLOW", 0)
+    monkeypatch.setattr(database, "DB_POOL_PRE_PING", False)
+
+    options = engine_options("postgresql://user@db/cold_reach")
+    assert (options["pool_size"], options["max_overflow"], options["pool_pre_ping"]) == (7, 0, False)
+    assert "connect_args" not in options
+    assert engine_options("sqlite:///./cold_reach.db")["connect_args"] == {"check_same_thread": False}
+    assert "pool_size" not in engine_options("sqlite://")
+
+
+def test_implementation_is_built_once():
+    assert default_api() is default_api()
+
+
+def _track(engine):
+    stats = {"opened": 0, "now": 0, "peak": 0}
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, record):
+        stats["opened"] += 1
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, record, proxy):
+        stats["now"] += 1
+        stats["peak"] = max(stats["peak"], stats["now"])
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, record):
+        stats["now"] -= 1
+
+    return stats
+
+
+def test_connections_stay_at_pool_limit(app, pooled_engines):
+    # Request sessions (asyncio engine) and the write queue (sync engine) each have a pool
+    pools = [_track(engine) for engine in pooled_engines]
+
+    # Reads, a 404, a 409 after a write and an NDJSON stream, round robin
+    requests = [
+        ("GET", "/clients", {"params": {"limit": 5}}, 200),
+        ("GET", "/tasks", {"params": {"limit": 5}}, 200),
+        ("GET", "/email/jobs/missing", {}, 404),
+        ("POST", "/clients", {"json": {"name": "Soak", "email": "soak@example.com"}}, 409),
+        ("GET", "/templates", {"headers": {"Accept": "application/x-ndjson"}}, 200),
+    ]
+
+    async def soak():
+        limit = asyncio.Semaphore(50)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            assert (await client.post("/clients", json={"name": "Soak", "email": "soak@example.com"})).status_code == 200
+
+            async def fire(n):
+                method, url, kwargs, expected = requests[n % len(requests)]
+                async with limit:
+                    response = await client.request(method, url, **kwargs)
+                assert response.status_code == expected, (url, response.text)
+
+            await asyncio.gather(*(fire(n) for n in range(SOAK_REQUESTS)))
+
+    asyncio.run(soak())
+
+    for stats in pools:
+        assert stats["opened"] <= POOL_SIZE
+        assert stats["peak"] <= POOL_SIZE
+        assert stats["now"] == 0
+    assert pools[1]["opened"] > 0, "the request sessions never used the pooled engine"
@@ -0,0 +1,109 @@
+# coding: utf-8
+
+import smtplib
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.pool import StaticPool
+
+from database import Base, ClientModel, EmailDeliveryModel, EmailLogModel, SendJobModel
+from openapi_server.impl import send_worker
+from openapi_server.impl.send_worker import get_send_worker_pool
+
+
+class RefusingPool:
+    """Accepts every message except the ones addressed to ``refused``."""
+
+    def __init__(self, refused):
+        self.refused = refused
+
+    def send_messages(self, messages):
+        return [
+            smtplib.SMTPRecipientsRefused({msg["To"]: (550, b"no such user")}) if msg["To"] == self.refused else None
+            for msg in messages
+        ]
+
+
+def test_each_recipient_outcome_is_recorded(db_session, monkeypatch):
+    db_session.add_all([
+        ClientModel(id="ok-1", name="Ok", email="ok1@example.com"),
+        ClientModel(id="ok-2", name="Ok", email="ok2@example.com"),
+        ClientModel(id="bounce", name="Bounce", email="bounce@example.com"),
+        ClientModel(id="no-email", name="Nobody", email=None),
+    ])
+    job = SendJobModel(id="job-1", status="running", subject="Hi", body="Hello",
+                       recipient_ids="ok-1,bounce,no-email,gone,ok-2", total_count=5,
+                       sent_count=0, failed_count=0)
+    db_session.add(job)
+    db_session.commit()
+    monkeypatch.setenv("GMAIL_USER", "me@example.com")
+    monkeypatch.setenv("GMAIL_PASSWORD", "secret")
+    monkeypatch.setattr("openapi_server.impl.smtp_pool.get_smtp_pool",
+                        lambda *a: RefusingPool("bounce@example.com"))
+
+    send_worker.deliver_send_job(db_session, job, chunk_size=2)
+
+    log = db_session.query(EmailLogModel).one()
+    deliveries = {d.client_id: d for d in db_session.query(EmailDeliveryModel).filter_by(log_id=log.id)}
+    assert {cid: d.status for cid, d in deliveries.items()} == {
+        "ok-1": "sent", "ok-2": "sent", "bounce": "failed", "no-email": "failed", "gone": "failed",
+    }
+    assert "no such user" in deliveries["bounce"].error
+    assert deliveries["gone"].error == "Client not found"
+    assert (deliveries["ok-1"].attempts, deliveries["no-email"].attempts) == (1, 0)
+    assert deliveries["ok-1"].sent_at is not None and deliveries["bounce"].sent_at is None
+    assert (job.sent_count, job.failed_count) == (2, 3)
+
+
+def test_client_history_is_an_index_lookup(db_session):
+    stmt = select(EmailDeliveryModel.log_id).where(EmailDeliveryModel.client_id == "c")
+    sql = stmt.compile(db_session.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    assert "ix_email_deliveries_client_log" in " ".join(row[-1] for row in plan)
+
+
+def test_history_by_client_and_deliveries(client: TestClient, monkeypatch):
+    monkeypatch.delenv("GMAIL_USER", raising=False)
+    monkeypatch.delenv("GMAIL_PASSWORD", raising=False)
+    monkeypatch.delenv("SENDER_ACCOUNTS", raising=False)
+    ids = []
+    for n in range(2):
+        created = client.post("/clients", json={"name": "History", "email": f"h{n}@example.com"})
+        ids.append(created.json()["id"])
+
+    for recipients in (ids, ids[:1]):
+        assert client.post("/email/send", json={"recipient_ids": recipients, "subject": "S", "body": "B"}).status_code == 202
+    get_send_worker_pool().join()
+
+    first = client.get("/email/history", params={"client_id": ids[0]}).json()
+    second = client.get("/email/history", params={"client_id": ids[1]}).json()
+    assert len(first) == 2 and len(second) == 1
+    assert client.get(f"/email/history/{second[0]['id']}").json()["recipients"] == ids
+
+    deliveries = client.get(f"/email/history/{second[0]['id']}/deliveries", params={"limit": 1})
+    assert [d["client_id"] for d in deliveries.json()] == ids[:1]
+    assert deliveries.json()[0]["status"] == "sent_mock"
+    rest = client.get(f"/email/history/{second[0]['id']}/deliveries",
+                      params={"cursor": deliveries.headers["X-Next-Cursor"]}).json()
+    assert [d["client_id"] for d in rest] == ids[1:]
+    assert client.get(f"/email/history/{second[0]['id']}/deliveries", params={"status": "failed"}).json() == []
+
+
+def test_legacy_recipients_are_backfilled():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    legacy = [t for t in Base.metadata.sorted_tables if t.name != "email_deliveries"]
+    Base.metadata.create_all(bind=engine, tables=legacy)
+    with engine.begin() as conn:
+        conn.execute(EmailLogModel.__table__.insert(), [
+            {"id": "old", "timestamp": datetime(2024, 1, 1), "recipient_count": 2, "subject": "s",
+             "body": "b", "status": "sent", "recipients": "a,b"},
+        ])
+
+    Base.metadata.create_all(bind=engine)
+
+    with engine.connect() as conn:
+        rows = conn.execute(select(EmailDeliveryModel.log_id, EmailDeliveryModel.client_id,
+                                   EmailDeliveryModel.status)).all()
+    engine.dispose()
+    assert sorted(rows) == [("old", "a", "sent"), ("old", "b", "sent")]
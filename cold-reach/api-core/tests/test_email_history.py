@@ -0,0 +1,103 @@
+# coding: utf-8
+
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select, text
+
+from database import AsyncSessionLocal, ClientModel, EmailDeliveryModel, EmailLogModel, SendJobModel, SessionLocal
+from openapi_server.impl import send_worker
+from openapi_server.impl.default_api_impl import DefaultApiImpl
+from openapi_server.impl.pagination import NEXT_CURSOR_HEADER
+
+
+@pytest.fixture
+def logs(tmp_database):
+    """Five logs, an hour apart."""
+    start = datetime(2024, 3, 1, 9, 0)
+    rows = [
+        EmailLogModel(id=f"log-{n}", timestamp=start + timedelta(hours=n), recipient_count=1,
+                      subject=f"Subject {n}", body="x" * 10000, status="failed" if n == 3 else "sent")
+        for n in range(5)
+    ]
+    with SessionLocal() as db:
+        db.add_all(rows)
+        db.add(EmailDeliveryModel(log_id=rows[0].id, client_id="c-1", status="sent", attempts=1))
+        db.commit()
+    return start, [f"log-{n}" for n in range(5)]
+
+
+def test_history_lists_summaries_without_bodies(client: TestClient, logs):
+    start, ids = logs
+    statements = []
+    engine = AsyncSessionLocal.kw["bind"].sync_engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        page = client.get("/email/history").json()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert [log["id"] for log in page] == ids[::-1]
+    assert all(log["body"] is None and log["recipients"] is None for log in page)
+    assert not any("email_logs.body" in statement for statement in statements)
+
+    detail = client.get(f"/email/history/{ids[0]}").json()
+    assert detail["body"] == "x" * 10000
+    assert detail["recipients"] == ["c-1"]
+    assert client.get("/email/history/missing").status_code == 404
+
+
+def test_history_filters_by_date_and_status(client: TestClient, logs):
+    start, ids = logs
+    window = {"since": (start + timedelta(hours=1)).isoformat(), "until": (start + timedelta(hours=4)).isoformat()}
+
+    first = client.get("/email/history", params={**window, "limit": 2})
+    rest = client.get("/email/history", params={**window, "cursor": first.headers[NEXT_CURSOR_HEADER]})
+    assert [log["id"] for log in first.json() + rest.json()] == [ids[3], ids[2], ids[1]]
+
+    failed = client.get("/email/history", params={**window, "status": "failed"}).json()
+    assert [log["id"] for log in failed] == [ids[3]]
+
+    # Offsets are converted to the UTC the timestamps are stored in
+    shifted = {"since": (start + timedelta(hours=3)).isoformat() + "+02:00", "until": window["until"]}
+    assert [log["id"] for log in client.get("/email/history", params=shifted).json()] == [ids[3], ids[2], ids[1]]
+
+
+def test_sends_are_logged_in_utc_whatever_the_server_zone(db_session, monkeypatch):
+    for name in ("GMAIL_USER", "GMAIL_PASSWORD", "SENDER_ACCOUNTS"):
+        monkeypatch.delenv(name, raising=False)
+    db_session.add(ClientModel(id="a", name="A", email="a@example.com", status="not_contacted"))
+    job = SendJobModel(id="j", status="queued", subject="Hi", body="Hello", recipient_ids="a",
+                       total_count=1, sent_count=0, failed_count=0)
+    db_session.add(job)
+    db_session.commit()
+
+    # A server seven hours behind UTC
+    zone = os.environ.get("TZ")
+    os.environ["TZ"] = "XYZ+07"
+    time.tzset()
+    try:
+        send_worker.deliver_send_job(db_session, job)
+    finally:
+        if zone is None:
+            del os.environ["TZ"]
+        else:
+            os.environ["TZ"] = zone
+        time.tzset()
+
+    # A minute ago, as a client at UTC-07:00 would ask for it
+    since = DefaultApiImpl._naive_utc(datetime.now(timezone(timedelta(hours=-7))) - timedelta(minutes=1))
+    assert db_session.scalars(select(EmailLogModel.id).where(EmailLogModel.timestamp >= since)).all()
+    assert db_session.scalar(select(EmailDeliveryModel.sent_at)) >= since
+
+
+def test_date_range_seeks_the_timestamp_index(db_session):
+    stmt = (select(EmailLogModel.id).where(EmailLogModel.timestamp >= datetime(2026, 1, 1))
+            .order_by(EmailLogModel.timestamp.desc()))
+    sql = stmt.compile(db_session.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    assert "ix_email_logs_timestamp" in " ".join(row[-1] for row in plan)
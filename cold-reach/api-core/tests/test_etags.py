@@ -0,0 +1,90 @@
+# coding: utf-8
+
+import gzip
+import json
+
+import brotli
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from database import AsyncSessionLocal
+from openapi_server.impl.pagination import NDJSON
+
+
+class Statements(list):
+    """SQL run by request handlers while the block is active."""
+
+    def __enter__(self):
+        self.engine = AsyncSessionLocal.kw["bind"].sync_engine
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, *args):
+        self.append(statement)
+
+
+def test_unchanged_list_is_a_304_without_row_queries(client: TestClient):
+    assert client.post("/templates", json={"name": "First", "subject": "s", "body": "b"}).status_code == 200
+    first = client.get("/templates", params={"limit": 5})
+    etag = first.headers["ETag"]
+
+    with Statements() as statements:
+        cached = client.get("/templates", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+    assert statements and not any("FROM templates" in s for s in statements)
+
+    # Another page of the same table is a different representation
+    assert client.get("/templates", params={"limit": 6}, headers={"If-None-Match": etag}).status_code == 200
+
+    created = client.post("/templates", json={"name": "Second", "subject": "s", "body": "b"})
+    after_write = client.get("/templates", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert after_write.status_code == 200
+    assert after_write.headers["ETag"] != etag
+
+    etag = after_write.headers["ETag"]
+    client.delete(f"/templates/{created.json()['id']}")
+    assert client.get("/templates", params={"limit": 5}, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_writes_bump_only_the_tables_they_change(client: TestClient):
+    tags = {path: client.get(path).headers["ETag"] for path in ("/clients", "/tasks", "/templates", "/attachments")}
+
+    client.post("/clients", json={"name": "Etag", "email": "etag@example.com"})
+
+    changed = {path for path, tag in tags.items()
+               if client.get(path, headers={"If-None-Match": tag}).status_code == 200}
+    assert changed == {"/clients", "/tasks"}
+
+
+def test_large_responses_are_compressed(client: TestClient):
+    for n in range(20):
+        client.post("/templates", json={"name": f"zip-{n}", "subject": "s" * 50, "body": "b" * 200})
+
+    page = {"limit": 20}
+    plain = client.get("/templates", params=page, headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+
+    for coding, decompress in (("br", brotli.decompress), ("gzip", gzip.decompress)):
+        with client.stream("GET", "/templates", params=page, headers={"Accept-Encoding": coding}) as response:
+            raw = b"".join(response.iter_raw())
+        assert response.headers["Content-Encoding"] == coding
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert len(raw) < len(plain.content)
+        assert json.loads(decompress(raw)) == plain.json()
+        # Same version, different bytes: a weak tag that still revalidates
+        assert response.headers["ETag"] == f"W/{plain.headers['ETag']}"
+        revalidated = client.get("/templates", params=page, headers={
+            "Accept-Encoding": coding, "If-None-Match": response.headers["ETag"]})
+        assert revalidated.status_code == 304
+
+    streamed = client.get("/templates", params=page, headers={"Accept": NDJSON, "Accept-Encoding": "gzip"})
+    assert streamed.headers["Content-Encoding"] == "gzip"
+    assert len(streamed.text.splitlines()) == len(plain.json())
+
+    small = client.get("/templates", params={"limit": 1}, headers={"Accept-Encoding": "br, gzip"})
+    assert "Content-Encoding" not in small.headers
@@ -0,0 +1,128 @@
+# coding: utf-8
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from database import ClientModel, SessionLocal
+from openapi_server.impl import client_import
+
+
+class SheetExport(BaseHTTPRequestHandler):
+    """Stands in for docs.google.com: /spreadsheets/d/<id>/export serves ``sheets[id]``."""
+
+    sheets = {}
+
+    def do_GET(self):
+        sheet_id = self.path.split("/")[3]
+        status, content_type, body = self.sheets.get(sheet_id, (404, "text/plain", [b"Not found"]))
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.end_headers()
+        for block in body:
+            self.wfile.write(block)
+
+    def log_message(self, *args):
+        pass
+
+
+def csv_rows(prefix, rows, block_rows=1000):
+    """The export, generated a block at a time so the stand-in holds no large body."""
+    yield b"Name,Email,Company\r\n"
+    for start in range(0, rows, block_rows):
+        yield "".join(
+            f"Client {n},{prefix}{n}@example.com,\"Company, {n % 100}\"\r\n"
+            for n in range(start, min(start + block_rows, rows))
+        ).encode()
+
+
+def stalled():
+    yield b"Name,Email\r\n"
+    time.sleep(1)
+
+
+@pytest.fixture
+def sheets(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SheetExport)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(client_import, "GOOGLE_SHEETS_URL", f"http://127.0.0.1:{server.server_port}")
+    SheetExport.sheets = {}
+    try:
+        yield SheetExport.sheets
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _link(sheet_id):
+    return f"https://docs.google.com/spreadsheets/d/{sheet_id}/edit#gid=0"
+
+
+def test_export_url_keeps_the_tab():
+    assert client_import.sheet_export_url("https://docs.google.com/spreadsheets/d/abc_1-2/edit#gid=77") == \
+        f"{client_import.GOOGLE_SHEETS_URL}/spreadsheets/d/abc_1-2/export?format=csv&gid=77"
+    with pytest.raises(HTTPException) as error:
+        client_import.sheet_export_url("https://example.com/clients.csv")
+    assert error.value.status_code == 422
+
+
+def test_sheet_goes_through_the_import_pipeline(client: TestClient, sheets):
+    sheets["clients"] = (200, "text/csv", [
+        b"\xef\xbb\xbfName,EMAIL,Company\r\n",
+        b"Ann,ann@example.com,\"Acme, Inc\"\r\n",
+        b"Bob,ANN@example.com,\r\n",
+        b"Cat,not-an-email,Cats\r\n",
+        b",,\r\n",
+        b"Dan,dan@example.com\r\n",
+    ])
+
+    response = client.post("/clients/import/google-sheet", json={"url": _link("clients")})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["count"] == 2
+    assert [(c["name"], c["company"]) for c in body["clients"]] == [("Ann", "Acme, Inc"), ("Dan", None)]
+    assert [(r["row"], r["reason"]) for r in body["rejected"]] == [(3, "duplicate_in_file"), (4, "invalid_email")]
+
+    again = client.post("/clients/import/google-sheet", json={"url": _link("clients")})
+    assert again.status_code == 409
+    skipped = client.post("/clients/import/google-sheet", params={"skip_duplicates": "true"},
+                          json={"url": _link("clients")}).json()
+    assert skipped["count"] == 0 and skipped["rejectedCount"] == 4
+
+
+def test_unusable_sheets_are_refused(client: TestClient, sheets, monkeypatch):
+    sheets["private"] = (200, "text/html; charset=utf-8", [b"<html>Sign in</html>"])
+    sheets["big"] = (200, "text/csv", list(csv_rows("c", 11)))
+    sheets["stalled"] = (200, "text/csv", stalled())
+    monkeypatch.setattr(client_import, "IMPORT_MAX_ROWS", 10)
+    monkeypatch.setattr(client_import, "SHEET_READ_TIMEOUT", 0.2)
+
+    def status(sheet_id, **params):
+        return client.post("/clients/import/google-sheet", params=params, json={"url": _link(sheet_id)}).status_code
+
+    assert status("private") == 422
+    assert status("missing") == 422
+    assert status("stalled") == 504
+    assert status("big") == 413
+    # Without the duplicate pass the limit is still met on the one read of the sheet
+    reads = []
+    read_csv = client_import.iter_csv_chunks
+    monkeypatch.setattr(client_import, "iter_csv_chunks", lambda path: reads.append(path) or read_csv(path))
+    assert status("big", skip_duplicates="true") == 413
+    assert len(reads) == 1
+    with SessionLocal() as db:
+        assert db.query(ClientModel).count() == 0
+    assert client.post("/clients/import/google-sheet", json={"url": "https://example.com/x.csv"}).status_code == 422
+
+
+def test_peak_memory_does_not_grow_with_sheet_size(import_memory, sheets):
+    def sheet(rows, workdir):
+        sheets[f"rows{rows}"] = (200, "text/csv", csv_rows("c", rows))
+        return f"import_google_sheet(db, {_link(f'rows{rows}')!r}, True, sample_size=0)"
+
+    import_memory(sheet, env={"GOOGLE_SHEETS_URL": client_import.GOOGLE_SHEETS_URL})
@@ -0,0 +1,91 @@
+# coding: utf-8
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from database import AsyncSessionLocal, SessionLocal, TemplateModel
+from openapi_server.impl.etags import bump_versions
+from openapi_server.impl.lookup_cache import MISSING, LookupCache, lookup_cache
+from openapi_server.impl.template_engine import resolve_template
+
+
+def test_lru_ttl_and_versions(monkeypatch):
+    cache = LookupCache(max_entries=2, ttl=60)
+    cache.put("t", "a", 1, "A")
+    cache.put("t", "b", 1, "B")
+    assert cache.get("t", "a", 1) == "A"
+    cache.put("t", "c", 1, "C")  # evicts b, the least recently used
+    assert cache.get("t", "b", 1) is MISSING
+    # Another version of the table makes the entry stale
+    assert cache.get("t", "a", 2) is MISSING
+    assert cache.get("t", "a", 1) is MISSING
+
+    cache.put("t", "d", 1, "D")
+    monkeypatch.setattr("time.monotonic", lambda: float("inf"))
+    assert cache.get("t", "d", 1) is MISSING
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stale"], stats["evictions"]) == (1, 4, 2, 1)
+
+    off = LookupCache(enabled=False)
+    off.put("t", "a", 1, "A")
+    assert off.get("t", "a", 1) is MISSING
+
+
+def _template_queries(fn):
+    statements = []
+    engine = AsyncSessionLocal.kw["bind"].sync_engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return result, [s for s in statements if "FROM templates" in s]
+
+
+def test_template_pages_are_cached_until_a_write(client: TestClient):
+    client.post("/templates", json={"name": "cache", "subject": "s", "body": "b"})
+
+    first, queries = _template_queries(lambda: client.get("/templates", params={"limit": 1000}).json())
+    assert queries
+    before = client.get("/cache/stats").json()
+    second, queries = _template_queries(lambda: client.get("/templates", params={"limit": 1000}).json())
+    assert second == first and not queries
+    assert client.get("/cache/stats").json()["hits"] == before["hits"] + 1
+
+    created = client.post("/templates", json={"name": "cache-2", "subject": "s", "body": "b"}).json()
+    names = [t["name"] for t in client.get("/templates", params={"limit": 1000}).json()]
+    assert sorted(names) == ["cache", "cache-2"]
+
+    client.put(f"/templates/{created['id']}", json={"name": "cache-3", "subject": "s", "body": "b"})
+    names = [t["name"] for t in client.get("/templates", params={"limit": 1000}).json()]
+    assert sorted(names) == ["cache", "cache-3"]
+
+
+def test_writes_by_other_workers_are_seen(client: TestClient):
+    client.get("/templates", params={"limit": 1000})
+    # Another process: it bumps the version but cannot invalidate this one's cache
+    with SessionLocal() as db:
+        db.add(TemplateModel(id="other", name="other-worker", subject="s", body="b"))
+        bump_versions(db, "templates")
+        db.commit()
+
+    assert [t["id"] for t in client.get("/templates", params={"limit": 1000}).json()] == ["other"]
+
+
+def test_send_jobs_read_templates_through_the_cache(db_session):
+    lookup_cache.clear()
+    db_session.add(TemplateModel(id="t-1", name="T", subject="Hi {name}", body="Old body"))
+    db_session.commit()
+
+    assert resolve_template(db_session, "t-1", "", "").body.source == "Old body"
+    db_session.query(TemplateModel).update({TemplateModel.body: "New body"})
+    db_session.commit()
+    # Unversioned change: still served from the cache
+    assert resolve_template(db_session, "t-1", "", "").body.source == "Old body"
+
+    bump_versions(db_session, "templates")
+    db_session.commit()
+    assert resolve_template(db_session, "t-1", "", "").body.source == "New body"
+    assert lookup_cache.stats()["hits"] == 1
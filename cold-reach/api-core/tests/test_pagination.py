@@ -0,0 +1,67 @@
+# coding: utf-8
+
+import json
+
+from fastapi.testclient import TestClient
+
+from openapi_server.impl.pagination import NDJSON, NEXT_CURSOR_HEADER
+
+
+def _create_templates(client: TestClient, prefix: str, count: int):
+    for n in range(count):
+        response = client.post(
+            "/templates", json={"name": f"{prefix}-{n:02d}", "subject": "s", "body": "b"}
+        )
+        assert response.status_code == 200
+
+
+def test_cursor_pages_cover_every_row_once(client: TestClient):
+    _create_templates(client, "page", 7)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/templates", params=params)
+        assert response.status_code == 200
+        assert len(response.json()) <= 3
+        seen += [t["name"] for t in response.json()]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+
+    assert seen == [f"page-{n:02d}" for n in range(7)]
+
+
+def test_ndjson_streams_all_rows(client: TestClient):
+    _create_templates(client, "stream", 4)
+
+    response = client.get("/templates", headers={"Accept": NDJSON})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(NDJSON)
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["name"] for r in rows] == [f"stream-{n:02d}" for n in range(4)]
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_search_results_paginate_by_relevance(client: TestClient):
+    for n in range(5):
+        client.post("/clients", json={"name": "Pager", "email": f"p{n}@example.com"})
+    client.post("/clients", json={"name": "Other", "email": "other@example.com"})
+
+    first = client.get("/clients", params={"search": "pager", "limit": 2})
+    second = client.get(
+        "/clients",
+        params={"search": "pager", "limit": 10, "cursor": first.headers[NEXT_CURSOR_HEADER]},
+    )
+
+    ids = [c["id"] for c in first.json() + second.json()]
+    assert len(ids) == len(set(ids)) == 5
+
+
+def test_invalid_cursor_is_rejected(client: TestClient):
+    response = client.get("/tasks", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
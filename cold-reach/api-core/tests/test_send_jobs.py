@@ -0,0 +1,45 @@
+# coding: utf-8
+
+from fastapi.testclient import TestClient
+
+from openapi_server.impl.send_worker import get_send_worker_pool
+
+
+def _create_client(client: TestClient, email: str) -> str:
+    response = client.post(
+        "/clients",
+        json={"name": "Job Tester", "email": email},
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_send_email_returns_202_and_job_drains(client: TestClient, monkeypatch):
+    monkeypatch.delenv("GMAIL_USER", raising=False)
+    monkeypatch.delenv("GMAIL_PASSWORD", raising=False)
+    recipient_ids = [_create_client(client, "job1@example.com"), _create_client(client, "job2@example.com")]
+
+    response = client.post(
+        "/email/send",
+        json={"recipient_ids": recipient_ids, "subject": "Hi {name}", "body": "Hello"},
+    )
+
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "queued"
+    assert job["total"] == 2
+    assert job["pending"] == 2
+
+    get_send_worker_pool().join()
+
+    job = client.get(f"/email/jobs/{job['id']}").json()
+    assert job["status"] == "completed"
+    assert job["sent"] == 2
+    assert job["failed"] == 0
+    assert job["pending"] == 0
+
+
+def test_get_unknown_send_job(client: TestClient):
+    response = client.get("/email/jobs/does-not-exist")
+
+    assert response.status_code == 404
@@ -0,0 +1,88 @@
+# coding: utf-8
+
+import math
+
+import pytest
+from sqlalchemy import event
+
+from database import ClientModel, SendJobModel
+from openapi_server.impl import send_worker
+
+RECIPIENTS = 230
+CHUNK = 50
+
+
+class FakePool:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, msg):
+        self.sent.append(msg["To"])
+
+    def send_messages(self, messages):
+        for msg in messages:
+            self.send_message(msg)
+        return [None] * len(messages)
+
+
+@pytest.fixture
+def job(db_session):
+    ids = [f"client-{n}" for n in range(RECIPIENTS)]
+    db_session.add_all(
+        ClientModel(id=cid, name=f"Client {n}", email=f"c{n}@example.com")
+        for n, cid in enumerate(ids)
+    )
+    db_job = SendJobModel(
+        id="job-1", status="running", subject="Hi {name}", body="Hello {company|there}",
+        recipient_ids=",".join(ids + ["missing-1", "missing-2"]),
+        total_count=RECIPIENTS + 2, sent_count=0, failed_count=0,
+    )
+    db_session.add(db_job)
+    db_session.commit()
+    return db_job
+
+
+def _count_statements(db_session):
+    counts = {"SELECT": 0, "UPDATE": 0}
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        verb = statement.lstrip().split(" ", 1)[0].upper()
+        if verb in counts and ("FROM clients" in statement or "UPDATE clients" in statement):
+            counts[verb] += 1
+
+    event.listen(db_session.get_bind(), "before_cursor_execute", before_cursor_execute)
+    return counts
+
+
+def test_smtp_path_queries_scale_with_chunks(db_session, job, monkeypatch):
+    pool = FakePool()
+    monkeypatch.setenv("GMAIL_USER", "me@example.com")
+    monkeypatch.setenv("GMAIL_PASSWORD", "secret")
+    monkeypatch.setattr("openapi_server.impl.smtp_pool.get_smtp_pool", lambda *a: pool)
+    counts = _count_statements(db_session)
+
+    send_worker.deliver_send_job(db_session, job, chunk_size=CHUNK)
+
+    chunks = math.ceil((RECIPIENTS + 2) / CHUNK)
+    assert counts["SELECT"] == chunks
+    assert counts["UPDATE"] == chunks
+    assert len(pool.sent) == RECIPIENTS
+    assert (job.status, job.sent_count, job.failed_count) == ("completed", RECIPIENTS, 2)
+    emailed = db_session.query(ClientModel).filter(ClientModel.status == "emailed").count()
+    assert emailed == RECIPIENTS
+
+
+def test_mock_path_uses_bulk_updates(db_session, job, monkeypatch):
+    monkeypatch.delenv("GMAIL_USER", raising=False)
+    monkeypatch.delenv("GMAIL_PASSWORD", raising=False)
+    counts = _count_statements(db_session)
+
+    send_worker.deliver_send_job(db_session, job, chunk_size=CHUNK)
+
+    chunks = math.ceil((RECIPIENTS + 2) / CHUNK)
+    assert counts["SELECT"] == chunks
+    assert counts["UPDATE"] == chunks
+    # Ids that are no longer clients fail, as on the SMTP path
+    assert (job.status, job.sent_count, job.failed_count) == ("completed", RECIPIENTS, 2)
+    emailed = db_session.query(ClientModel).filter(ClientModel.status == "emailed").count()
+    assert emailed == RECIPIENTS
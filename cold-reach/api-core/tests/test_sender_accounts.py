@@ -0,0 +1,137 @@
+# coding: utf-8
+
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, ClientModel, SendJobModel, SenderQuotaModel, make_engine
+from openapi_server.impl import send_worker, smtp_pool
+from openapi_server.impl.sender_accounts import SenderAccount, allocate, release, reserve, throttle
+from smtp_sink import SMTPSink
+
+NOW = datetime(2026, 10, 18, 9, 30)
+
+
+def _account(name, hourly=0, daily=0, port=587):
+    return SenderAccount(f"{name}@example.com", "secret", "127.0.0.1", port, hourly, daily)
+
+
+def test_allocate_shards_within_quota(db_session):
+    small, large, hourly = _account("small", daily=2), _account("large", daily=100), _account("hourly", hourly=5)
+
+    grants = allocate(db_session, [small, large, hourly], 12, now=NOW)
+    assert grants == {small: 2, large: 5, hourly: 5}
+
+    # The small and hourly accounts are spent; the rest goes to the large one
+    assert allocate(db_session, [small, large, hourly], 10, now=NOW) == {large: 10}
+    # A new hour refills the hourly quota but not the daily one
+    assert allocate(db_session, [small, hourly], 10, now=NOW + timedelta(hours=1)) == {hourly: 5}
+    assert allocate(db_session, [small], 1, now=NOW + timedelta(days=1)) == {small: 1}
+
+
+def test_reservations_are_shared_across_workers(tmp_path):
+    """Threads with their own sessions never grant more than the quota between them."""
+    engine = make_engine(f"sqlite:///{tmp_path}/quota.db")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    account = _account("shared", daily=500)
+    granted = []
+
+    def worker():
+        db = Session()
+        try:
+            while True:
+                n = reserve(db, account, 7, now=NOW)
+                if not n:
+                    return
+                granted.append(n)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    assert sum(granted) == 500
+
+
+def test_quota_changes_leave_the_callers_transaction_alone(db_session, campaign):
+    """The worker's pending chunk is neither committed nor lost by a reservation."""
+    account = _account("own", daily=10)
+    campaign.failed_count = 5
+
+    assert reserve(db_session, account, 3, now=NOW) == 3
+    release(db_session, account, 1, now=NOW)
+    throttle(db_session, account, now=NOW)
+    assert campaign.failed_count == 5
+    db_session.rollback()
+
+    assert campaign.failed_count == 0
+    quota = db_session.query(SenderQuotaModel).filter_by(account=account.key).one()
+    assert (quota.day_sent, quota.throttled_until) == (2, NOW + timedelta(hours=1))
+
+
+@pytest.fixture
+def campaign(db_session):
+    ids = [f"client-{n}" for n in range(300)]
+    db_session.add_all(
+        ClientModel(id=cid, name=f"Client {n}", email=f"c{n}@example.com") for n, cid in enumerate(ids)
+    )
+    job = SendJobModel(id="job-1", status="running", subject="Hi {name}", body="Hello",
+                       recipient_ids=",".join(ids), total_count=len(ids), sent_count=0, failed_count=0)
+    db_session.add(job)
+    db_session.commit()
+    return job
+
+
+@pytest.fixture
+def sinks(monkeypatch):
+    servers = [SMTPSink(), SMTPSink(), SMTPSink(throttle_after=20)]
+    monkeypatch.setattr(smtp_pool, "SMTP_STARTTLS", False)
+    try:
+        yield servers
+    finally:
+        smtp_pool.close_smtp_pools()
+        for server in servers:
+            server.close()
+
+
+def _configure(monkeypatch, sinks, daily_limits):
+    monkeypatch.setenv("SENDER_ACCOUNTS", json.dumps([
+        {"user": f"sender{n}@example.com", "password": "secret", "host": "127.0.0.1",
+         "port": sink.port, "daily_limit": limit}
+        for n, (sink, limit) in enumerate(zip(sinks, daily_limits))
+    ]))
+
+
+def test_campaign_is_sharded_and_rebalanced(db_session, campaign, sinks, monkeypatch):
+    _configure(monkeypatch, sinks, [1000, 100, 1000])
+
+    send_worker.deliver_send_job(db_session, campaign, chunk_size=100)
+
+    delivered = [sink.messages.value for sink in sinks]
+    assert (campaign.status, campaign.sent_count, campaign.failed_count) == ("completed", 300, 0)
+    assert sum(delivered) == 300
+    assert delivered[1] == 100  # capped by its daily quota
+    # Throttled, then taken out of rotation; messages already in flight still land
+    assert 20 <= delivered[2] <= 20 + smtp_pool.SMTP_POOL_SIZE
+    quotas = {q.account.split("@")[0]: q for q in db_session.query(SenderQuotaModel)}
+    assert quotas["sender2"].throttled_until is not None
+    assert [quotas[f"sender{n}"].day_sent for n in range(3)] == delivered
+
+
+def test_campaign_stops_when_quota_runs_out(db_session, campaign, sinks, monkeypatch):
+    _configure(monkeypatch, sinks[:2], [50, 60])
+
+    send_worker.deliver_send_job(db_session, campaign, chunk_size=100)
+
+    assert campaign.status == "failed"
+    assert "quota" in campaign.error
+    assert campaign.sent_count == 110
+    assert sum(sink.messages.value for sink in sinks[:2]) == 110
@@ -0,0 +1,170 @@
+# coding: utf-8
+
+import json
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, select, text
+from sqlalchemy.orm import sessionmaker
+
+from database import CampaignModel, ClientModel, EmailLogModel, ScheduledSendModel, SendJobModel, TemplateModel
+from openapi_server.impl import send_worker
+from openapi_server.impl.etags import bump_versions
+from openapi_server.impl.sequence_scheduler import (
+    enroll, get_sequence_scheduler, next_due, run_due, tick,
+)
+
+NOW = datetime(2024, 3, 1, 9, 0)
+
+
+def _campaign(db, *delays):
+    for n in range(len(delays)):
+        db.add(TemplateModel(id=f"t{n}", name=f"Step {n}", subject=f"Step {n} for {{name}}", body="Hi {name}"))
+    campaign = CampaignModel(id="c", name="Follow-up", created_at=NOW, steps=json.dumps([
+        {"template_id": f"t{n}", "delay_minutes": delay} for n, delay in enumerate(delays)
+    ]))
+    db.add(campaign)
+    db.commit()
+    return campaign
+
+
+def test_steps_are_sent_in_order_until_the_client_replies(db_session, monkeypatch):
+    db_session.add_all([
+        ClientModel(id="a", name="A", email="a@example.com", status="not_contacted"),
+        ClientModel(id="b", name="B", email="b@example.com", status="emailed"),
+        ClientModel(id="closed", name="C", email="c@example.com", status="closed"),
+    ])
+    campaign = _campaign(db_session, 0, 60, 60)
+
+    assert enroll(db_session, campaign, ["a", "b", "closed", "unknown", "a"], now=NOW) == 2
+    assert enroll(db_session, campaign, ["a"], now=NOW) == 0
+    db_session.commit()
+
+    first = run_due(db_session, NOW)
+    assert first.claimed == 2 and len(first.job_ids) == 1
+    job = db_session.get(SendJobModel, first.job_ids[0])
+    assert (job.status, job.template_id, job.recipient_ids) == ("queued", "t0", "a,b")
+    assert next_due(db_session) == NOW + timedelta(minutes=60)
+
+    # Nothing is due in between, and the template fills in the job's text
+    assert run_due(db_session, NOW + timedelta(minutes=30)).claimed == 0
+    monkeypatch.delenv("GMAIL_USER", raising=False)
+    monkeypatch.delenv("GMAIL_PASSWORD", raising=False)
+    monkeypatch.delenv("SENDER_ACCOUNTS", raising=False)
+    send_worker.deliver_send_job(db_session, job)
+    assert db_session.query(EmailLogModel).one().subject == "Step 0 for {name}"
+
+    db_session.query(ClientModel).filter_by(id="b").update({"status": "replied"})
+    db_session.commit()
+    second = run_due(db_session, NOW + timedelta(minutes=61))
+    assert second.claimed == 2
+    assert db_session.get(SendJobModel, second.job_ids[0]).recipient_ids == "a"
+
+    third = run_due(db_session, NOW + timedelta(minutes=125))
+    assert db_session.get(SendJobModel, third.job_ids[0]).template_id == "t2"
+    states = dict(db_session.execute(select(ScheduledSendModel.client_id, ScheduledSendModel.status)).all())
+    assert states == {"a": "completed", "b": "stopped"}
+    assert next_due(db_session) is None
+
+
+def test_a_step_whose_template_is_gone_fails_instead_of_sending_blank_mail(db_session, monkeypatch):
+    db_session.add(ClientModel(id="a", name="A", email="a@example.com", status="not_contacted"))
+    campaign = _campaign(db_session, 0)
+    enroll(db_session, campaign, ["a"], now=NOW)
+    db_session.query(TemplateModel).filter_by(id="t0").delete()
+    bump_versions(db_session, "templates")
+    db_session.commit()
+    monkeypatch.delenv("GMAIL_USER", raising=False)
+    monkeypatch.delenv("GMAIL_PASSWORD", raising=False)
+    monkeypatch.delenv("SENDER_ACCOUNTS", raising=False)
+
+    job = db_session.get(SendJobModel, run_due(db_session, NOW).job_ids[0])
+    send_worker.deliver_send_job(db_session, job)
+
+    assert (job.status, job.error, job.sent_count, job.failed_count) == ("failed", "Template not found: t0", 0, 1)
+    assert db_session.query(EmailLogModel).count() == 0
+    assert db_session.get(ClientModel, "a").status == "not_contacted"
+
+
+def test_a_stale_due_list_claims_nothing(db_session):
+    db_session.add(ClientModel(id="a", name="A", email="a@example.com", status="not_contacted"))
+    campaign = _campaign(db_session, 0, 24 * 60)
+    enroll(db_session, campaign, ["a"], now=NOW)
+    db_session.commit()
+    other = sessionmaker(bind=db_session.get_bind())()
+
+    # This scheduler reads the due list, then another one sends step 0 before it claims
+    read = other.execute
+
+    def execute(statement, *args, **kwargs):
+        if getattr(execute, "raced", False):
+            return read(statement, *args, **kwargs)
+        execute.raced = True
+        due = read(statement, *args, **kwargs).freeze()
+        assert run_due(db_session, NOW).claimed == 1
+        return due()
+
+    other.execute = execute
+    assert run_due(other, NOW) == (0, [])
+    other.close()
+
+    row = db_session.execute(select(ScheduledSendModel.step, ScheduledSendModel.status)).one()
+    assert tuple(row) == (1, "pending")
+    assert db_session.query(SendJobModel).count() == 1
+
+
+def test_a_tick_reads_only_the_due_steps(db_session):
+    campaign = _campaign(db_session, 0)
+    db_session.execute(insert(ClientModel.__table__), [
+        {"id": f"c{n}", "name": "C", "email": f"c{n}@example.com", "status": "not_contacted"} for n in range(5)
+    ])
+    # Many enrollments far in the future, a few due now
+    db_session.execute(insert(ScheduledSendModel.__table__), [
+        {"campaign_id": campaign.id, "client_id": f"later{n}", "step": 0, "status": "pending",
+         "due_at": NOW + timedelta(days=1, seconds=n)}
+        for n in range(20000)
+    ] + [
+        {"campaign_id": campaign.id, "client_id": f"c{n}", "step": 0, "status": "pending", "due_at": NOW}
+        for n in range(5)
+    ])
+    db_session.commit()
+
+    submitted = []
+    wait = tick(db_session, submitted.append, now=NOW, batch_size=2)
+    assert len(submitted) == 3
+    assert sum(len(j.recipient_ids.split(",")) for j in db_session.query(SendJobModel)) == 5
+    assert 0 < wait <= 60
+
+    s = ScheduledSendModel
+    stmt = select(s.id).where(s.status == "pending", s.due_at <= NOW).order_by(s.due_at).limit(500)
+    sql = stmt.compile(db_session.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = " ".join(row[-1] for row in db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    assert "ix_scheduled_sends_due" in plan and "TEMP B-TREE" not in plan
+
+
+def test_campaign_api(client: TestClient):
+    template = client.post("/templates", json={
+        "name": "Nudge", "subject": "Hi", "body": "Any news?",
+    }).json()
+    assert client.post("/campaigns", json={"name": "Empty", "steps": []}).status_code == 400
+    missing = client.post("/campaigns", json={"name": "Bad", "steps": [{"template_id": "nope"}]})
+    assert (missing.status_code, missing.json()["detail"]) == (400, "Template not found: nope")
+
+    created = client.post("/campaigns", json={
+        "name": "Sequence",
+        "steps": [{"template_id": template["id"], "delay_minutes": 24 * 60}],
+    })
+    assert created.status_code == 201
+    campaign = created.json()
+    assert campaign["steps"] == [{"template_id": template["id"], "delay_minutes": 1440}]
+    assert [c["id"] for c in client.get("/campaigns").json()] == [campaign["id"]]
+
+    person = client.post("/clients", json={"name": "Seq", "email": "seq@example.com"}).json()
+    try:
+        enrolled = client.post(f"/campaigns/{campaign['id']}/enrollments",
+                               json={"client_ids": [person["id"], person["id"], "unknown"]})
+        assert enrolled.json() == {"enrolled": 1, "skipped": 1}
+        assert client.post("/campaigns/nope/enrollments", json={"client_ids": []}).status_code == 404
+        assert client.delete(f"/templates/{template['id']}").status_code == 409
+    finally:
+        get_sequence_scheduler().stop()
@@ -0,0 +1,189 @@
+# coding: utf-8
+
+import smtplib
+from email.message import EmailMessage
+
+import pytest
+
+from openapi_server.impl.smtp_pool import SMTPConnectionPool, get_ssl_context
+from smtp_sink import SMTPSink
+
+
+class FakeSMTP:
+    """Stands in for smtplib.SMTP and records what the pool did with it."""
+
+    instances = []
+    reject_login = False
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.noops = 0
+        self.closed = False
+        self.fail_next_send = None
+        self.noop_code = 250
+        FakeSMTP.instances.append(self)
+
+    def starttls(self, context=None):
+        assert context is get_ssl_context()
+
+    def login(self, user, password):
+        if FakeSMTP.reject_login:
+            raise smtplib.SMTPAuthenticationError(535, b"bad credentials")
+
+    def noop(self):
+        self.noops += 1
+        return self.noop_code, b"OK"
+
+    def send_message(self, msg):
+        if self.fail_next_send is not None:
+            exc, self.fail_next_send = self.fail_next_send, None
+            raise exc
+        if msg["To"] == "refused@example.com":
+            raise smtplib.SMTPRecipientsRefused({msg["To"]: (550, b"no such user")})
+        self.sent.append(msg)
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool():
+    FakeSMTP.instances = []
+    FakeSMTP.reject_login = False
+    return SMTPConnectionPool(
+        "smtp.test", 587, "user", "secret",
+        size=2, idle_timeout=60, max_messages=3, smtp_factory=FakeSMTP,
+    )
+
+
+def _message():
+    msg = EmailMessage()
+    msg["To"] = "someone@example.com"
+    msg.set_content("hello")
+    return msg
+
+
+def test_back_to_back_sends_reuse_one_session(pool):
+    for _ in range(3):
+        pool.send_message(_message())
+
+    assert len(FakeSMTP.instances) == 1
+    assert len(FakeSMTP.instances[0].sent) == 3
+
+
+def test_session_is_retired_after_message_cap(pool):
+    for _ in range(4):
+        pool.send_message(_message())
+
+    assert len(FakeSMTP.instances) == 2
+    assert FakeSMTP.instances[0].closed
+    assert len(FakeSMTP.instances[1].sent) == 1
+
+
+def test_reconnects_on_421(pool):
+    pool.send_message(_message())
+    FakeSMTP.instances[0].fail_next_send = smtplib.SMTPResponseException(421, b"closing")
+
+    pool.send_message(_message())
+
+    assert len(FakeSMTP.instances) == 2
+    assert FakeSMTP.instances[0].closed
+    assert len(FakeSMTP.instances[1].sent) == 1
+
+
+def test_message_errors_are_not_retried(pool):
+    pool.send_message(_message())
+    FakeSMTP.instances[0].fail_next_send = smtplib.SMTPRecipientsRefused({})
+
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        pool.send_message(_message())
+    assert len(FakeSMTP.instances) == 1
+
+
+def test_refused_messages_keep_the_session(pool):
+    refused = _message()
+    refused.replace_header("To", "refused@example.com")
+    pool.send_message(_message())
+
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        pool.send_message(refused)
+    FakeSMTP.instances[0].fail_next_send = smtplib.SMTPDataError(554, b"message rejected")
+    with pytest.raises(smtplib.SMTPDataError):
+        pool.send_message(_message())
+    pool.send_message(_message())
+
+    assert len(FakeSMTP.instances) == 1
+    assert not FakeSMTP.instances[0].closed
+    assert len(FakeSMTP.instances[0].sent) == 2
+
+
+def test_async_pool_keeps_the_session_after_a_refused_recipient():
+    pytest.importorskip("aiosmtplib")
+    from openapi_server.impl.async_smtp import AsyncSMTPConnectionPool
+
+    sink = SMTPSink()
+    pool = AsyncSMTPConnectionPool("127.0.0.1", sink.port, "user", "secret", size=1, starttls=False)
+    messages = [_message() for _ in range(3)]
+    messages[1].replace_header("To", "refused@example.com")
+    for msg in messages:
+        msg["From"] = "user@example.com"
+    try:
+        outcomes = pool.send_messages(messages)
+    finally:
+        pool.close()
+        sink.close()
+
+    assert [o is None for o in outcomes] == [True, False, True]
+    assert sink.messages.value == 2
+    assert sink.sessions.value == 1
+
+
+def test_idle_sessions_are_health_checked_and_expired(pool):
+    pool.send_message(_message())
+    conn = pool._idle[-1]
+
+    conn.last_used -= pool.health_check_after + 1
+    pool.send_message(_message())
+    assert FakeSMTP.instances[0].noops == 1
+    assert len(FakeSMTP.instances) == 1
+
+    conn.last_used -= pool.health_check_after + 1
+    FakeSMTP.instances[0].noop_code = 421
+    pool.send_message(_message())
+    assert len(FakeSMTP.instances) == 2
+
+    pool._idle[-1].last_used -= pool.idle_timeout + 1
+    pool.send_message(_message())
+    assert len(FakeSMTP.instances) == 3
+
+
+def test_send_messages_reports_each_outcome(pool):
+    messages = [_message() for _ in range(5)]
+    messages[2].replace_header("To", "refused@example.com")
+
+    outcomes = pool.send_messages(messages)
+
+    assert [o is None for o in outcomes] == [True, True, False, True, True]
+    assert isinstance(outcomes[2], smtplib.SMTPRecipientsRefused)
+    assert sum(len(smtp.sent) for smtp in FakeSMTP.instances) == 4
+    assert len(FakeSMTP.instances) <= pool.size * 2
+
+
+def test_rejected_login_is_not_retried(pool):
+    FakeSMTP.reject_login = True
+
+    outcomes = pool.send_messages([_message() for _ in range(10)])
+
+    assert all(isinstance(o, smtplib.SMTPAuthenticationError) for o in outcomes)
+    assert len(FakeSMTP.instances) <= pool.size
+
+    # Fixed credentials are picked up once the cooldown is over
+    FakeSMTP.reject_login = False
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        pool.send_message(_message())
+    pool._auth_failed_at -= pool.auth_retry_after
+    pool.send_message(_message())
+    assert sum(len(smtp.sent) for smtp in FakeSMTP.instances) == 1
@@ -0,0 +1,114 @@
+# coding: utf-8
+
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import AsyncSessionLocal, Base, ClientModel, SessionLocal, async_url
+from openapi_server.impl import smtp_pool
+from openapi_server.impl.send_worker import get_send_worker_pool
+from smtp_sink import SMTPSink
+
+RECIPIENTS = int(os.getenv("SEND_RECIPIENTS", "10000"))
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    server = SMTPSink()
+    monkeypatch.setenv("GMAIL_USER", "me@example.com")
+    monkeypatch.setenv("GMAIL_PASSWORD", "secret")
+    monkeypatch.setattr(smtp_pool, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(smtp_pool, "SMTP_PORT", server.port)
+    monkeypatch.setattr(smtp_pool, "SMTP_STARTTLS", False)
+    try:
+        yield server
+    finally:
+        smtp_pool.close_smtp_pools()
+        server.close()
+
+
+@pytest.fixture
+def recipients(tmp_path):
+    """Point request sessions and send workers at a database of RECIPIENTS clients."""
+    url = f"sqlite:///{tmp_path}/send.db"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(async_url(url))
+    Base.metadata.create_all(bind=engine)
+    rows = [
+        {"id": str(uuid.uuid4()), "name": f"Client {n}", "email": f"client{n}@example.com",
+         "email_normalized": f"client{n}@example.com", "status": "not_contacted"}
+        for n in range(RECIPIENTS)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(ClientModel.__table__), rows)
+
+    originals = SessionLocal.kw["bind"], AsyncSessionLocal.kw["bind"]
+    SessionLocal.configure(bind=engine)
+    AsyncSessionLocal.configure(bind=async_engine)
+    try:
+        yield [row["id"] for row in rows]
+    finally:
+        SessionLocal.configure(bind=originals[0])
+        AsyncSessionLocal.configure(bind=originals[1])
+        engine.dispose()
+        asyncio.run(async_engine.dispose())
+
+
+def _p99(samples):
+    samples = sorted(samples)
+    return samples[int(len(samples) * 0.99) - 1]
+
+
+@pytest.mark.parametrize("transport", ["async", "thread"])
+def test_large_send_keeps_api_responsive(app, sink, recipients, monkeypatch, transport):
+    monkeypatch.setattr(smtp_pool, "SMTP_TRANSPORT", transport)
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+        async with client:
+            async def probe():
+                started = time.perf_counter()
+                assert (await client.get("/templates", params={"limit": 10})).status_code == 200
+                return time.perf_counter() - started
+
+            baseline = [await probe() for _ in range(100)]
+
+            response = await client.post("/email/send", json={
+                "recipient_ids": recipients, "subject": "Hi {name}", "body": "Hello {name}",
+            })
+            assert response.status_code == 202
+            job_id = response.json()["id"]
+
+            # (seconds, messages the sink had received) for each probe during the send
+            loaded = []
+            while True:
+                loaded.append((await probe(), sink.messages.value))
+                job = (await client.get(f"/email/jobs/{job_id}")).json()
+                if job["status"] not in ("queued", "running"):
+                    return baseline, loaded, job
+                await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    baseline, loaded, job = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    get_send_worker_pool().join()
+
+    # Timings vary with the machine, so they are reported, not asserted
+    print(f"{transport}: {RECIPIENTS} emails in {elapsed:.1f}s over {sink.sessions.value} sessions; "
+          f"p99 /templates {_p99(baseline) * 1000:.1f}ms idle, "
+          f"{_p99([t for t, _ in loaded]) * 1000:.1f}ms during the send")
+    assert (job["status"], job["sent"], job["failed"]) == ("completed", RECIPIENTS, 0)
+    assert sink.messages.value == RECIPIENTS
+    # Sessions are reused up to the message cap: one login per SMTP_POOL_MAX_MESSAGES,
+    # plus at most one partly used session per pool slot
+    full_sessions = -(-RECIPIENTS // smtp_pool.SMTP_POOL_MAX_MESSAGES)
+    assert sink.sessions.value <= full_sessions + smtp_pool.SMTP_POOL_SIZE
+    # The API kept answering while the sink was receiving, not just before and after
+    in_flight = {delivered for _, delivered in loaded if 0 < delivered < RECIPIENTS}
+    assert len(in_flight) > 10
@@ -0,0 +1,77 @@
+# coding: utf-8
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select, text
+
+from database import SessionLocal, TaskModel
+
+
+def test_tasks_are_filtered_in_sql(client: TestClient):
+    email = "tasks@example.com"
+    rows = [
+        ("overdue", "2024-03-01", "high", False),
+        ("today", "2024-03-05", "low", False),
+        ("done", "2024-03-05", "high", True),
+        ("later", "2024-03-09", "high", False),
+    ]
+    with SessionLocal() as db:
+        db.add_all([
+            TaskModel(id=f"{email}-{name}", type="follow_up", client_name="T", client_email=email,
+                      description=name, due_date=due, priority=priority, completed=completed)
+            for name, due, priority, completed in rows
+        ])
+        db.commit()
+
+    def names(**params):
+        tasks = client.get("/tasks", params={"client_email": email, **params}).json()
+        return [t["description"] for t in tasks]
+
+    assert sorted(names()) == ["done", "later", "overdue", "today"]
+    assert names(completed=False, due_before="2024-03-05") == ["overdue"]
+    assert names(completed=False, due_after="2024-03-05", due_before="2024-03-06") == ["today"]
+    assert names(completed=True) == ["done"]
+    assert names(priority="high", completed=False, due_after="2024-01-01") == ["overdue", "later"]
+    assert client.get("/tasks", params={"due_before": "soon"}).status_code == 422
+
+    first = client.get("/tasks", params={"client_email": email, "due_after": "2024-01-01", "limit": 2})
+    assert [t["dueDate"] for t in first.json()] == ["2024-03-01", "2024-03-05"]
+    rest = client.get("/tasks", params={"client_email": email, "due_after": "2024-01-01",
+                                        "cursor": first.headers["X-Next-Cursor"]}).json()
+    assert [t["dueDate"] for t in rest] == ["2024-03-05", "2024-03-09"]
+
+
+def test_counts_come_from_the_server(client: TestClient):
+    email = "counts@example.com"
+    with SessionLocal() as db:
+        db.add_all([
+            TaskModel(id=f"{email}-{n}", type="follow_up", client_name="T", client_email=email,
+                      description="t", due_date=due, priority="low", completed=completed)
+            for n, (due, completed) in enumerate([
+                ("2024-03-01", False), ("2024-03-05", False), ("2024-03-05", True), ("2024-03-09", False),
+            ])
+        ])
+        db.commit()
+
+    counts = client.get("/tasks/counts", params={"today": "2024-03-05"}).json()
+    assert counts == {"pending": 3, "completed": 1, "overdue": 1, "dueToday": 1}
+    etag = client.get("/tasks/counts", params={"today": "2024-03-05"}).headers["etag"]
+    assert client.get("/tasks/counts", params={"today": "2024-03-05"},
+                      headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_counts_are_index_only(db_session):
+    stmt = select(TaskModel.completed, func.count()).group_by(TaskModel.completed)
+    plan = " ".join(row[-1] for row in db_session.execute(text(f"EXPLAIN QUERY PLAN {stmt.compile(db_session.get_bind())}")))
+    assert "COVERING INDEX ix_tasks_completed_due" in plan
+
+
+def test_due_today_is_an_index_range_scan(db_session):
+    stmt = (
+        select(TaskModel.id)
+        .where(TaskModel.completed == False, TaskModel.due_date >= "2024-03-05", TaskModel.due_date < "2024-03-06")
+        .order_by(TaskModel.due_date, TaskModel.id)
+    )
+    sql = stmt.compile(db_session.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = " ".join(row[-1] for row in db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    assert "ix_tasks_completed_due" in plan
+    assert "TEMP B-TREE" not in plan
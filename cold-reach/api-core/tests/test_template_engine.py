@@ -0,0 +1,36 @@
+# coding: utf-8
+
+from openapi_server.impl.template_engine import CompiledTemplate, TemplateCache
+
+VALUES = {"name": "Ann", "company": "", "email": "ann@example.com"}
+
+
+def test_render_matches_replace_chain():
+    source = "Hi {name}, from {company} to {email}. {name}!"
+    expected = source.replace("{name}", "Ann").replace("{company}", "")\
+                     .replace("{email}", "ann@example.com")
+
+    assert CompiledTemplate(source).render(VALUES) == expected
+
+
+def test_defaults_and_unknown_fields():
+    template = CompiledTemplate("Hi {name|there}, how is {company|your team}? {unknown} {x|y}")
+
+    assert template.render(VALUES) == "Hi Ann, how is your team? {unknown} y"
+    assert template.render({}) == "Hi there, how is your team? {unknown} y"
+
+
+def test_literal_only_template():
+    assert CompiledTemplate("No fields here").render(VALUES) == "No fields here"
+
+
+def test_cache_keys_on_template_id_and_content():
+    cache = TemplateCache(size=2)
+
+    first = cache.get("t1", "Hi {name}", "Body")
+    assert cache.get("t1", "Hi {name}", "Body") is first
+    assert cache.get("t1", "Hello {name}", "Body") is not first
+    assert cache.get("t2", "Hi {name}", "Body") is not first
+
+    # Three distinct entries in a size-2 cache evicted the least recently used.
+    assert cache.get("t1", "Hi {name}", "Body") is not first
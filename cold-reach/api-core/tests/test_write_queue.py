@@ -0,0 +1,90 @@
+# coding: utf-8
+
+import threading
+import uuid
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, TemplateModel, make_engine
+from openapi_server.impl.write_queue import WriteQueue
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path}/writes.db")
+    Base.metadata.create_all(bind=engine)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+def _add_template(name):
+    def add(db):
+        db.add(TemplateModel(id=str(uuid.uuid4()), name=name, subject="s", body="b"))
+        return name
+    return add
+
+
+def test_production_pragmas(file_engine):
+    with file_engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+
+
+def test_queued_writes_share_a_commit(file_engine):
+    writer = WriteQueue(sessionmaker(bind=file_engine, expire_on_commit=False))
+    release = threading.Event()
+
+    def blocked(db):
+        release.wait(5)
+        return _add_template("first")(db)
+
+    futures = [writer.submit(blocked)] + [writer.submit(_add_template(f"t{n}")) for n in range(20)]
+    release.set()
+    results = [f.result(5) for f in futures]
+    writer.stop()
+
+    assert results == ["first"] + [f"t{n}" for n in range(20)]
+    assert writer.commits <= 2
+    with file_engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT count(*) FROM templates").scalar() == 21
+
+
+def test_failed_write_does_not_sink_the_batch(file_engine):
+    writer = WriteQueue(sessionmaker(bind=file_engine, expire_on_commit=False))
+    release = threading.Event()
+
+    def boom(db):
+        _add_template("doomed")(db)
+        raise ValueError("boom")
+
+    first = writer.submit(lambda db: release.wait(5))
+    futures = [writer.submit(_add_template("a")), writer.submit(boom), writer.submit(_add_template("b"))]
+    release.set()
+    first.result(5)
+
+    assert futures[0].result(5) == "a"
+    with pytest.raises(ValueError):
+        futures[1].result(5)
+    assert futures[2].result(5) == "b"
+    writer.stop()
+    with file_engine.connect() as conn:
+        names = {r[0] for r in conn.exec_driver_sql("SELECT name FROM templates")}
+    assert names == {"a", "b"}
+
+
+def test_template_crud_through_the_queue(client):
+    name = "Queue"
+    created = client.post("/templates", json={"name": name, "subject": "Hi {name}", "body": "Hello"})
+    assert created.status_code == 200
+    template_id = created.json()["id"]
+
+    updated = client.put(f"/templates/{template_id}", json={"name": name, "subject": "Hey", "body": "Hello"})
+    assert updated.json()["subject"] == "Hey"
+    assert client.put("/templates/missing", json={"name": "x", "subject": "y", "body": "z"}).status_code == 404
+
+    assert client.delete(f"/templates/{template_id}").status_code in (200, 204)
+    assert template_id not in [t["id"] for t in client.get("/templates", params={"limit": 1000}).json()]
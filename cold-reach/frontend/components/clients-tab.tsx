@@ -100,6 +100,7 @@ export function ClientsTab({
 
   const [duplicateData, setDuplicateData] = useState<{ existing_emails: string[] } | null>(null)
   const [selectedFile, setSelectedFile] = useState<File | null>(null)
+  const [sheetUrl, setSheetUrl] = useState<string | null>(null)
 
   const handleFileUpload = async (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0]
@@ -136,18 +137,34 @@ export function ClientsTab({
         console.error("Upload failed", error)
         alert("Failed to upload file after confirmation")
       }
+    } else if (sheetUrl) {
+      try {
+        await api.importGoogleSheet(sheetUrl, true)
+        await fetchClients()
+        setDuplicateData(null)
+        setSheetUrl(null)
+      } catch (error: any) {
+        console.error("Link failed", error)
+        alert(error.message || "Failed to import from Google Sheet")
+      }
     }
   }
 
   const handleGoogleSheetLink = async (url: string) => {
     if (url) {
       try {
-        await api.importGoogleSheet(url)
+        await api.importGoogleSheet(url, false)
         await fetchClients()
         setShowLinkModal(false)
-      } catch (error) {
-        console.error("Link failed", error)
-        alert("Failed to import from Google Sheet")
+      } catch (error: any) {
+        if (error.details && error.details.existing_emails) {
+          setSheetUrl(url)
+          setDuplicateData(error.details)
+          setShowLinkModal(false)
+        } else {
+          console.error("Link failed", error)
+          alert(error.message || "Failed to import from Google Sheet")
+        }
       }
     }
   }
@@ -384,6 +401,7 @@ export function ClientsTab({
         <Modal title="Duplicate Clients Found" onClose={() => {
           setDuplicateData(null)
           setSelectedFile(null)
+          setSheetUrl(null)
         }}>
           <div className="space-y-4">
             <div className="rounded-md bg-yellow-500/10 p-4">
@@ -411,6 +429,7 @@ export function ClientsTab({
               <Button variant="outline" onClick={() => {
                 setDuplicateData(null)
                 setSelectedFile(null)
+                setSheetUrl(null)
               }}>
                 Cancel
               </Button>
@@ -237,9 +237,14 @@ export function EmailComposer({ recipientIds, onClose, onSend }: EmailComposerPr
                         >
                           <div className="flex items-center gap-2">
                             <File className="h-4 w-4 text-accent" />
-                            <span className="text-sm text-foreground">
+                            <a
+                              href={api.attachmentContentUrl(attachment.id)}
+                              target="_blank"
+                              rel="noreferrer"
+                              className="text-sm text-foreground hover:underline"
+                            >
                               {attachment.name}
-                            </span>
+                            </a>
                             <span className="text-xs text-muted-foreground">
                               ({attachment.size})
                             </span>
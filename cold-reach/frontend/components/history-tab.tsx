@@ -25,9 +25,10 @@ interface EmailLog {
   timestamp: string
   recipient_count: number
   subject: string
-  body: string
   status: "sent" | "failed"
-  recipients: string[]
+  // Only on the detail endpoint
+  body?: string
+  recipients?: string[]
 }
 
 export function HistoryTab() {
@@ -50,12 +51,19 @@ export function HistoryTab() {
     fetchHistory()
   }, [])
 
-  const filteredHistory = history.filter(
-    (log) =>
-      log.subject.toLowerCase().includes(searchQuery.toLowerCase()) ||
-      log.body.toLowerCase().includes(searchQuery.toLowerCase())
+  const filteredHistory = history.filter((log) =>
+    (log.subject || "").toLowerCase().includes(searchQuery.toLowerCase())
   )
 
+  const viewEmail = async (log: EmailLog) => {
+    setSelectedEmail(log)
+    try {
+      setSelectedEmail(await api.getEmailLog(log.id))
+    } catch (error) {
+      console.error("Failed to fetch email", error)
+    }
+  }
+
   return (
     <div className="space-y-6">
       <div className="flex flex-col gap-4 sm:flex-row sm:items-center sm:justify-between">
@@ -118,7 +126,7 @@ export function HistoryTab() {
                     <Button
                       variant="ghost"
                       size="sm"
-                      onClick={() => setSelectedEmail(log)}
+                      onClick={() => viewEmail(log)}
                     >
                       <Eye className="mr-2 h-4 w-4" />
                       View
@@ -161,7 +169,7 @@ export function HistoryTab() {
                   Body
                 </label>
                 <div className="max-h-[300px] overflow-y-auto rounded-md border border-border bg-muted p-4 text-sm whitespace-pre-wrap">
-                  {selectedEmail.body}
+                  {selectedEmail.body ?? "Loading..."}
                 </div>
               </div>
               <div className="space-y-2">
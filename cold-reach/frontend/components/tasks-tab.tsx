@@ -54,18 +54,19 @@ const priorityConfig = {
   low: { label: "Low", color: "bg-secondary text-muted-foreground" },
 }
 
+const isoDate = (date: Date) => date.toLocaleDateString("en-CA")
+
 export function TasksTab() {
   const [tasks, setTasks] = useState<Task[]>([])
   const [filter, setFilter] = useState<"all" | "pending" | "completed">("pending")
+  const [counts, setCounts] = useState({ pending: 0, completed: 0, overdue: 0, dueToday: 0 })
   const [loading, setLoading] = useState(true)
 
   useEffect(() => {
     const fetchTasks = async () => {
       try {
-        const data = await api.getTasks()
-        // Map backend data to frontend Task interface if needed, or ensure they match
-        // Assuming backend returns matching structure. 
-        // Backend key: clientName, frontend: clientName (aliased in Pydantic)
+        // The server filters; only the tasks shown are downloaded
+        const data = await api.getTasks(filter === "all" ? {} : { completed: filter === "completed" })
         setTasks(data)
       } catch (error) {
         console.error("Failed to fetch tasks", error)
@@ -74,13 +75,18 @@ export function TasksTab() {
       }
     }
     fetchTasks()
-  }, [])
+  }, [filter])
 
-  const filteredTasks = tasks.filter((task) => {
-    if (filter === "pending") return !task.completed
-    if (filter === "completed") return task.completed
-    return true
-  })
+  useEffect(() => {
+    const fetchCounts = async () => {
+      try {
+        setCounts(await api.getTaskCounts(isoDate(new Date())))
+      } catch (error) {
+        console.error("Failed to fetch task counts", error)
+      }
+    }
+    fetchCounts()
+  }, [])
 
   const toggleTask = (id: string) => {
     // TODO: Add API call to toggle completion
@@ -91,8 +97,8 @@ export function TasksTab() {
     )
   }
 
-  const pendingCount = tasks.filter((t) => !t.completed).length
-  const completedCount = tasks.filter((t) => t.completed).length
+  const pendingCount = counts.pending
+  const completedCount = counts.completed
 
   const isOverdue = (dueDate: string) => {
     return new Date(dueDate) < new Date() && new Date(dueDate).toDateString() !== new Date().toDateString()
@@ -125,7 +131,7 @@ export function TasksTab() {
           </DropdownMenuTrigger>
           <DropdownMenuContent align="end">
             <DropdownMenuItem onClick={() => setFilter("all")}>
-              All Tasks ({tasks.length})
+              All Tasks ({pendingCount + completedCount})
             </DropdownMenuItem>
             <DropdownMenuItem onClick={() => setFilter("pending")}>
               Pending ({pendingCount})
@@ -146,7 +152,7 @@ export function TasksTab() {
             </div>
             <div>
               <p className="text-2xl font-bold text-foreground">
-                {tasks.filter((t) => !t.completed && isOverdue(t.dueDate)).length}
+                {counts.overdue}
               </p>
               <p className="text-sm text-muted-foreground">Overdue</p>
             </div>
@@ -159,7 +165,7 @@ export function TasksTab() {
             </div>
             <div>
               <p className="text-2xl font-bold text-foreground">
-                {tasks.filter((t) => !t.completed && isToday(t.dueDate)).length}
+                {counts.dueToday}
               </p>
               <p className="text-sm text-muted-foreground">Due Today</p>
             </div>
@@ -180,7 +186,7 @@ export function TasksTab() {
 
       {/* Tasks List */}
       <div className="space-y-3">
-        {filteredTasks.map((task) => {
+        {tasks.map((task) => {
           const TypeIcon = taskTypeConfig[task.type].icon
           const overdue = isOverdue(task.dueDate) && !task.completed
           const today = isToday(task.dueDate)
@@ -261,7 +267,7 @@ export function TasksTab() {
           )
         })}
 
-        {filteredTasks.length === 0 && (
+        {tasks.length === 0 && (
           <div className="flex flex-col items-center justify-center rounded-lg border border-border bg-card py-12 text-center">
             <CheckCircle2 className="mb-4 h-12 w-12 text-accent" />
             <p className="text-lg font-medium text-foreground">All caught up!</p>
@@ -1,13 +1,26 @@
 import { Client } from "@/components/clients-tab";
 
 const API_BASE_URL = (process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000").replace(/\/$/, "");
+const PAGE_SIZE = 500;
+
+// List endpoints are cursor-paginated; follow X-Next-Cursor until the last page.
+async function fetchAllPages<T>(path: string, errorMessage: string, params: Record<string, string> = {}): Promise<T[]> {
+    const items: T[] = [];
+    let cursor: string | null = null;
+    do {
+        const query = new URLSearchParams({ ...params, limit: String(PAGE_SIZE) });
+        if (cursor) query.set("cursor", cursor);
+        const response = await fetch(`${API_BASE_URL}${path}?${query}`);
+        if (!response.ok) throw new Error(errorMessage);
+        items.push(...(await response.json()));
+        cursor = response.headers.get("X-Next-Cursor");
+    } while (cursor);
+    return items;
+}
 
 export const api = {
     getClients: async (search?: string): Promise<Client[]> => {
-        const query = search ? `?search=${encodeURIComponent(search)}` : "";
-        const response = await fetch(`${API_BASE_URL}/clients${query}`);
-        if (!response.ok) throw new Error("Failed to fetch clients");
-        return response.json();
+        return fetchAllPages<Client>("/clients", "Failed to fetch clients", search ? { search } : {});
     },
 
     createClient: async (data: any) => {
@@ -37,13 +50,22 @@ export const api = {
         return response.json();
     },
 
-    importGoogleSheet: async (url: string) => {
-        const response = await fetch(`${API_BASE_URL}/clients/import/google-sheet`, {
+    importGoogleSheet: async (url: string, skipDuplicates = false) => {
+        const response = await fetch(`${API_BASE_URL}/clients/import/google-sheet?skip_duplicates=${skipDuplicates}`, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify({ url }),
         });
-        if (!response.ok) throw new Error("Failed to import google sheet");
+        if (response.status === 409) {
+            const errorData = await response.json();
+            const error = new Error("Duplicate clients found");
+            (error as any).details = errorData.detail;
+            throw error;
+        }
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => null);
+            throw new Error(typeof errorData?.detail === "string" ? errorData.detail : "Failed to import google sheet");
+        }
         return response.json();
     },
 
@@ -64,22 +86,34 @@ export const api = {
         return response.json();
     },
 
-    getTasks: async (): Promise<any[]> => {
-        const response = await fetch(`${API_BASE_URL}/tasks`);
-        if (!response.ok) throw new Error("Failed to fetch tasks");
+    getTasks: async (filters: {
+        completed?: boolean; priority?: string; due_before?: string; due_after?: string; client_email?: string
+    } = {}): Promise<any[]> => {
+        const params = Object.fromEntries(
+            Object.entries(filters).filter(([, value]) => value !== undefined && value !== "").map(([key, value]) => [key, String(value)])
+        ) as Record<string, string>;
+        return fetchAllPages("/tasks", "Failed to fetch tasks", params);
+    },
+
+    getTaskCounts: async (today: string): Promise<{ pending: number; completed: number; overdue: number; dueToday: number }> => {
+        const response = await fetch(`${API_BASE_URL}/tasks/counts?${new URLSearchParams({ today })}`);
+        if (!response.ok) throw new Error("Failed to fetch task counts");
         return response.json();
     },
 
-    getEmailHistory: async (): Promise<any[]> => {
-        const response = await fetch(`${API_BASE_URL}/email/history`);
-        if (!response.ok) throw new Error("Failed to fetch email history");
+    getEmailHistory: async (filters: { since?: string; until?: string; status?: string } = {}): Promise<any[]> => {
+        const params = Object.fromEntries(Object.entries(filters).filter(([, value]) => value)) as Record<string, string>;
+        return fetchAllPages("/email/history", "Failed to fetch email history", params);
+    },
+
+    getEmailLog: async (id: string) => {
+        const response = await fetch(`${API_BASE_URL}/email/history/${id}`);
+        if (!response.ok) throw new Error("Failed to fetch email");
         return response.json();
     },
 
     getTemplates: async (): Promise<any[]> => {
-        const response = await fetch(`${API_BASE_URL}/templates`);
-        if (!response.ok) throw new Error("Failed to fetch templates");
-        return response.json();
+        return fetchAllPages("/templates", "Failed to fetch templates");
     },
 
     createTemplate: async (data: any) => {
@@ -110,11 +144,12 @@ export const api = {
     },
 
     getAttachments: async (): Promise<any[]> => {
-        const response = await fetch(`${API_BASE_URL}/attachments`);
-        if (!response.ok) throw new Error("Failed to fetch attachments");
-        return response.json();
+        return fetchAllPages("/attachments", "Failed to fetch attachments");
     },
 
+    // Opens inline in the browser, which fetches it in ranges as needed
+    attachmentContentUrl: (id: string) => `${API_BASE_URL}/attachments/${id}/content`,
+
     uploadAttachment: async (file: File) => {
         const formData = new FormData();
         formData.append("file", file);